@@ -0,0 +1,148 @@
+import errno
+import os
+import time
+
+from crypto.classes.ciphers.parallel import get_worker_count
+from crypto.classes.util import DEFAULT_CHUNK_SIZE
+
+
+"""Encrypt or decrypt every file under a directory with one set up cipher,
+spreading the files across a pool of processes. Workers are forked with the
+cipher already configured, so keys and IVs are read once and nothing about
+the cipher needs to be pickled.
+"""
+
+JOBS_PER_TASK = 16  # Files sent to a worker at a time, to cut down on IPC.
+
+_worker = {}  # The cipher and options of the current worker process.
+
+
+def iter_files(input_dir, exclude_dir=None):
+    """Yield the paths of files under `input_dir`, relative to it, in sorted
+    order. `exclude_dir` and everything below it is skipped.
+    """
+    exclude_dir = os.path.realpath(exclude_dir) if exclude_dir else None
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(
+            name for name in dirs
+            if os.path.realpath(os.path.join(root, name)) != exclude_dir
+        )
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), input_dir)
+
+
+def _set_worker(cipher, decrypt, buffer_size):
+    _worker.update(cipher=cipher, decrypt=decrypt, buffer_size=buffer_size)
+
+
+def _crypt_file(job):
+    """Encrypt or decrypt one file for the current worker. Returns (path,
+    bytes read, bytes written, error) where error is None on success.
+    """
+    path, src_path, dst_path = job
+    cipher = _worker['cipher']
+    try:
+        try:
+            os.makedirs(os.path.dirname(dst_path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        with open(src_path, 'rb') as src:
+            size = os.fstat(src.fileno()).st_size
+            with open(dst_path, 'wb') as dst:
+                if _worker['decrypt']:
+                    written = cipher.decrypt_stream(
+                        src,
+                        dst,
+                        _worker['buffer_size']
+                    )
+                else:
+                    written = cipher.encrypt_stream(
+                        src,
+                        dst,
+                        _worker['buffer_size'],
+                        size=size
+                    )
+        return path, size, written, None
+    except Exception as e:
+        if os.path.isfile(dst_path):
+            os.remove(dst_path)  # Leave no partial output behind.
+        return path, 0, 0, str(e) or e.__class__.__name__
+
+
+def crypt_directory(
+    cipher,
+    input_dir,
+    output_dir,
+    decrypt=False,
+    buffer_size=DEFAULT_CHUNK_SIZE,
+    processes=None
+):
+    """Encrypt or decrypt each file under `input_dir` with `cipher`, writing
+    it to the same relative path under `output_dir`. `processes` is the
+    number of worker processes, one per CPU when 0 or None; with 1 files are
+    processed in this process. A file that fails does not stop the others,
+    and its output is removed.
+    Returns a dictionary of totals, with failures as (path, error) tuples.
+    """
+    jobs = (
+        (path, os.path.join(input_dir, path), os.path.join(output_dir, path))
+        for path in iter_files(input_dir, exclude_dir=output_dir)
+    )
+    processes = get_worker_count(processes)
+    start = time.time()
+    if processes == 1:
+        _set_worker(cipher, decrypt, buffer_size)
+        results = (_crypt_file(job) for job in jobs)
+        pool = None
+    else:
+        from multiprocessing import Pool
+        pool = Pool(
+            processes,
+            initializer=_set_worker,
+            initargs=(cipher, decrypt, buffer_size)
+        )
+        results = pool.imap_unordered(_crypt_file, jobs, JOBS_PER_TASK)
+
+    report = {
+        'bytes_read': 0,
+        'bytes_written': 0,
+        'failures': [],
+        'files': 0,
+        'seconds': 0
+    }
+    try:
+        for path, read, written, error in results:
+            report['files'] += 1
+            report['bytes_read'] += read
+            report['bytes_written'] += written
+            if error:
+                report['failures'].append((path, error))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        _worker.clear()
+
+    report['failures'].sort()
+    report['seconds'] = time.time() - start
+    return report
+
+
+def format_report(report):
+    """Return a summary of a `crypt_directory` report, listing failures."""
+    seconds = max(report['seconds'], 1e-6)
+    lines = [
+        "%d files, %.1f MB in %.2fs: %.1f MB/s, %.1f files/s, %d failed." % (
+            report['files'],
+            report['bytes_read'] / 1e6,
+            report['seconds'],
+            report['bytes_read'] / 1e6 / seconds,
+            report['files'] / seconds,
+            len(report['failures'])
+        )
+    ]
+    for path, error in report['failures']:
+        lines.append("  %s: %s" % (path, error))
+    return "\n".join(lines)
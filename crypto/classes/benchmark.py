@@ -0,0 +1,231 @@
+import binascii
+import math
+import multiprocessing
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import crypto
+import Crypto
+
+from crypto.classes.util import DEFAULT_CHUNK_SIZE
+
+
+"""Utility (helper) methods for timing ciphers over messages of different
+sizes. Payloads, keys and IVs are derived from a seed so runs are repeatable.
+"""
+
+DEFAULT_MIN_TIME = 0.1  # Seconds to keep repeating each measurement for.
+DEFAULT_SEED = 0
+DEFAULT_SIZES = (16, 1024, 64 * 1024, 1024 ** 2, 16 * 1024 ** 2)
+PERCENTILES = (50, 90, 99)
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+class NullWriter(object):
+    """File-like object that discards what is written to it."""
+    def write(self, data):
+        pass
+
+
+class RepeatingReader(object):
+    """File-like object that reads `size` bytes made of `chunk` repeated."""
+    def __init__(self, chunk, size):
+        self._chunk = chunk
+        self._remaining = size
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        self._remaining -= size
+        if size <= len(self._chunk):
+            return self._chunk[:size]
+        return (self._chunk * (size // len(self._chunk) + 1))[:size]
+
+
+def format_size(size):
+    """Return size in bytes as a short string such as 64K or 1G."""
+    for suffix in ('G', 'M', 'K'):
+        if size >= SIZE_SUFFIXES[suffix] and not size % SIZE_SUFFIXES[suffix]:
+            return "%s%s" % (size // SIZE_SUFFIXES[suffix], suffix)
+    return str(size)
+
+
+def get_metadata():
+    """Return a dictionary describing the environment results came from."""
+    return {
+        'cpu_count': multiprocessing.cpu_count(),
+        'platform': platform.platform(),
+        'pycrypto': Crypto.__version__,
+        'pycrypto_cli': crypto.__version__,
+        'python': platform.python_version()
+    }
+
+
+def get_peak_rss():
+    """Return the peak resident set size of this process in bytes. This is
+    a high-water mark over the life of the process and never goes down; see
+    `run_in_child` to measure one piece of work.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def get_random_bytes(rng, size):
+    """Return `size` bytes from seeded random.Random instance `rng`. Not for
+    keys that protect anything.
+    """
+    if not size:
+        return ""
+    return binascii.unhexlify("%0*x" % (size * 2, rng.getrandbits(size * 8)))
+
+
+def parse_size(text):
+    """Parse a size such as 16, 64K, 1M or 1G into a number of bytes."""
+    text = text.strip().upper()
+    multiplier = SIZE_SUFFIXES.get(text[-1:], 1)
+    if multiplier > 1:
+        text = text[:-1]
+    size = int(text) * multiplier
+    if size < 1:
+        raise ValueError("size must be at least 1 byte.")
+    return size
+
+
+def percentile(values, percent):
+    """Return the nearest-rank `percent` percentile of sorted values."""
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def run_in_child(function, *args, **kwargs):
+    """Call `function` with the given arguments in a forked child process.
+    Returns its result, which must be picklable, and the child's peak
+    resident set size in bytes. The child starts at this process's current
+    size, so memory used by earlier calls is not counted. Raises ValueError
+    if `function` fails.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+
+    def run():
+        receiver.close()
+        try:
+            result = function(*args, **kwargs)
+            sender.send((result, get_peak_rss(), None))
+        except Exception as e:
+            sender.send((None, None, str(e) or e.__class__.__name__))
+        sender.close()
+
+    child = multiprocessing.Process(target=run)
+    child.start()
+    sender.close()
+    try:
+        result, peak_rss, error = receiver.recv()
+    except EOFError:
+        result, peak_rss, error = None, None, "The child process died."
+    finally:
+        receiver.close()
+        child.join()
+
+    if error:
+        raise ValueError("Benchmark failed: %s" % error)
+    return result, peak_rss
+
+
+def seed_cipher(cipher, seed=DEFAULT_SEED):
+    """Set a key and, when the mode uses one, an IV derived from `seed`."""
+    rng = random.Random(seed)
+    cipher.key = get_random_bytes(rng, len(cipher.generate_key()))
+    if getattr(cipher, 'mode', None) and cipher.mode.requires_iv:
+        cipher.iv = get_random_bytes(rng, cipher.cipher.block_size)
+    return cipher
+
+
+def summarize(timings, size):
+    """Return throughput and latency figures for calls that each processed
+    `size` bytes and took `timings` seconds.
+    """
+    total = sum(timings) or 1e-9
+    timings = sorted(timings)
+    latency = dict(
+        ('p%s' % percent, percentile(timings, percent))
+        for percent in PERCENTILES
+    )
+    latency['max'] = timings[-1]
+    latency['min'] = timings[0]
+    return {
+        'calls': len(timings),
+        'latency': latency,
+        'mb_per_s': size * len(timings) / total / 1e6,
+        'ops_per_s': len(timings) / total
+    }
+
+
+def time_calls(function, min_time=DEFAULT_MIN_TIME, min_calls=1):
+    """Call function repeatedly for at least `min_time` seconds and
+    `min_calls` calls, returning the duration of each call.
+    """
+    timings = []
+    total = 0
+    while total < min_time or len(timings) < min_calls:
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+        total += timings[-1]
+    return timings
+
+
+def bench_cipher(
+    cipher,
+    size,
+    seed=DEFAULT_SEED,
+    min_time=DEFAULT_MIN_TIME,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    workers=None
+):
+    """Time encrypting and decrypting a `size` byte message with a ready to
+    use cipher, returning a (encrypt, decrypt) pair of `summarize` results.
+    Messages up to `chunk_size` bytes are processed in memory. Larger ones
+    are streamed `chunk_size` bytes at a time on `workers` threads, with the
+    ciphertext kept in a temporary file, so memory use does not grow with
+    the message size.
+    """
+    rng = random.Random(seed)
+    if size <= chunk_size:
+        plaintext = get_random_bytes(rng, size)
+        ciphertext = cipher.encrypt(plaintext)
+        return (
+            summarize(time_calls(
+                lambda: cipher.encrypt(plaintext),
+                min_time
+            ), size),
+            summarize(time_calls(
+                lambda: cipher.decrypt(ciphertext),
+                min_time
+            ), size)
+        )
+
+    chunk = get_random_bytes(rng, chunk_size)
+    with tempfile.TemporaryFile() as f:
+        def encrypt():
+            f.seek(0)
+            f.truncate()
+            cipher.encrypt_stream(
+                RepeatingReader(chunk, size),
+                f,
+                chunk_size,
+                size=size,
+                workers=workers
+            )
+
+        def decrypt():
+            f.seek(0)
+            cipher.decrypt_stream(f, NullWriter(), chunk_size, workers=workers)
+
+        return (
+            summarize(time_calls(encrypt, min_time), size),
+            summarize(time_calls(decrypt, min_time), size)
+        )
@@ -1,5 +1,5 @@
 from crypto.classes.ciphers.base import BlockCipher
-from Crypto import Random
+from crypto.classes.entropy import default_pool
 from Crypto.Cipher import AES
 
 
@@ -7,9 +7,22 @@ class AESCipher(BlockCipher):
     """AES symmetric cipher."""
     cipher = AES
 
-    def __init__(self, key=None, iv=None, mode=None, initial_value=1):
+    def __init__(
+        self,
+        key=None,
+        iv=None,
+        mode=None,
+        initial_value=1,
+        padding=None
+    ):
         """initial_value is only applied to CTR."""
-        super(AESCipher, self).__init__(key, iv, mode, initial_value)
+        super(AESCipher, self).__init__(
+            key,
+            iv,
+            mode,
+            initial_value,
+            padding
+        )
 
     @BlockCipher.key.setter
     def key(self, value):
@@ -29,5 +42,4 @@ class AESCipher(BlockCipher):
             raise AttributeError(
                 "key_size must be 16 (AES-128), 24 (AES-192), or 32 (AES-256)."
             )
-        random_device = Random.new()
-        return random_device.read(key_size)
+        return default_pool.read(key_size)
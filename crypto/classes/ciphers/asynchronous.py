@@ -0,0 +1,171 @@
+import sys
+
+from crypto.classes.ciphers.parallel import get_worker_count
+from crypto.classes.util import DEFAULT_CHUNK_SIZE
+
+
+"""Non-blocking facade for ciphers. Payloads up to a threshold are processed
+in the calling thread, where handing them to another thread would cost more
+than the work itself (about 50us a hop, roughly the time AES-CBC takes for
+4 KiB). Larger payloads and file streams run on a thread pool. Pycrypto
+releases the GIL while it encrypts or decrypts, so offloaded work proceeds in
+parallel with the caller.
+"""
+
+DEFAULT_THRESHOLD = 16 * 1024
+
+
+class CompletedResult(object):
+    """Result of work done in the calling thread, with the interface of
+    `multiprocessing.pool.AsyncResult`. Exceptions are raised by `get`.
+    """
+    def __init__(self, function, args=(), callback=None):
+        try:
+            self._value = function(*args)
+            self._exc_info = None
+        except Exception:
+            self._exc_info = sys.exc_info()
+        else:
+            if callback:
+                callback(self._value)
+
+    def get(self, timeout=None):
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+    def ready(self):
+        return True
+
+    def successful(self):
+        return self._exc_info is None
+
+    def wait(self, timeout=None):
+        pass
+
+
+class AsyncCipher(object):
+    """Wraps a CryptoCipher so its operations return AsyncResult objects
+    instead of blocking. Payloads longer than `threshold` bytes, and all
+    streams, are submitted to `executor`: any object with an `apply_async`
+    method, such as a `multiprocessing.pool.ThreadPool` shared between
+    ciphers. Without one, a pool of `workers` threads (one per CPU by
+    default) is started on first use and stopped by `close`.
+    `callback` is called with the result when an operation succeeds.
+    """
+    def __init__(
+        self,
+        cipher,
+        threshold=DEFAULT_THRESHOLD,
+        executor=None,
+        workers=None
+    ):
+        if threshold < 0:
+            raise AttributeError("threshold must not be negative.")
+        self.cipher = cipher
+        self.threshold = threshold
+        self.workers = workers
+        self._executor = executor
+        self._owns_executor = executor is None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "%s for %r." % (self.__class__, self.cipher)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            from multiprocessing.pool import ThreadPool
+            self._executor = ThreadPool(get_worker_count(self.workers))
+        return self._executor
+
+    def _submit(self, size, function, args, callback):
+        """Run `function` inline when `size` is within the threshold, or on
+        the executor otherwise.
+        """
+        if size is not None and size <= self.threshold:
+            return CompletedResult(function, args, callback)
+        return self.executor.apply_async(function, args, callback=callback)
+
+    def close(self):
+        """Stop the pool started by this instance, waiting for submitted
+        work to finish. A given executor is left running.
+        """
+        if self._owns_executor and self._executor is not None:
+            self._executor.close()
+            self._executor.join()
+            self._executor = None
+
+    def decrypt(self, ciphertext, callback=None):
+        return self._submit(
+            len(ciphertext),
+            self.cipher.decrypt,
+            (ciphertext,),
+            callback
+        )
+
+    def encrypt(self, plaintext, callback=None):
+        return self._submit(
+            len(plaintext),
+            self.cipher.encrypt,
+            (plaintext,),
+            callback
+        )
+
+    def decrypt_many(self, ciphertexts, callback=None):
+        ciphertexts = list(ciphertexts)
+        return self._submit(
+            sum(len(ciphertext) for ciphertext in ciphertexts),
+            self.cipher.decrypt_many,
+            (ciphertexts,),
+            callback
+        )
+
+    def encrypt_many(self, plaintexts, callback=None):
+        plaintexts = list(plaintexts)
+        return self._submit(
+            sum(len(plaintext) for plaintext in plaintexts),
+            self.cipher.encrypt_many,
+            (plaintexts,),
+            callback
+        )
+
+    def decrypt_stream(
+        self,
+        src,
+        dst,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        callback=None
+    ):
+        """Decrypt file-like object `src` to `dst` on the executor. The
+        result is the number of bytes written.
+        """
+        return self._submit(
+            None,
+            self.cipher.decrypt_stream,
+            (src, dst, chunk_size),
+            callback
+        )
+
+    def encrypt_stream(
+        self,
+        src,
+        dst,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        size=None,
+        callback=None
+    ):
+        """Encrypt file-like object `src` to `dst` on the executor. The
+        result is the number of bytes written.
+        """
+        return self._submit(
+            None,
+            self.cipher.encrypt_stream,
+            (src, dst, chunk_size, size),
+            callback
+        )
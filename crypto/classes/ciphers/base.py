@@ -1,24 +1,62 @@
+import itertools
+import os
+import StringIO
+
 from collections import namedtuple
-from crypto.classes.encoders.base import Encoder
-from Crypto import Random
+from crypto.classes.ciphers.cache import default_cache
+from crypto.classes.digest import HASHES
+from crypto.classes.ciphers.padding import PADDINGS
+from crypto.classes.ciphers.parallel import iter_parallel, iter_segments
+from crypto.classes.encoders.base import do_nothing, Encoder
+from crypto.classes.entropy import default_pool
+from crypto.classes.profiling import instrument, uninstrument
+from crypto.classes.util import (
+    DEFAULT_CHUNK_SIZE,
+    get_stream_size,
+    iter_aligned,
+    iter_chunks,
+    xor_bytes
+)
 from Crypto.Cipher import blockalgo
 from Crypto.Util import Counter
+from hmac import compare_digest
 
 
 BlockCipherMode = namedtuple(
     'BlockCipherMode',
-    ('mode_id', 'requires_iv', 'uses_counter')
+    (
+        'mode_id',
+        'requires_iv',
+        'uses_counter',
+        'parallel_encrypt',
+        'parallel_decrypt',
+        'stream'
+    )
 )
 
 
+MAC_DEFAULT = "SHA256"
+
+
 class CryptoCipher(object):
-    """Base Class for Ciphers."""
+    """Base Class for Ciphers. When `mac_key` is set, ciphertext is
+    authenticated with Encrypt-then-MAC: an HMAC (`mac_algorithm`) of the
+    ciphertext is computed as it streams and appended as a tag before
+    encoding, and decryption checks the tag as the ciphertext streams in.
+    """
     attributes = ('key',)
+    mac_algorithm = MAC_DEFAULT
+    stream_requires_size = False
 
     def __init__(self, key=None):
         self._key = key
+        self._mac_key = None
+        self._profiler = None
         self._encoder = None
         self._decoder = None
+        self._stream_encoder = None
+        self._stream_decoder = None
+        self._wrap = None
 
     def __repr__(self):
         return "%s key %s set." % (
@@ -36,6 +74,29 @@ class CryptoCipher(object):
     def key(self, value):
         self._key = value
 
+    @property
+    def mac_key(self):
+        return self._mac_key
+
+    @mac_key.setter
+    def mac_key(self, value):
+        if value is not None and not value:
+            raise AttributeError("mac_key must be at least 1 byte long.")
+        self._mac_key = value
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, value):
+        """Record stage timings to Profiler `value`, or stop when None."""
+        if value is None:
+            uninstrument(self)
+        else:
+            instrument(self, value)
+        self._profiler = value
+
     def _encode(self, text, *args, **kwargs):
         """Apply encode method to text and return"""
         if hasattr(self._encoder, "__call__"):
@@ -50,39 +111,253 @@ class CryptoCipher(object):
         else:
             return text
 
+    def _encode_stream(self, chunks):
+        """Apply the incremental encoder to an iterable of text chunks. When
+        the encoder has none, the encode method is applied to chunks regrouped
+        on 3 byte boundaries, so base64 style encoders produce the same output
+        as encoding the whole text at once.
+        """
+        if self._stream_encoder is None:
+            for chunk in iter_aligned(chunks, 3):
+                yield self._encode(str(chunk))
+            return
+
+        coder = self._stream_encoder(wrap=self._wrap)
+        for chunk in chunks:
+            text = coder.update(chunk)
+            if text:
+                yield text
+
+        text = coder.flush()
+        if text:
+            yield text
+
+    def _decode_stream(self, chunks):
+        """Apply the incremental decoder to an iterable of text chunks. When
+        the encoder has none, the decode method is applied to chunks regrouped
+        on 4 byte boundaries to match base64 style encoders.
+        """
+        if self._stream_decoder is None:
+            for chunk in iter_aligned(chunks, 4):
+                yield self._decode(str(chunk))
+            return
+
+        coder = self._stream_decoder()
+        for chunk in chunks:
+            text = coder.update(chunk)
+            if text:
+                yield text
+
+        text = coder.flush()
+        if text:
+            yield text
+
+    def _get_mac(self):
+        """Return an HMAC under `mac_key`, fed the associated data."""
+        if self.mac_algorithm not in HASHES:
+            raise AttributeError(
+                "MAC algorithm not supported: %s" % self.mac_algorithm
+            )
+        from Crypto.Hash import HMAC
+        mac = HMAC.new(self.mac_key, digestmod=HASHES[self.mac_algorithm])
+        mac.update(self._get_mac_header())
+        return mac
+
+    def _get_mac_header(self):
+        """Return data that is authenticated but not part of the ciphertext.
+        It must have a fixed length for a given cipher setup.
+        """
+        return ""
+
+    def _add_tag(self, chunks):
+        """Return ciphertext chunks followed by their tag when `mac_key` is
+        set; otherwise return them unchanged.
+        """
+        if self._mac_key is None:
+            return chunks
+        return self._iter_tagged(chunks, self._get_mac())
+
+    def _check_tag(self, chunks):
+        """Return ciphertext chunks with the tag removed and checked when
+        `mac_key` is set; otherwise return them unchanged.
+        """
+        if self._mac_key is None:
+            return chunks
+        return self._iter_verified(chunks, self._get_mac())
+
+    def _iter_tagged(self, chunks, mac):
+        for chunk in chunks:
+            mac.update(chunk)
+            yield chunk
+        yield mac.digest()
+
+    def _iter_verified(self, chunks, mac):
+        """Yield ciphertext chunks, holding back the last `digest_size` bytes
+        as the tag. Once `chunks` is exhausted the tag is compared in
+        constant time and ValueError is raised on a mismatch, before the
+        caller sees the end of the stream. Chunks yielded until then are
+        unauthenticated and must be discarded when the check fails.
+        """
+        tag_size = mac.digest_size
+        held = ""
+        for chunk in chunks:
+            if len(chunk) >= tag_size:
+                if held:
+                    mac.update(held)
+                    yield held
+                text = chunk[:-tag_size]
+                held = chunk[-tag_size:]
+            else:
+                held += str(chunk)
+                text = held[:-tag_size]
+                held = held[-tag_size:]
+            if text:
+                mac.update(text)
+                yield text
+
+        if len(held) != tag_size or not compare_digest(mac.digest(), held):
+            raise ValueError(
+                "MAC check failed: the ciphertext was modified or the MAC " +
+                "key is wrong."
+            )
+
+    def _read_stream(self, src, chunk_size):
+        """Return an iterator of `chunk_size` byte chunks of file-like object
+        `src`.
+        """
+        return iter_chunks(src, chunk_size)
+
+    def _write_stream(self, dst, chunks):
+        """Write each chunk to file-like object `dst`. Returns the number of
+        bytes written.
+        """
+        written = 0
+        for chunk in chunks:
+            dst.write(chunk)
+            written += len(chunk)
+        return written
+
     def encrypt(self, plaintext):
         raise NotImplementedError("Method not defined.")
 
     def decrypt(self, ciphertext):
         raise NotImplementedError("Method not defined.")
 
-    def set_encoding(self, encoder):
+    def decrypt_many(self, ciphertexts):
+        """Decrypt each of an iterable of ciphertexts, returning a list of
+        plaintexts.
+        """
+        return [self.decrypt(ciphertext) for ciphertext in ciphertexts]
+
+    def encrypt_many(self, plaintexts):
+        """Encrypt each of an iterable of plaintexts, returning a list of
+        ciphertexts.
+        """
+        return [self.encrypt(plaintext) for plaintext in plaintexts]
+
+    def iter_encrypt(self, chunks, size=None, workers=None):
+        raise NotImplementedError("Method not defined.")
+
+    def iter_decrypt(self, chunks, workers=None):
+        raise NotImplementedError("Method not defined.")
+
+    def encrypt_stream(
+        self,
+        src,
+        dst,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        size=None,
+        workers=None
+    ):
+        """Encrypt file-like object `src` `chunk_size` bytes at a time and
+        write the encoded ciphertext to file-like object `dst`. `size` is the
+        number of plaintext bytes and is looked up from `src` when omitted.
+        `workers` is the number of threads to use where the cipher supports
+        it. Returns the number of bytes written.
+        """
+        if size is None:
+            size = get_stream_size(src)
+        return self._write_stream(
+            dst,
+            self.iter_encrypt(
+                self._read_stream(src, chunk_size),
+                size=size,
+                workers=workers
+            )
+        )
+
+    def decrypt_stream(
+        self,
+        src,
+        dst,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        workers=None
+    ):
+        """Decrypt file-like object `src` `chunk_size` bytes at a time and
+        write the plaintext to file-like object `dst`. `workers` is the number
+        of threads to use where the cipher supports it. Returns the number of
+        bytes written.
+        """
+        return self._write_stream(
+            dst,
+            self.iter_decrypt(
+                self._read_stream(src, chunk_size),
+                workers=workers
+            )
+        )
+
+    def set_encoding(self, encoder, wrap=None):
         """Set encoder and decoder methods to be applied to text when encrypting
-        and decrypting.
+        and decrypting. When `wrap` is set, streamed output is split into lines
+        of that many characters.
         """
         if not isinstance(encoder, Encoder):
             raise TypeError("Encoder")
         self._encoder = encoder.encode
         self._decoder = encoder.decode
+        self._stream_encoder = encoder.stream_encoder
+        self._stream_decoder = encoder.stream_decoder
+        self._wrap = wrap
 
 
 class BlockCipher(CryptoCipher):
     """Base Class for Block Ciphers."""
-    attributes = ('key', 'iv', 'mode')
+    attributes = ('key', 'iv', 'mode', 'padding')
     block_size = 0
     cipher = None
+    cipher_cache = default_cache  # Set to None to disable caching.
     default_mode = 'ECB'
+    default_padding = 'RANDOM'
+    # Pycrypto 2.6 OFB only accepts whole blocks, so it is not a stream mode.
     supported_modes = {
-        'CBC': BlockCipherMode(blockalgo.MODE_CBC, True, False),
-        'CFB': BlockCipherMode(blockalgo.MODE_CFB, True, False),
-        'CTR': BlockCipherMode(blockalgo.MODE_CTR, False, True),
-        'ECB': BlockCipherMode(blockalgo.MODE_ECB, False, False),
-        'OFB': BlockCipherMode(blockalgo.MODE_OFB, True, False)
+        'CBC': BlockCipherMode(
+            blockalgo.MODE_CBC, True, False, False, True, False
+        ),
+        'CFB': BlockCipherMode(
+            blockalgo.MODE_CFB, True, False, False, False, True
+        ),
+        'CTR': BlockCipherMode(
+            blockalgo.MODE_CTR, False, True, True, True, True
+        ),
+        'ECB': BlockCipherMode(
+            blockalgo.MODE_ECB, False, False, True, True, False
+        ),
+        'OFB': BlockCipherMode(
+            blockalgo.MODE_OFB, True, False, False, False, False
+        )
     }
 
-    def __init__(self, key=None, iv=None, mode=None, initial_value=1):
+    def __init__(
+        self,
+        key=None,
+        iv=None,
+        mode=None,
+        initial_value=1,
+        padding=None
+    ):
         super(BlockCipher, self).__init__(key)
         self.mode = mode or self.default_mode
+        self.padding = padding or self.default_padding
         self._iv = iv
         self.initial_value = initial_value
 
@@ -128,9 +403,59 @@ class BlockCipher(CryptoCipher):
             raise AttributeError("Chaining mode not supported.")
         self._mode = self.supported_modes[value]
 
+    @property
+    def padding(self):
+        return self._padding
+
+    @padding.setter
+    def padding(self, value):
+        """Set padding scheme by mapping name (string) to a scheme in
+        `padding.PADDINGS`.
+        """
+        if value not in PADDINGS:
+            raise AttributeError("Padding scheme not supported.")
+        self._padding = PADDINGS[value]
+
+    @property
+    def stream_requires_size(self):
+        """True when padding is prepended, so a stream's size must be known
+        before it is encrypted.
+        """
+        return self._get_padding_scheme().prepend
+
+    def _crypt_many(self, texts, decrypt=False):
+        """Encrypt or decrypt each of a list of texts as if with a fresh
+        cipher from `_get_cipher`. ECB texts are joined and processed in a
+        single call. CTR texts all start from the same counter, so they share
+        one keystream. Other modes get a cipher per text.
+        """
+        new_cipher = self._get_cipher_factory()
+        if self.mode.mode_id == blockalgo.MODE_ECB:
+            block_size = self.cipher.block_size
+            for text in texts:
+                if len(text) % block_size:
+                    raise ValueError(
+                        "Input strings must be a multiple of %s in length" % (
+                            block_size
+                        )
+                    )
+            cipher = new_cipher()
+            crypt = cipher.decrypt if decrypt else cipher.encrypt
+            return _split(crypt("".join(texts)), [len(text) for text in texts])
+        elif self.mode.uses_counter:
+            keystream = new_cipher().encrypt(
+                "\0" * max([len(text) for text in texts] or [0])
+            )
+            return [xor_bytes(text, keystream[:len(text)]) for text in texts]
+        elif decrypt:
+            return [new_cipher().decrypt(text) for text in texts]
+        else:
+            return [new_cipher().encrypt(text) for text in texts]
+
     def _get_cipher(self):
         """Return a stateful cipher instance.
-        `key`, `mode` and depending on mode `iv` must be set.
+        `key`, `mode` and depending on mode `iv` must be set. ECB instances
+        come from `cipher_cache` when it is set.
         """
         if not self.cipher:
             raise NotImplemented("No cipher set.")
@@ -143,58 +468,372 @@ class BlockCipher(CryptoCipher):
             )
         elif self.mode.requires_iv:
             return self.cipher.new(self.key, self.mode.mode_id, self.iv)
+        elif self.cipher_cache is not None:
+            # ECB keeps no state between blocks, so instances can be reused.
+            key = self.key
+            mode_id = self.mode.mode_id
+            return self.cipher_cache.get(
+                self.cipher,
+                key,
+                mode_id,
+                lambda: self.cipher.new(key, mode_id)
+            )
         else:
             return self.cipher.new(self.key, self.mode.mode_id)
 
-    def _get_counter(self):
+    def _get_cipher_factory(self):
+        """Return a function that creates stateful cipher instances like
+        `_get_cipher`, with `key`, `mode` and `iv` looked up once. ECB keeps
+        no state between blocks, so a single instance is shared.
+        """
+        if not self.cipher:
+            raise NotImplemented("No cipher set.")
+
+        key = self.key
+        mode_id = self.mode.mode_id
+        if self.mode.uses_counter:
+            return lambda: self.cipher.new(
+                key,
+                mode_id,
+                counter=self._get_counter()
+            )
+        elif self.mode.requires_iv:
+            iv = self.iv
+            return lambda: self.cipher.new(key, mode_id, iv)
+        else:
+            cipher = self._get_cipher()
+            return lambda: cipher
+
+    def _get_counter(self, initial_value=None):
         """Returns a stateful Counter instance. Uses Pycrypto's incrementing
         function, where each counter block size is equal to the forward
         cipher's block size (in bytes). No prefix or suffix is applied; wrap
-        arounds are disallowed to ensure uniqueness.
+        arounds are disallowed to ensure uniqueness. Counting starts from the
+        object's `initial_value` unless `initial_value` is given.
         """
+        if initial_value is None:
+            initial_value = self.initial_value
+
         return Counter.new(
             self.cipher.block_size * 8,
-            initial_value=self.initial_value,
+            initial_value=initial_value,
             allow_wraparound=False
         )
 
-    def _get_pad_char(self, ignore=None):
-        """Return a random character to pad text that does not match ignore."""
-        random_device = Random.new()
-        while True:
-            char = random_device.read(1)
-            if char != ignore:
-                return char
+    def _get_segment_cipher(self, offset, previous=""):
+        """Return a stateful cipher instance that starts `offset` bytes into
+        the stream, where `previous` is the ciphertext block preceding it.
+        `offset` must fall on a block boundary. Chaining modes are seeded with
+        the previous block as their IV, which is only valid when decrypting.
+        """
+        if self.mode.uses_counter:
+            return self.cipher.new(
+                self.key,
+                self.mode.mode_id,
+                counter=self._get_counter(
+                    self.initial_value + offset // self.cipher.block_size
+                )
+            )
+        elif self.mode.requires_iv:
+            return self.cipher.new(
+                self.key,
+                self.mode.mode_id,
+                previous or self.iv
+            )
+        else:
+            return self._get_cipher()
+
+    def _iter_crypt(self, blocks, decrypt=False, workers=None):
+        """Encrypt or decrypt an iterable of block aligned text. When
+        `workers` is set and the mode allows it, segments of the stream are
+        processed independently on that many threads. Otherwise a single
+        stateful cipher is used.
+        """
+        if decrypt:
+            parallel = self.mode.parallel_decrypt
+        else:
+            parallel = self.mode.parallel_encrypt
+
+        if workers is None or not parallel:
+            cipher = self._get_cipher()
+            crypt = cipher.decrypt if decrypt else cipher.encrypt
+            return (crypt(block) for block in blocks)
+
+        def crypt_segment(segment):
+            offset, previous, text = segment
+            cipher = self._get_segment_cipher(offset, previous)
+            return cipher.decrypt(text) if decrypt else cipher.encrypt(text)
+
+        segments = iter_segments(blocks, tail_size=self.cipher.block_size)
+        return iter_parallel(crypt_segment, segments, workers)
+
+    def _get_mac_header(self):
+        """The chaining mode, padding scheme, counter start and IV are
+        authenticated along with the ciphertext, as each changes how it
+        decrypts.
+        """
+        initial_value = self.initial_value if self.mode.uses_counter else 0
+        return "%s:%s:%s:%s" % (
+            self.mode.mode_id,
+            self._get_padding_scheme().__class__.__name__,
+            initial_value,
+            self.iv if self.mode.requires_iv else ""
+        )
+
+    def _get_padding_scheme(self):
+        """Return the padding scheme to apply. Stream modes accept text of any
+        length, so standard schemes are skipped for them. The legacy prepended
+        scheme is kept so existing ciphertexts still decrypt.
+        """
+        if self.mode.stream and not self._padding.prepend:
+            return PADDINGS['NONE']
+        return self._padding
+
+    def _iter_padded(self, chunks, scheme):
+        """Yield chunks followed by the padding that `scheme` appends."""
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        yield scheme.get_padding(size, self.cipher.block_size)
+
+    def _unpad_stream(self, chunks):
+        """Strip padding from an iterable of plaintext chunks. Padding is
+        never longer than a block, so only the first non-empty chunk is
+        touched when it is prepended, and only the last one otherwise.
+        """
+        scheme = self._get_padding_scheme()
+        chunks = iter(chunks)
+        if scheme.prepend:
+            for chunk in chunks:
+                if chunk:
+                    yield scheme.unpad(chunk, self.cipher.block_size)
+                    break
+
+            for chunk in chunks:
+                yield chunk
+            return
+
+        last = ""
+        for chunk in chunks:
+            if chunk:
+                if last:
+                    yield last
+                last = chunk
+
+        text = scheme.unpad(last, self.cipher.block_size)
+        if text:
+            yield text
+
+    def decrypt(self, ciphertext, workers=None):
+        """Generate cipher, decode, and decrypt data. When `workers` is set,
+        modes that allow it are decrypted on that many threads.
+        """
+        if workers is not None or self._mac_key is not None:
+            return "".join(self.iter_decrypt([ciphertext], workers=workers))
 
-    def decrypt(self, ciphertext):
-        """Generate cipher, decode, and decrypt data."""
         cipher = self._get_cipher()
         decoded_ciphertext = self._decode(ciphertext)
         plaintext = cipher.decrypt(decoded_ciphertext)
         return self.unpad(plaintext)
 
-    def encrypt(self, plaintext):
-        """Generate cipher, encrypt, and encode data."""
+    def decrypt_many(self, ciphertexts):
+        """Decode and decrypt each of an iterable of ciphertexts, returning a
+        list of plaintexts. Key setup and decoder lookup happen once for the
+        batch. See `_crypt_many` for how the batch is decrypted. Each
+        ciphertext is decrypted on its own when they are authenticated.
+        """
+        if self._mac_key is not None:
+            return super(BlockCipher, self).decrypt_many(ciphertexts)
+
+        decode = self._decoder
+        if hasattr(decode, "__call__"):
+            texts = [decode(ciphertext) for ciphertext in ciphertexts]
+        else:
+            texts = list(ciphertexts)
+
+        unpad = self.unpad
+        return [
+            unpad(plaintext)
+            for plaintext in self._crypt_many(texts, decrypt=True)
+        ]
+
+    def decrypt_range(self, src, offset, length=None):
+        """Decrypt and return `length` bytes of plaintext, or up to the end,
+        starting `offset` bytes in (counted from the end when negative).
+        `src` is unencoded ciphertext, as a string or a seekable file-like
+        object. See `iter_decrypt_range`.
+        """
+        return "".join(self.iter_decrypt_range(src, offset, length))
+
+    def encrypt(self, plaintext, workers=None):
+        """Generate cipher, encrypt, and encode data. When `workers` is set,
+        modes that allow it are encrypted on that many threads.
+        """
+        if workers is not None or self._mac_key is not None:
+            return "".join(
+                self.iter_encrypt([plaintext], len(plaintext), workers=workers)
+            )
+
         cipher = self._get_cipher()
         padded_plaintext = self.pad(plaintext, self.cipher.block_size)
         ciphertext = cipher.encrypt(padded_plaintext)
         return self._encode(ciphertext)
 
+    def encrypt_many(self, plaintexts):
+        """Encrypt and encode each of an iterable of plaintexts, returning a
+        list of ciphertexts. Key setup, random padding reads and encoder
+        lookup happen once for the batch. See `_crypt_many` for how the batch
+        is encrypted. Each plaintext is encrypted on its own when they are
+        authenticated.
+        """
+        if self._mac_key is not None:
+            return super(BlockCipher, self).encrypt_many(plaintexts)
+
+        padded = self._get_padding_scheme().pad_many(
+            list(plaintexts),
+            self.cipher.block_size
+        )
+        ciphertexts = self._crypt_many(padded)
+
+        encode = self._encoder
+        if hasattr(encode, "__call__"):
+            return [encode(ciphertext) for ciphertext in ciphertexts]
+        return ciphertexts
+
     def generate_iv(self):
         """Randomly generate an IV byte string of the object's block size.
         This has miniscule odds of producing a non-unique IV, which may be
         unsafe for OFB mode.
         """
-        return Random.new().read(self.cipher.block_size)
+        return default_pool.read(self.cipher.block_size)
+
+    def iter_decrypt(self, chunks, workers=None):
+        """Return a generator that decodes and decrypts an iterable of
+        ciphertext chunks, yielding plaintext. See `_iter_crypt` for
+        `workers`.
+        """
+        blocks = iter_aligned(
+            self._check_tag(self._decode_stream(chunks)),
+            self.cipher.block_size
+        )
+        return self._unpad_stream(
+            self._iter_crypt(blocks, decrypt=True, workers=workers)
+        )
+
+    def iter_decrypt_range(
+        self,
+        src,
+        offset,
+        length=None,
+        chunk_size=DEFAULT_CHUNK_SIZE
+    ):
+        """Yield the plaintext of a byte range of ciphertext `src` (see
+        `decrypt_range`), `chunk_size` bytes at a time. Only the blocks the
+        range covers are read and decrypted, plus the first block when the
+        padding is prepended and the last when the range reaches appended
+        padding. Modes whose blocks can be decrypted independently (CTR, ECB,
+        CBC) are supported.
+        """
+        if not self.mode.parallel_decrypt:
+            raise AttributeError(
+                "Range decryption requires CTR, ECB or CBC mode."
+            )
+        if self._decoder not in (None, do_nothing):
+            raise AttributeError("Range decryption requires unencoded text.")
+        if self._mac_key is not None:
+            raise AttributeError("Range decryption cannot check a MAC.")
+        if not hasattr(src, 'seek'):
+            src = StringIO.StringIO(src)
+
+        block_size = self.cipher.block_size
+        chunk_size = max(chunk_size - chunk_size % block_size, block_size)
+        scheme = self._get_padding_scheme()
+        src.seek(0, os.SEEK_END)
+        size = src.tell()
+        if size % block_size and not self.mode.stream:
+            raise ValueError(
+                "Ciphertext must be a multiple of %s in length" % block_size
+            )
+
+        def read_blocks(start, end):
+            """Return the plaintext of the blocks from `start` to `end`."""
+            previous = ""
+            if start and self.mode.requires_iv:
+                src.seek(start - block_size)
+                previous = src.read(block_size)
+            src.seek(start)
+            cipher = self._get_segment_cipher(start, previous)
+            return cipher.decrypt(src.read(end - start))
+
+        # Prepended padding shifts the plaintext; appended padding ends it
+        # early. Either is found by decrypting the block that holds it.
+        start = 0
+        end = size
+        if scheme.prepend and size:
+            first = read_blocks(0, block_size)
+            start = block_size - len(scheme.unpad(first, block_size))
+        elif size and scheme is not PADDINGS['NONE']:
+            last = read_blocks(size - block_size, size)
+            end -= block_size - len(scheme.unpad(last, block_size))
+
+        if offset < 0:
+            offset = max(end - start + offset, 0)
+        position = min(start + offset, end)
+        if length is not None:
+            end = min(position + length, end)
+
+        # Whole blocks are decrypted; `skip` drops the bytes before `offset`.
+        skip = position % block_size
+        position -= skip
+        while position < end:
+            stop = min(position + chunk_size, end)
+            aligned = min(stop + -stop % block_size, size)
+            yield read_blocks(position, aligned)[skip:stop - position]
+            skip = 0
+            position = stop
+
+    def iter_encrypt(self, chunks, size=None, workers=None):
+        """Return a generator that encrypts and encodes an iterable of
+        plaintext chunks, yielding ciphertext. When the padding scheme
+        prepends padding, the total plaintext `size` must be known; otherwise
+        only the final chunk is padded. See `_iter_crypt` for `workers`.
+        """
+        block_size = self.cipher.block_size
+        scheme = self._get_padding_scheme()
+        if scheme.prepend:
+            if size is None:
+                raise ValueError("size is required to pad a plaintext stream.")
+
+            chunks = iter(chunks)
+            first = next(chunks, "")
+            padding = scheme.get_padding(size, block_size, ignore=first[:1])
+            chunks = itertools.chain([padding, first], chunks)
+        else:
+            chunks = self._iter_padded(chunks, scheme)
+
+        blocks = iter_aligned(chunks, block_size)
+        return self._encode_stream(
+            self._add_tag(self._iter_crypt(blocks, workers=workers))
+        )
 
     def pad(self, text, block_size):
-        """Left pad text with a random character. Always add padding."""
-        pad_char = self._get_pad_char(ignore=text[0])
-        pad_size = (block_size - len(text)) % block_size or block_size
-        return (pad_char * pad_size) + text
+        """Pad text with the cipher's padding scheme."""
+        return self._get_padding_scheme().pad(text, block_size)
 
     def unpad(self, text):
         """Strip padding from text. It is expected that the `pad`
         method (or equivalent) has been applied.
         """
-        return text.lstrip(text[0])
+        block_size = self.cipher.block_size if self.cipher else self.block_size
+        return self._get_padding_scheme().unpad(text, block_size)
+
+
+def _split(text, sizes):
+    """Split text into consecutive pieces of the given sizes."""
+    pieces = []
+    offset = 0
+    for size in sizes:
+        pieces.append(text[offset:offset + size])
+        offset += size
+    return pieces
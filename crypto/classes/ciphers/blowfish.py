@@ -1,5 +1,5 @@
 from crypto.classes.ciphers.base import BlockCipher
-from Crypto import Random
+from crypto.classes.entropy import default_pool
 from Crypto.Cipher import Blowfish
 
 
@@ -7,9 +7,22 @@ class BlowfishCipher(BlockCipher):
     """Blowfish symmetric block cipher."""
     cipher = Blowfish
 
-    def __init__(self, key=None, iv=None, mode=None, initial_value=1):
+    def __init__(
+        self,
+        key=None,
+        iv=None,
+        mode=None,
+        initial_value=1,
+        padding=None
+    ):
         """initial_value is only applied to CTR."""
-        super(BlowfishCipher, self).__init__(key, iv, mode, initial_value)
+        super(BlowfishCipher, self).__init__(
+            key,
+            iv,
+            mode,
+            initial_value,
+            padding
+        )
 
     @BlockCipher.key.setter
     def key(self, value):
@@ -27,5 +40,4 @@ class BlowfishCipher(BlockCipher):
             raise AttributeError(
                 "key_size must be between 4 and 56 bytes."
             )
-        random_device = Random.new()
-        return random_device.read(key_size)
+        return default_pool.read(key_size)
@@ -0,0 +1,96 @@
+import hashlib
+import itertools
+import threading
+
+
+"""Bounded LRU cache of keyed cipher primitives, so repeated operations under
+the same key skip key expansion. Only stateless primitives may be cached;
+pycrypto cipher objects cannot be re-initialised with a new IV or counter, so
+in practice this means ECB instances.
+"""
+
+DEFAULT_CACHE_SIZE = 32
+
+
+class CipherCache(object):
+    """LRU cache of cipher instances keyed on (algorithm, key digest, mode).
+    Keys are stored as digests rather than raw key material. A `max_size` of
+    0 disables caching. Safe to use from several threads.
+    """
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self._entries = {}
+        self._ticks = itertools.count()
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        if value < 0:
+            raise AttributeError("max_size must not be negative.")
+        with self._lock:
+            self._max_size = value
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits. The cache
+        is small, so a scan for the oldest entry is cheaper than keeping
+        entries ordered on every hit.
+        """
+        while len(self._entries) > self._max_size:
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def get(self, algorithm, key, mode_id, factory):
+        """Return the cached instance for `algorithm` (a pycrypto cipher
+        module), `key` and `mode_id`, calling `factory` to create and cache
+        it on a miss.
+        """
+        entry_key = (
+            algorithm.__name__,
+            hashlib.sha256(key).digest(),
+            mode_id
+        )
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                self.hits += 1
+                self._entries[entry_key] = (next(self._ticks), entry[1])
+                return entry[1]
+            self.misses += 1
+
+        cipher = factory()
+        with self._lock:
+            if self._max_size:
+                self._entries[entry_key] = (next(self._ticks), cipher)
+                self._evict()
+        return cipher
+
+    def stats(self):
+        """Return a dictionary of the cache's size and counters."""
+        return {
+            'evictions': self.evictions,
+            'hits': self.hits,
+            'max_size': self._max_size,
+            'misses': self.misses,
+            'size': len(self._entries)
+        }
+
+
+default_cache = CipherCache()
@@ -1,5 +1,5 @@
 from crypto.classes.ciphers.base import BlockCipher
-from Crypto import Random
+from crypto.classes.entropy import default_pool
 from Crypto.Cipher import CAST
 
 
@@ -7,9 +7,22 @@ class CASTCipher(BlockCipher):
     """CAST-128 symmetric block cipher."""
     cipher = CAST
 
-    def __init__(self, key=None, iv=None, mode=None, initial_value=1):
+    def __init__(
+        self,
+        key=None,
+        iv=None,
+        mode=None,
+        initial_value=1,
+        padding=None
+    ):
         """initial_value is only applied to CTR."""
-        super(CASTCipher, self).__init__(key, iv, mode, initial_value)
+        super(CASTCipher, self).__init__(
+            key,
+            iv,
+            mode,
+            initial_value,
+            padding
+        )
 
     @BlockCipher.key.setter
     def key(self, value):
@@ -27,5 +40,4 @@ class CASTCipher(BlockCipher):
             raise AttributeError(
                 "key_size must be between 5 and 16 bytes."
             )
-        random_device = Random.new()
-        return random_device.read(key_size)
+        return default_pool.read(key_size)
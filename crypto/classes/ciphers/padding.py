@@ -0,0 +1,166 @@
+from crypto.classes.entropy import default_pool
+
+
+"""Padding schemes for block ciphers. Each scheme is a stateless object with
+`pad` and `unpad` methods. Standard schemes append padding, so streamed text
+is padded once its final chunk has been seen; their `unpad` inspects only the
+last block and does the same amount of work whatever the padding looks like.
+"""
+
+
+def _equal(a, b):
+    """Return 1 when bytes values a and b are equal, otherwise 0, without
+    branching on their values.
+    """
+    return ((a ^ b) - 1) >> 8 & 1
+
+
+def _last_block(text, block_size):
+    """Return the last block of text as a bytearray."""
+    if not text or len(text) % block_size:
+        raise ValueError("Padded text must be a multiple of %s in length" % (
+            block_size
+        ))
+    return bytearray(text[-block_size:])
+
+
+class Padding(object):
+    """Base Class for padding schemes. `prepend` is True for schemes that
+    pad the start of the text, which means a stream's length must be known
+    before it can be padded.
+    """
+    prepend = False
+
+    def get_padding(self, size, block_size, ignore=None):
+        """Return the padding for `size` bytes of text. `ignore` is the first
+        byte of the text.
+        """
+        raise NotImplementedError("Method not defined.")
+
+    def pad(self, text, block_size):
+        """Return text padded to a multiple of `block_size`."""
+        padding = self.get_padding(len(text), block_size, ignore=text[:1])
+        return padding + text if self.prepend else text + padding
+
+    def pad_many(self, texts, block_size):
+        """Pad each of a list of texts."""
+        return [self.pad(text, block_size) for text in texts]
+
+    def unpad(self, text, block_size):
+        raise NotImplementedError("Method not defined.")
+
+
+class NoPadding(Padding):
+    """Leave text unchanged. Input to block modes must already be a multiple
+    of the block size.
+    """
+    def get_padding(self, size, block_size, ignore=None):
+        return ""
+
+    def unpad(self, text, block_size):
+        return text
+
+
+class PKCS7Padding(Padding):
+    """Append N bytes of value N (PKCS#7, RFC 5652)."""
+    def get_padding(self, size, block_size, ignore=None):
+        pad_size = block_size - size % block_size
+        return chr(pad_size) * pad_size
+
+    def unpad(self, text, block_size):
+        block = _last_block(text, block_size)
+        pad_size = block[-1]
+        invalid = _equal(pad_size, 0) | (block_size - pad_size) >> 8 & 1
+        for i in xrange(block_size):
+            in_padding = (i - pad_size) >> 8 & 1
+            invalid |= in_padding & (_equal(block[-1 - i], pad_size) ^ 1)
+        if invalid:
+            raise ValueError("Invalid padding.")
+        return text[:-pad_size]
+
+
+class ANSIX923Padding(Padding):
+    """Append zero bytes followed by a byte holding the padding length (ANSI
+    X9.23).
+    """
+    def get_padding(self, size, block_size, ignore=None):
+        pad_size = block_size - size % block_size
+        return "\0" * (pad_size - 1) + chr(pad_size)
+
+    def unpad(self, text, block_size):
+        block = _last_block(text, block_size)
+        pad_size = block[-1]
+        invalid = _equal(pad_size, 0) | (block_size - pad_size) >> 8 & 1
+        for i in xrange(1, block_size):
+            in_padding = (i - pad_size) >> 8 & 1
+            invalid |= in_padding & (_equal(block[-1 - i], 0) ^ 1)
+        if invalid:
+            raise ValueError("Invalid padding.")
+        return text[:-pad_size]
+
+
+class ISO7816Padding(Padding):
+    """Append a 0x80 byte followed by zero bytes (ISO/IEC 7816-4)."""
+    def get_padding(self, size, block_size, ignore=None):
+        return "\x80" + "\0" * (block_size - size % block_size - 1)
+
+    def unpad(self, text, block_size):
+        block = _last_block(text, block_size)
+        found = 0
+        invalid = 0
+        pad_size = 0
+        for i in xrange(block_size):
+            byte = block[-1 - i]
+            searching = found ^ 1
+            is_marker = _equal(byte, 0x80)
+            invalid |= searching & ((is_marker | _equal(byte, 0)) ^ 1)
+            pad_size |= (i + 1) * (searching & is_marker)
+            found |= is_marker
+        if invalid | (found ^ 1):
+            raise ValueError("Invalid padding.")
+        return text[:-pad_size]
+
+
+class RandomPadding(Padding):
+    """Legacy scheme: left pad text with a run of a random character that
+    differs from the text's first character. Padding is always added.
+    """
+    prepend = True
+
+    def _get_pad_char(self, ignore=None):
+        """Return a random character that does not match ignore."""
+        while True:
+            char = default_pool.read(1)
+            if char != ignore:
+                return char
+
+    def get_padding(self, size, block_size, ignore=None):
+        pad_char = self._get_pad_char(ignore=ignore)
+        pad_size = (block_size - size) % block_size or block_size
+        return pad_char * pad_size
+
+    def pad_many(self, texts, block_size):
+        """Pad each of a list of texts, reading the random pad characters for
+        the whole list at once.
+        """
+        padded = []
+        pad_chars = default_pool.read(len(texts))
+        for text, pad_char in zip(texts, pad_chars):
+            if pad_char == text[:1]:
+                pad_char = self._get_pad_char(ignore=text[:1])
+            pad_size = (block_size - len(text)) % block_size or block_size
+            padded.append(pad_char * pad_size + text)
+        return padded
+
+    def unpad(self, text, block_size=None):
+        """Strip the leading run of the first character."""
+        return text.lstrip(text[0])
+
+
+PADDINGS = {
+    'ANSIX923': ANSIX923Padding(),
+    'ISO7816': ISO7816Padding(),
+    'NONE': NoPadding(),
+    'PKCS7': PKCS7Padding(),
+    'RANDOM': RandomPadding()
+}
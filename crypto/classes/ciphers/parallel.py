@@ -0,0 +1,58 @@
+import collections
+
+
+"""Helpers for running a cipher over independent segments of data on a pool of
+threads. Pycrypto releases the GIL while it encrypts or decrypts, so segments
+are processed in parallel across cores without copying them between
+processes. multiprocessing is slow to import, so it is only loaded once a
+pool is needed.
+"""
+
+SEGMENT_SIZE = 256 * 1024  # Must be a multiple of every cipher's block size.
+
+
+def get_worker_count(workers=None):
+    """Return `workers`, or the number of CPUs when it is 0 or None."""
+    if workers:
+        return workers
+    from multiprocessing import cpu_count
+    return cpu_count()
+
+
+def iter_parallel(function, items, workers=None):
+    """Apply `function` to each of `items` on a pool of `workers` threads and
+    yield the results in order. At most two items per worker are in flight at
+    a time, so memory use does not depend on the number of items.
+    """
+    from multiprocessing.pool import ThreadPool
+    workers = get_worker_count(workers)
+    pool = ThreadPool(workers)
+    try:
+        results = collections.deque()
+        for item in items:
+            results.append(pool.apply_async(function, (item,)))
+            if len(results) >= workers * 2:
+                yield results.popleft().get()
+
+        while results:
+            yield results.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def iter_segments(chunks, segment_size=SEGMENT_SIZE, tail_size=0):
+    """Split an iterable of chunks into buffers of at most `segment_size`
+    bytes, yielding (offset, tail, segment) tuples where offset is the
+    position of the segment in the stream and tail is the `tail_size` bytes
+    that precede it ("" for the first segment).
+    """
+    offset = 0
+    tail = ""
+    for chunk in chunks:
+        for position in xrange(0, len(chunk), segment_size):
+            segment = buffer(chunk, position, segment_size)
+            yield offset, tail, segment
+            offset += len(segment)
+            if tail_size:
+                tail = segment[-tail_size:]
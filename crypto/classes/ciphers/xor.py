@@ -1,14 +1,40 @@
-import random
 import string
 
 from crypto.classes.ciphers.base import CryptoCipher
-from Crypto.Cipher import XOR
-from Crypto import Random
+from crypto.classes.entropy import default_pool
+from crypto.classes.util import xor_bytes
+
+
+class XORStream(object):
+    """XOR chunks of text with a repeating key of any length, carrying the
+    position in the key from one chunk to the next. The key is tiled into a
+    keystream once, so each chunk costs a slice and a single C level XOR.
+    """
+    def __init__(self, key, offset=0):
+        if not key:
+            raise AttributeError("key must not be empty.")
+        self._key = key
+        self._tiled = key
+        self.offset = offset % len(key)
+
+    def _get_keystream(self, size):
+        """Return the next `size` bytes of keystream and advance."""
+        end = self.offset + size
+        if len(self._tiled) < end:
+            self._tiled = self._key * (end // len(self._key) + 1)
+        keystream = self._tiled[self.offset:end]
+        self.offset = end % len(self._key)
+        return keystream
+
+    def update(self, text):
+        """Return text XORed with the next len(text) bytes of keystream."""
+        return xor_bytes(text, self._get_keystream(len(text)))
 
 
 class XORCipher(CryptoCipher):
-    """Implements Pycrypto bitwise XOR stream cipher. Vulnerable to frequency
-    analysis. Appropriate for hiding data, not securing it.
+    """Implements bitwise XOR stream cipher with a repeating key of any
+    length. Vulnerable to frequency analysis. Appropriate for hiding data,
+    not securing it.
     """
     attributes = ('key',)
 
@@ -17,43 +43,94 @@ class XORCipher(CryptoCipher):
 
     @CryptoCipher.key.setter
     def key(self, value):
-        if value is not None and len(value) not in XOR.key_size:
-            raise AttributeError(
-                "key must be %s - %s bytes long." % (
-                    XOR.key_size[0],
-                    XOR.key_size[-1]
-                )
-            )
+        if value is not None and not value:
+            raise AttributeError("key must be at least 1 byte long.")
         self._key = value
 
+    def _get_cipher(self):
+        """Return an XORStream starting at the beginning of the key."""
+        return XORStream(self.key)
+
     def encrypt(self, plaintext):
         """Generate cipher, encrypt, and encode data."""
-        xor_cipher = XOR.new(self.key)
-        ciphertext = xor_cipher.encrypt(plaintext)
+        if self._mac_key is not None:
+            return "".join(self.iter_encrypt([plaintext]))
+        xor_stream = self._get_cipher()
+        ciphertext = xor_stream.update(plaintext)
         return self._encode(ciphertext)
 
     def decrypt(self, ciphertext):
         """Generate cipher, decode, and decrypt data."""
-        xor_cipher = XOR.new(self.key)
+        if self._mac_key is not None:
+            return "".join(self.iter_decrypt([ciphertext]))
+        xor_stream = self._get_cipher()
         decoded_ciphertext = self._decode(ciphertext)
-        return xor_cipher.decrypt(decoded_ciphertext)
+        return xor_stream.update(decoded_ciphertext)
+
+    def iter_decrypt(self, chunks, workers=None):
+        """Return a generator that decodes and decrypts an iterable of
+        ciphertext chunks, yielding plaintext. A single XORStream carries its
+        position in the key across chunks; `workers` is ignored.
+        """
+        xor_stream = self._get_cipher()
+        return (
+            xor_stream.update(chunk)
+            for chunk in self._check_tag(self._decode_stream(chunks))
+        )
+
+    def iter_encrypt(self, chunks, size=None, workers=None):
+        """Return a generator that encrypts and encodes an iterable of
+        plaintext chunks, yielding ciphertext. `size` is not needed since no
+        padding is applied, and `workers` is ignored.
+        """
+        xor_stream = self._get_cipher()
+        return self._encode_stream(self._add_tag(
+            xor_stream.update(chunk) for chunk in chunks
+        ))
+
+    def _crypt_many(self, texts):
+        """XOR each of a list of texts from the start of the key. The texts
+        share one keystream.
+        """
+        keystream = XORStream(self.key)._get_keystream(
+            max([len(text) for text in texts] or [0])
+        )
+        return [xor_bytes(text, keystream[:len(text)]) for text in texts]
+
+    def decrypt_many(self, ciphertexts):
+        """Decode and decrypt each of an iterable of ciphertexts, returning a
+        list of plaintexts. The key and decoder are looked up once.
+        """
+        if self._mac_key is not None:
+            return super(XORCipher, self).decrypt_many(ciphertexts)
+        decode = self._decoder
+        if hasattr(decode, "__call__"):
+            ciphertexts = [decode(ciphertext) for ciphertext in ciphertexts]
+        return self._crypt_many(list(ciphertexts))
+
+    def encrypt_many(self, plaintexts):
+        """Encrypt and encode each of an iterable of plaintexts, returning a
+        list of ciphertexts. The key and encoder are looked up once.
+        """
+        if self._mac_key is not None:
+            return super(XORCipher, self).encrypt_many(plaintexts)
+        ciphertexts = self._crypt_many(list(plaintexts))
+        encode = self._encoder
+        if hasattr(encode, "__call__"):
+            return [encode(ciphertext) for ciphertext in ciphertexts]
+        return ciphertexts
 
     def generate_key(self, key_size=16, ascii_only=True):
         """Randomly generate a key of byte size `key_size`.
         Use only [a-z][A-Z] when `ascii_only` is True.
         """
-        if key_size not in XOR.key_size:
-            raise AttributeError(
-                "key must be %s - %s bytes long." % (
-                    XOR.key_size[0],
-                    XOR.key_size[-1]
-                )
-            )
+        if key_size < 1:
+            raise AttributeError("key must be at least 1 byte long.")
 
         if ascii_only:
             return "".join(
-                random.choice(string.ascii_letters) for i in xrange(key_size)
+                default_pool.choice(string.ascii_letters)
+                for i in xrange(key_size)
             )
         else:
-            random_device = Random.new()
-            return random_device.read(key_size)
+            return default_pool.read(key_size)
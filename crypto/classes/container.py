@@ -0,0 +1,277 @@
+import json
+import os
+import struct
+
+from crypto.classes.ciphers.base import BlockCipher
+from crypto.classes.ciphers.padding import PADDINGS
+from crypto.classes.entropy import default_pool
+from crypto.classes.util import DEFAULT_CHUNK_SIZE, iter_chunks
+
+
+"""Self-describing container for block cipher ciphertext that can be read
+from any offset. Plaintext is split into chunks that are encrypted
+independently, so a read only decrypts the chunks it covers.
+
+Layout, with integers big endian:
+    MAGIC, VERSION (1 byte), header length (4 bytes), JSON header
+    chunk ciphertexts, one after another
+    index: for each chunk, its offset from the first chunk (8 bytes), its
+        length (4 bytes) and, in modes that use one, its IV
+    trailer: index offset in the file (8 bytes), plaintext size (8 bytes),
+        TRAILER_MAGIC
+The header holds the algorithm, chaining mode, padding scheme, chunk size and
+the counter's initial value. Chunks in IV modes each get a random IV; CTR
+chunks continue one counter that starts at a random nonce. Only the key is
+kept outside the container. Ciphertext is not encoded.
+"""
+
+MAGIC = "PYCC"
+TRAILER_MAGIC = "PYCI"
+VERSION = 1
+
+HEADER_SIZE = struct.Struct(">I")
+INDEX_ENTRY = struct.Struct(">QI")
+TRAILER = struct.Struct(">QQ4s")
+
+
+def _get_name(mapping, value):
+    """Return the key under which `value` is held in `mapping`."""
+    for name, candidate in mapping.items():
+        if candidate is value or candidate == value:
+            return name
+    raise AttributeError("%r is not registered." % (value,))
+
+
+def get_algorithm(cipher):
+    """Return the name of a block cipher's algorithm, such as AES."""
+    if not isinstance(cipher, BlockCipher):
+        raise AttributeError("Containers require a block cipher.")
+    if cipher.mac_key is not None:
+        raise AttributeError("Containers do not support MACs.")
+    return cipher.cipher.__name__.rpartition(".")[2].upper()
+
+
+class ContainerWriter(object):
+    """Write plaintext to file-like object `f` as a container, encrypting it
+    `chunk_size` bytes at a time with `cipher`, whose key, mode and padding
+    are used. In CTR mode the cipher's `initial_value` is set to a random
+    nonce. `close` must be called (or the writer used as a context manager)
+    to write the index; the file itself is left open. The container is
+    expected to start at the beginning of `f`.
+    """
+    def __init__(self, f, cipher, chunk_size=DEFAULT_CHUNK_SIZE):
+        algorithm = get_algorithm(cipher)
+        block_size = cipher.cipher.block_size
+        if chunk_size <= 0 or chunk_size % block_size:
+            raise AttributeError(
+                "chunk_size must be a positive multiple of %s." % block_size
+            )
+        self.cipher = cipher
+        self.chunk_size = chunk_size
+        self.size = 0
+        self._f = f
+        self._index = []
+        self._offset = 0  # Bytes of ciphertext written so far.
+        self._pending = []
+        self._pending_size = 0
+        self._closed = False
+
+        if cipher.mode.uses_counter:
+            # Counting starts from a random nonce in the counter's top half.
+            half = block_size * 4
+            cipher.initial_value = (
+                int(default_pool.read(block_size // 2).encode('hex'), 16)
+                << half
+            )
+
+        header = json.dumps({
+            'algorithm': algorithm,
+            'chunk_size': chunk_size,
+            'initial_value': cipher.initial_value,
+            'mode': _get_name(cipher.supported_modes, cipher.mode),
+            'padding': _get_name(PADDINGS, cipher.padding)
+        }, sort_keys=True)
+        start = MAGIC + chr(VERSION) + HEADER_SIZE.pack(len(header)) + header
+        f.write(start)
+        self._data_start = len(start)  # `f` need not be seekable.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+
+    def _write_chunk(self, text):
+        """Encrypt one chunk of plaintext and append it and its entry."""
+        cipher = self.cipher
+        iv = cipher.generate_iv() if cipher.mode.requires_iv else ""
+        primitive = cipher._get_segment_cipher(self._offset, iv)
+        ciphertext = primitive.encrypt(
+            cipher.pad(text, cipher.cipher.block_size)
+        )
+        self._f.write(ciphertext)
+        self._index.append((self._offset, len(ciphertext), iv))
+        self._offset += len(ciphertext)
+
+    def close(self):
+        """Encrypt what is left and write the index and trailer."""
+        if self._closed:
+            return
+        if self._pending_size:
+            self._write_chunk("".join(self._pending))
+        index_offset = self._data_start + self._offset
+        self._f.write("".join(
+            INDEX_ENTRY.pack(offset, length) + iv
+            for offset, length, iv in self._index
+        ))
+        self._f.write(TRAILER.pack(index_offset, self.size, TRAILER_MAGIC))
+        self._closed = True
+
+    def write(self, data):
+        """Buffer data, encrypting each chunk once it is complete."""
+        if self._closed:
+            raise ValueError("Container is closed.")
+        self.size += len(data)
+        data = str(data)
+        while data:
+            piece = data[:self.chunk_size - self._pending_size]
+            self._pending.append(piece)
+            self._pending_size += len(piece)
+            data = data[len(piece):]
+            if self._pending_size == self.chunk_size:
+                self._write_chunk("".join(self._pending))
+                self._pending = []
+                self._pending_size = 0
+
+
+class ContainerReader(object):
+    """Read-only, seekable file-like view of the plaintext in a container.
+    `cipher` only needs its key: it must be of the algorithm named in the
+    header, and its mode, padding and initial value are set from the header.
+    Reads decrypt only the chunks they cover, keeping the last one decrypted.
+    """
+    def __init__(self, f, cipher):
+        self._f = f
+        f.seek(0)
+        start = f.read(len(MAGIC) + 1 + HEADER_SIZE.size)
+        if len(start) < len(MAGIC) + 1 + HEADER_SIZE.size or (
+            start[:len(MAGIC)] != MAGIC
+        ):
+            raise ValueError("Not a container.")
+        if ord(start[len(MAGIC)]) != VERSION:
+            raise ValueError(
+                "Unsupported container version %s." % ord(start[len(MAGIC)])
+            )
+        header_size, = HEADER_SIZE.unpack(start[len(MAGIC) + 1:])
+        self.header = json.loads(f.read(header_size))
+        self._data_start = f.tell()
+
+        if get_algorithm(cipher) != self.header['algorithm']:
+            raise AttributeError(
+                "Container was written with %s." % self.header['algorithm']
+            )
+        cipher.mode = str(self.header['mode'])
+        cipher.padding = str(self.header['padding'])
+        cipher.initial_value = self.header['initial_value']
+        self.cipher = cipher
+        self.chunk_size = self.header['chunk_size']
+
+        f.seek(-TRAILER.size, os.SEEK_END)
+        trailer_start = f.tell()
+        index_offset, self.size, magic = TRAILER.unpack(f.read(TRAILER.size))
+        if magic != TRAILER_MAGIC:
+            raise ValueError("Container is truncated.")
+
+        iv_size = cipher.cipher.block_size if cipher.mode.requires_iv else 0
+        entry_size = INDEX_ENTRY.size + iv_size
+        f.seek(index_offset)
+        index = f.read(trailer_start - index_offset)
+        self._index = []
+        for position in xrange(0, len(index), entry_size):
+            offset, length = INDEX_ENTRY.unpack_from(index, position)
+            iv = index[position + INDEX_ENTRY.size:position + entry_size]
+            self._index.append((offset, length, iv))
+        if len(self._index) != -(-self.size // self.chunk_size):
+            raise ValueError("Container index does not match its size.")
+
+        self._position = 0
+        self._cached = (None, "")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def __len__(self):
+        return self.size
+
+    def read_chunk(self, number):
+        """Return the plaintext of chunk `number`."""
+        if self._cached[0] == number:
+            return self._cached[1]
+
+        offset, length, iv = self._index[number]
+        self._f.seek(self._data_start + offset)
+        ciphertext = self._f.read(length)
+        if len(ciphertext) != length:
+            raise ValueError("Container is truncated.")
+        primitive = self.cipher._get_segment_cipher(offset, iv)
+        plaintext = self.cipher.unpad(primitive.decrypt(ciphertext))
+        self._cached = (number, plaintext)
+        return plaintext
+
+    def iter_range(self, offset=0, length=None):
+        """Yield the plaintext from `offset` (counted from the end when
+        negative), `length` bytes long or up to the end, a chunk at a time.
+        """
+        if offset < 0:
+            offset = max(0, self.size + offset)
+        end = self.size if length is None else min(offset + length, self.size)
+        while offset < end:
+            number, skip = divmod(offset, self.chunk_size)
+            chunk = self.read_chunk(number)[skip:end - offset + skip]
+            if not chunk:
+                raise ValueError("Container is truncated.")
+            yield chunk
+            offset += len(chunk)
+
+    def read(self, size=-1):
+        length = None if size is None or size < 0 else size
+        data = "".join(self.iter_range(self._position, length))
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise IOError("Negative seek position %s." % offset)
+        self._position = offset
+
+    def tell(self):
+        return self._position
+
+
+def encrypt_container(cipher, src, dst, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write file-like object `src` to `dst` as a container. Returns the
+    number of plaintext bytes.
+    """
+    with ContainerWriter(dst, cipher, chunk_size) as writer:
+        for chunk in iter_chunks(src, chunk_size):
+            writer.write(chunk)
+    return writer.size
+
+
+def decrypt_container(cipher, src, dst, offset=0, length=None):
+    """Write the plaintext of container `src`, optionally only `length` bytes
+    from `offset`, to `dst`. Returns the number of bytes written.
+    """
+    written = 0
+    for chunk in ContainerReader(src, cipher).iter_range(offset, length):
+        dst.write(chunk)
+        written += len(chunk)
+    return written
@@ -0,0 +1,84 @@
+from crypto.classes.registry import LazyRegistry
+from crypto.classes.util import DEFAULT_CHUNK_SIZE, iter_chunks
+
+
+"""Streaming message digests over Pycrypto's `Crypto.Hash`. Several digests,
+and optionally their HMACs, are computed in a single pass over the data, so
+large inputs are read once whatever the number of algorithms.
+"""
+
+# Hash modules are imported only when chosen.
+HASHES = LazyRegistry({
+    'MD2': 'Crypto.Hash.MD2',
+    'MD4': 'Crypto.Hash.MD4',
+    'MD5': 'Crypto.Hash.MD5',
+    'RIPEMD': 'Crypto.Hash.RIPEMD',
+    'SHA1': 'Crypto.Hash.SHA',
+    'SHA224': 'Crypto.Hash.SHA224',
+    'SHA256': 'Crypto.Hash.SHA256',
+    'SHA384': 'Crypto.Hash.SHA384',
+    'SHA512': 'Crypto.Hash.SHA512'
+})
+HASH_DEFAULT = "SHA256"
+
+
+class MultiDigest(object):
+    """Feeds each chunk of data to every one of `algorithms`, given as names
+    in `HASHES`. With `hmac_key`, HMACs under that key are computed instead
+    of plain digests.
+    """
+    def __init__(self, algorithms, hmac_key=None):
+        algorithms = list(algorithms)
+        if not algorithms:
+            raise AttributeError("At least one algorithm is required.")
+        for name in algorithms:
+            if name not in HASHES:
+                raise AttributeError("Hash algorithm not supported: %s" % name)
+
+        self.algorithms = algorithms
+        self.hmac_key = hmac_key
+        self.size = 0
+        if hmac_key is None:
+            self._hashes = [HASHES[name].new() for name in algorithms]
+        else:
+            from Crypto.Hash import HMAC
+            self._hashes = [
+                HMAC.new(hmac_key, digestmod=HASHES[name])
+                for name in algorithms
+            ]
+        self._updates = [h.update for h in self._hashes]
+
+    def digests(self):
+        """Return a dictionary of algorithm names to binary digests."""
+        return dict(
+            (name, h.digest())
+            for name, h in zip(self.algorithms, self._hashes)
+        )
+
+    def hexdigests(self):
+        """Return a dictionary of algorithm names to hexadecimal digests."""
+        return dict(
+            (name, h.hexdigest())
+            for name, h in zip(self.algorithms, self._hashes)
+        )
+
+    def update(self, data):
+        """Add data to every digest."""
+        self.size += len(data)
+        for update in self._updates:
+            update(data)
+
+
+def hash_stream(
+    src,
+    algorithms=(HASH_DEFAULT,),
+    hmac_key=None,
+    chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """Read file-like object `src` `chunk_size` bytes at a time and return a
+    MultiDigest of it. See `MultiDigest` for `algorithms` and `hmac_key`.
+    """
+    digest = MultiDigest(algorithms, hmac_key)
+    for chunk in iter_chunks(src, chunk_size):
+        digest.update(chunk)
+    return digest
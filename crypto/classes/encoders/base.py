@@ -1,14 +1,33 @@
 from collections import namedtuple
 
 """This is more for organization. Encoder namedtuples include two functions:
-one for encoding data and another for decoding.
+one for encoding data and another for decoding. They may also include two
+factories for incremental coder objects, used when data is streamed. Coder
+objects have an `update` method that accepts chunks of any size and a `flush`
+method that returns whatever is left over at the end.
 """
 
-Encoder = namedtuple('Encoder', ('encode', 'decode'))
+Encoder = namedtuple(
+    'Encoder',
+    ('encode', 'decode', 'stream_encoder', 'stream_decoder')
+)
+Encoder.__new__.__defaults__ = (None, None)
 
 
 def do_nothing(value, *args, **kwargs):
     return value
 
 
-NullEncoder = Encoder(do_nothing, do_nothing)
+class NullStreamCoder(object):
+    """Incremental coder that passes chunks through unchanged."""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def flush(self):
+        return ""
+
+    def update(self, data):
+        return data
+
+
+NullEncoder = Encoder(do_nothing, do_nothing, NullStreamCoder, NullStreamCoder)
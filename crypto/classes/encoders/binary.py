@@ -1,7 +1,89 @@
 import base64
+import functools
 
 from base import Encoder
 
 
-Base64Encoder = Encoder(base64.b64encode, base64.b64decode)
-URLSafeBase64Encoder = Encoder(base64.urlsafe_b64encode, base64.urlsafe_b64decode)
+class Base64StreamEncoder(object):
+    """Incrementally base64 encode data fed in chunks of any size. Bytes that
+    do not complete a 3 byte group are carried over to the next chunk. When
+    `wrap` is set, output is split into lines of at most `wrap` characters.
+    """
+    def __init__(self, altchars=None, wrap=None):
+        self.altchars = altchars
+        self.wrap = wrap
+        self._column = 0
+        self._pending = ""
+
+    def _wrap(self, text):
+        """Insert newlines into text, continuing from the current column."""
+        if not self.wrap:
+            return text
+
+        pieces = []
+        position = 0
+        while position < len(text):
+            piece = text[position:position + self.wrap - self._column]
+            position += len(piece)
+            self._column += len(piece)
+            pieces.append(piece)
+            if self._column == self.wrap:
+                pieces.append("\n")
+                self._column = 0
+        return "".join(pieces)
+
+    def flush(self):
+        """Encode and return any carried over bytes, adding base64 padding."""
+        text = self._wrap(base64.b64encode(self._pending, self.altchars))
+        self._pending = ""
+        if self._column:
+            text += "\n"
+            self._column = 0
+        return text
+
+    def update(self, data):
+        """Encode and return as much of data as fills whole 3 byte groups."""
+        if self._pending:
+            data = self._pending + data
+        cut = len(data) - len(data) % 3
+        self._pending = data[cut:]
+        return self._wrap(base64.b64encode(data[:cut], self.altchars))
+
+
+class Base64StreamDecoder(object):
+    """Incrementally decode base64 text fed in chunks of any size. Whitespace
+    is ignored and characters that do not complete a 4 character group are
+    carried over to the next chunk.
+    """
+    def __init__(self, altchars=None):
+        self.altchars = altchars
+        self._pending = ""
+
+    def flush(self):
+        """Decode and return any carried over characters."""
+        text = self._pending
+        self._pending = ""
+        return base64.b64decode(text, self.altchars)
+
+    def update(self, text):
+        """Decode and return as much of text as fills whole 4 character
+        groups.
+        """
+        text = self._pending + "".join(str(text).split())
+        cut = len(text) - len(text) % 4
+        self._pending = text[cut:]
+        return base64.b64decode(text[:cut], self.altchars)
+
+
+Base64Encoder = Encoder(
+    base64.b64encode,
+    base64.b64decode,
+    Base64StreamEncoder,
+    Base64StreamDecoder
+)
+URLSafeBase64Encoder = Encoder(
+    base64.urlsafe_b64encode,
+    base64.urlsafe_b64decode,
+    functools.partial(Base64StreamEncoder, altchars="-_"),
+    functools.partial(Base64StreamDecoder, altchars="-_")
+)
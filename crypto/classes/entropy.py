@@ -0,0 +1,99 @@
+import os
+import threading
+
+
+"""Buffered source of cryptographically secure random bytes shared by pad, IV
+and key generation, so small reads do not each open a random device. Pycrypto's
+generator is only imported and seeded once bytes are first needed, so
+programs that never read any do not pay for it.
+"""
+
+DEFAULT_POOL_SIZE = 4096
+DEFAULT_REFILL_THRESHOLD = 1024
+
+
+class RandomPool(object):
+    """Serve random bytes from a buffer filled `pool_size` bytes at a time
+    from Pycrypto's CSPRNG. The buffer is topped up once fewer than
+    `refill_threshold` bytes are left, and reads larger than the pool go
+    straight to the device. Bytes are never served twice.
+
+    A forked child must not reuse its parent's buffered bytes or generator
+    state, so the pool reseeds itself when it notices the process id has
+    changed. Call `atfork` directly from a fork handler to reseed eagerly.
+    """
+    def __init__(
+        self,
+        pool_size=DEFAULT_POOL_SIZE,
+        refill_threshold=DEFAULT_REFILL_THRESHOLD
+    ):
+        if not 0 <= refill_threshold <= pool_size:
+            raise AttributeError(
+                "refill_threshold must be between 0 and pool_size."
+            )
+        self.pool_size = pool_size
+        self.refill_threshold = refill_threshold
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._buffer = ""
+        self._position = 0
+        self._device = None
+        self._pid = os.getpid()
+
+    def _get_device(self):
+        """Return the random device, opening it on first use."""
+        if self._device is None:
+            from Crypto import Random
+            self._device = Random.new()
+        return self._device
+
+    def _refill(self):
+        """Top the buffer up to `pool_size` bytes."""
+        remaining = self._buffer[self._position:]
+        self._buffer = remaining + self._get_device().read(
+            self.pool_size - len(remaining)
+        )
+        self._position = 0
+
+    def atfork(self):
+        """Discard buffered bytes and reseed the generator. Must be called in
+        a child process after fork, which `read` does on its own when it sees
+        a new process id.
+        """
+        from Crypto import Random
+        with self._lock:
+            Random.atfork()
+            self._reset()
+
+    def choice(self, sequence):
+        """Return a uniformly chosen element of `sequence`, which must have
+        at most 256 elements.
+        """
+        # Reject bytes past the last multiple of len(sequence) to avoid bias.
+        limit = 256 - 256 % len(sequence)
+        while True:
+            value = ord(self.read(1))
+            if value < limit:
+                return sequence[value % len(sequence)]
+
+    def read(self, size):
+        """Return `size` random bytes."""
+        if os.getpid() != self._pid:
+            self.atfork()
+
+        with self._lock:
+            if size > self.pool_size:
+                return self._get_device().read(size)
+
+            if len(self._buffer) - self._position < size:
+                self._refill()
+            text = self._buffer[self._position:self._position + size]
+            self._position += size
+            if len(self._buffer) - self._position < self.refill_threshold:
+                self._refill()
+            return text
+
+
+default_pool = RandomPool()
@@ -0,0 +1,173 @@
+import collections
+import threading
+import time
+
+from crypto.classes.ciphers.parallel import get_worker_count
+from crypto.classes.entropy import default_pool
+
+
+"""RSA keys generated ahead of use on background processes. Generating a
+2048 to 4096 bit key takes seconds, so a pool keeps a number of keys of each
+size ready and a consumer takes one in O(1), with a replacement started in
+its place. multiprocessing is only loaded once a key is requested.
+
+Workers send a key's components back rather than the key object; rebuilding
+it with `RSA.construct` takes microseconds.
+"""
+
+DEFAULT_DEPTH = 4
+
+
+def _generate_components(key_size):
+    """Generate an RSA key in a worker. Returns (components, error), where
+    components is (n, e, d, p, q, u) and error is None on success.
+    """
+    from Crypto.PublicKey import RSA
+    try:
+        key = RSA.generate(key_size, randfunc=default_pool.read)
+        return tuple(getattr(key.key, name) for name in "nedpqu"), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+def _construct(components):
+    from Crypto.PublicKey import RSA
+    return RSA.construct(components)
+
+
+class KeyPool(object):
+    """Keeps up to `depth` RSA keys of each requested size generated ahead
+    of use on `processes` background processes (one per CPU when 0 or
+    None). Sizes are filled once first requested through `get` or `fill`.
+    Keys come out in the order they finished and are never handed out twice.
+    `close` (or using the pool as a context manager) stops the workers.
+    """
+    def __init__(self, depth=DEFAULT_DEPTH, processes=None):
+        if depth < 1:
+            raise AttributeError("depth must be at least 1.")
+        self.depth = depth
+        self.processes = processes
+        self._condition = threading.Condition()
+        self._errors = collections.deque()
+        self._pending = collections.defaultdict(int)
+        self._pool = None
+        self._ready = collections.defaultdict(collections.deque)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        with self._condition:
+            return "%s ready %s, pending %s." % (
+                self.__class__,
+                dict((size, len(keys)) for size, keys in self._ready.items()),
+                dict(self._pending)
+            )
+
+    def _get_pool(self):
+        """Return the pool of workers, starting it on first use."""
+        if self._pool is None:
+            from multiprocessing import Pool
+            self._pool = Pool(get_worker_count(self.processes))
+        return self._pool
+
+    def _refill(self, key_size):
+        """Start generating keys until `depth` are ready or on the way.
+        `_condition` must be held.
+        """
+        missing = (
+            self.depth - len(self._ready[key_size]) - self._pending[key_size]
+        )
+        for _ in xrange(missing):
+            self._pending[key_size] += 1
+            self._get_pool().apply_async(
+                _generate_components,
+                (key_size,),
+                callback=lambda result, size=key_size: self._add(size, result)
+            )
+
+    def _add(self, key_size, result):
+        """Receive a worker's result, on the pool's result thread."""
+        components, error = result
+        with self._condition:
+            self._pending[key_size] -= 1
+            if error:
+                self._errors.append(error)
+            else:
+                self._ready[key_size].append(components)
+            self._condition.notify_all()
+
+    def close(self):
+        """Stop the workers, discarding keys that are not ready."""
+        with self._condition:
+            pool = self._pool
+            self._pool = None
+            self._pending.clear()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    def fill(self, key_size):
+        """Start generating keys of `key_size` bits in the background, without
+        waiting for them.
+        """
+        with self._condition:
+            self._refill(key_size)
+
+    def get(self, key_size, timeout=None):
+        """Return a ready RSA key of `key_size` bits and start generating its
+        replacement. Waits for one to finish when none is ready; raises
+        ValueError if a worker failed and RuntimeError after `timeout`
+        seconds.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            self._refill(key_size)
+            ready = self._ready[key_size]
+            while not ready:
+                if self._errors:
+                    raise ValueError(
+                        "Key generation failed: %s" % self._errors.popleft()
+                    )
+                if deadline is None:
+                    self._condition.wait()
+                elif deadline <= time.time():
+                    raise RuntimeError("Timed out waiting for a key.")
+                else:
+                    self._condition.wait(deadline - time.time())
+            components = ready.popleft()
+            self._refill(key_size)
+        return _construct(components)
+
+    def ready(self, key_size):
+        """Return the number of keys of `key_size` bits ready to be taken."""
+        with self._condition:
+            return len(self._ready[key_size])
+
+
+def generate_keys(key_size, count, processes=None):
+    """Generate `count` RSA keys of `key_size` bits on `processes` processes
+    (one per CPU when 0 or None), yielding them as they finish.
+    """
+    processes = min(get_worker_count(processes), count)
+    sizes = [key_size] * count
+    if processes <= 1:
+        results = (_generate_components(size) for size in sizes)
+        pool = None
+    else:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        results = pool.imap_unordered(_generate_components, sizes)
+
+    try:
+        for components, error in results:
+            if error:
+                raise ValueError("Key generation failed: %s" % error)
+            yield _construct(components)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -4,8 +4,11 @@ from Crypto.PublicKey import RSA
 class RSAKeys(object):
     """Wraps Pycrypto RSA.
     key_size must be a multiple of 256 and >= 1024 bytes.
+    Keys are taken from `key_pool` when it is set to a `pool.KeyPool`, rather
+    than generated on first access.
     """
     attributes = ('key',)
+    key_pool = None  # Set to a KeyPool to use pre-generated keys.
     supported_modes = ('DER', 'OpenSSH', 'PEM')
 
     def __init__(
@@ -32,6 +35,10 @@ class RSAKeys(object):
             self._key = self._generate_key()
         return self._key
 
+    @key.setter
+    def key(self, value):
+        self._key = value
+
     @property
     def key_format(self):
         return self._key_format
@@ -59,10 +66,18 @@ class RSAKeys(object):
         self._key_size = value
 
     def _generate_key(self):
+        if self.key_pool is not None:
+            return self.key_pool.get(self.key_size)
         return RSA.generate(self.key_size)
 
     def get_private_key(self, passphrase=None):
-        return self.key.exportKey(self.key_format, passphrase=passphrase)
+        """Pycrypto writes only public keys as OpenSSH, so private keys are
+        written as PEM for that format, as ssh-keygen does.
+        """
+        key_format = self.key_format
+        if key_format == 'OpenSSH':
+            key_format = 'PEM'
+        return self.key.exportKey(key_format, passphrase=passphrase)
 
     def get_public_key(self, passphrase=None):
         return self.key.publickey().exportKey(
@@ -0,0 +1,308 @@
+import json
+import os
+import re
+import time
+
+from crypto.classes.batch import iter_files, JOBS_PER_TASK
+from crypto.classes.ciphers.parallel import get_worker_count
+from crypto.classes.digest import hash_stream
+from crypto.classes.util import DEFAULT_CHUNK_SIZE
+
+
+"""Hash every file under a directory on a pool of processes, producing a
+manifest that can be verified later. Digests are kept in an on-disk cache
+keyed on each file's path, size, modification time and inode, so files that
+have not changed are not read again.
+
+Manifests have a line per file and algorithm in the tagged format of
+`sha256sum --tag`, with paths relative to the directory, so they can also
+be checked with the coreutils tools.
+"""
+
+MANIFEST_LINE = re.compile(r"^(HMAC-)?(\w+) \((.*)\) = ([0-9a-f]+)$")
+
+_worker = {}  # The options of the current worker process.
+
+
+class DigestCache(object):
+    """Digests of files, stored as JSON at `path` and reused while a file's
+    size, modification time and inode are unchanged. Use `prune` to drop
+    files that are gone and `save` to write changes back.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(path, 'rb') as f:
+                self._entries = json.load(f)
+        except IOError:
+            self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path, status, algorithms):
+        """Return the cached hex digests of the file at `path`, whose
+        `os.stat` result is `status`, or None unless all of `algorithms`
+        are cached for it as it is now.
+        """
+        entry = self._entries.get(os.path.realpath(path))
+        if entry is not None and entry['id'] == list(_get_file_id(status)):
+            digests = entry['digests']
+            if all(name in digests for name in algorithms):
+                self.hits += 1
+                return dict((name, digests[name]) for name in algorithms)
+        self.misses += 1
+        return None
+
+    def prune(self, directory, paths):
+        """Drop the entries of files under `directory` other than those at
+        `paths`, the files found there now.
+        """
+        prefix = os.path.join(os.path.realpath(directory), "")
+        keep = set(os.path.realpath(path) for path in paths)
+        for key in list(self._entries):
+            if key.startswith(prefix) and key not in keep:
+                del self._entries[key]
+
+    def save(self):
+        """Write the cache to `path`, replacing it in one step."""
+        temporary_path = "%s.%s.tmp" % (self.path, os.getpid())
+        with open(temporary_path, 'wb') as f:
+            json.dump(self._entries, f, sort_keys=True)
+        os.rename(temporary_path, self.path)
+
+    def set(self, path, status, digests):
+        """Store hex digests of the file at `path` as of `status`. Digests of
+        other algorithms are kept while the file is unchanged.
+        """
+        key = os.path.realpath(path)
+        file_id = list(_get_file_id(status))
+        entry = self._entries.get(key)
+        if entry is None or entry['id'] != file_id:
+            entry = self._entries[key] = {'digests': {}, 'id': file_id}
+        entry['digests'].update(digests)
+
+
+def _get_file_id(status):
+    return status.st_size, status.st_mtime, status.st_ino
+
+
+def _set_worker(algorithms, hmac_key, chunk_size):
+    _worker.update(
+        algorithms=algorithms,
+        hmac_key=hmac_key,
+        chunk_size=chunk_size
+    )
+
+
+def _hash_file(job):
+    """Hash one file for the current worker. Returns (path, status, hex
+    digests, error), where status is the file's `os.fstat` result when it
+    was opened and error is None on success.
+    """
+    path, full_path, algorithms = job
+    try:
+        with open(full_path, 'rb') as f:
+            status = os.fstat(f.fileno())
+            digest = hash_stream(
+                f,
+                algorithms or _worker['algorithms'],
+                _worker['hmac_key'],
+                _worker['chunk_size']
+            )
+        return path, status, digest.hexdigests(), None
+    except Exception as e:
+        return path, None, None, str(e) or e.__class__.__name__
+
+
+def _run(jobs, algorithms, hmac_key, chunk_size, processes):
+    """Yield the results of `_hash_file` for each job, on a pool of
+    `processes` processes or in this one when that is 1.
+    """
+    processes = get_worker_count(processes)
+    if processes == 1:
+        _set_worker(algorithms, hmac_key, chunk_size)
+        try:
+            for job in jobs:
+                yield _hash_file(job)
+        finally:
+            _worker.clear()
+        return
+
+    from multiprocessing import Pool
+    pool = Pool(
+        processes,
+        initializer=_set_worker,
+        initargs=(algorithms, hmac_key, chunk_size)
+    )
+    try:
+        for result in pool.imap_unordered(_hash_file, jobs, JOBS_PER_TASK):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _new_report():
+    return {
+        'bytes_hashed': 0,
+        'cached': 0,
+        'failures': [],
+        'files': 0,
+        'seconds': 0
+    }
+
+
+def hash_directory(
+    input_dir,
+    algorithms,
+    cache=None,
+    hmac_key=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    processes=None
+):
+    """Hash each file under `input_dir` with every one of `algorithms`, on
+    `processes` processes (one per CPU when 0 or None). Files found in
+    DigestCache `cache` are not read, and files no longer under `input_dir`
+    are pruned from it; HMACs are never cached. Returns a list of (relative
+    path, hex digests) sorted by path, and a dictionary of totals with
+    failures as (path, error) tuples.
+    """
+    algorithms = list(algorithms)
+    if hmac_key is not None:
+        cache = None
+    report = _new_report()
+    entries = []
+    start = time.time()
+
+    jobs = []
+    full_paths = []
+    for path in iter_files(input_dir):
+        full_path = os.path.join(input_dir, path)
+        full_paths.append(full_path)
+        digests = None
+        if cache is not None:
+            try:
+                digests = cache.get(full_path, os.stat(full_path), algorithms)
+            except OSError:
+                pass
+        if digests is None:
+            jobs.append((path, full_path, None))
+        else:
+            report['cached'] += 1
+            entries.append((path, digests))
+    if cache is not None:
+        cache.prune(input_dir, full_paths)
+
+    results = _run(jobs, algorithms, hmac_key, chunk_size, processes)
+    for path, status, digests, error in results:
+        if error:
+            report['failures'].append((path, error))
+            continue
+        report['bytes_hashed'] += status.st_size
+        entries.append((path, digests))
+        if cache is not None:
+            cache.set(os.path.join(input_dir, path), status, digests)
+
+    entries.sort()
+    report['failures'].sort()
+    report['files'] = len(entries) + len(report['failures'])
+    report['seconds'] = time.time() - start
+    return entries, report
+
+
+def format_manifest(entries, algorithms, hmac=False):
+    """Return manifest lines for (path, hex digests) entries."""
+    prefix = "HMAC-" if hmac else ""
+    return "".join(
+        "%s%s (%s) = %s\n" % (prefix, name, path, digests[name])
+        for path, digests in entries
+        for name in algorithms
+    )
+
+
+def parse_manifest(lines):
+    """Parse manifest lines into a list of (path, {algorithm: hex digest})
+    in order of first appearance, and whether the digests are HMACs.
+    """
+    entries = {}
+    order = []
+    hmac = None
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        match = MANIFEST_LINE.match(line)
+        if match is None:
+            raise ValueError("Line %s is not a manifest line." % number)
+        prefix, name, path, hexdigest = match.groups()
+        if hmac is not None and hmac != bool(prefix):
+            raise ValueError("Manifest mixes HMACs and digests.")
+        hmac = bool(prefix)
+        if path not in entries:
+            entries[path] = {}
+            order.append(path)
+        entries[path][name] = hexdigest
+    return [(path, entries[path]) for path in order], bool(hmac)
+
+
+def verify_manifest(
+    entries,
+    input_dir,
+    hmac_key=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    processes=None
+):
+    """Rehash the files of manifest `entries` (see `parse_manifest`) under
+    `input_dir` and compare their digests. Every file is read; the cache is
+    not used. Returns a report like `hash_directory`'s whose failures are
+    (path, reason) tuples for files that changed or could not be read.
+    """
+    expected = dict(entries)
+    report = _new_report()
+    start = time.time()
+    jobs = (
+        (path, os.path.join(input_dir, path), sorted(digests))
+        for path, digests in entries
+    )
+    for path, status, digests, error in _run(
+        jobs,
+        None,
+        hmac_key,
+        chunk_size,
+        processes
+    ):
+        report['files'] += 1
+        if error:
+            report['failures'].append((path, error))
+            continue
+        report['bytes_hashed'] += status.st_size
+        if digests != expected[path]:
+            report['failures'].append((path, "FAILED"))
+
+    report['failures'].sort()
+    report['seconds'] = time.time() - start
+    return report
+
+
+def format_report(report):
+    """Return a summary of a `hash_directory` or `verify_manifest` report,
+    listing failures.
+    """
+    seconds = max(report['seconds'], 1e-6)
+    lines = [
+        "%d files, %.1f MB hashed in %.2fs: %.1f MB/s, %d cached, "
+        "%d failed." % (
+            report['files'],
+            report['bytes_hashed'] / 1e6,
+            report['seconds'],
+            report['bytes_hashed'] / 1e6 / seconds,
+            report['cached'],
+            len(report['failures'])
+        )
+    ]
+    for path, error in report['failures']:
+        lines.append("  %s: %s" % (path, error))
+    return "\n".join(lines)
@@ -0,0 +1,234 @@
+import threading
+
+from timeit import default_timer
+
+
+"""Optional per-stage timing for ciphers. Setting a cipher's `profiler`
+shadows its stage methods on that instance with timed wrappers, so ciphers
+without a profiler run the class methods untouched and pay nothing.
+
+Each stage records its calls, seconds and output bytes. Stages nest, as when
+encoding pulls ciphertext through the cipher which pulls plaintext through
+the reader; a stage is only charged for its own time, not that of stages it
+calls, and a stage reached again from inside itself is timed once. Time
+outside every stage is charged to the enclosing operation (`encrypt`,
+`decrypt_stream`...). With `workers`, the cipher stage is the time spent
+waiting for the threads, while their key setup times are summed.
+
+Profilers are kept by name in `profilers` so their figures can be collected
+from anywhere in the process.
+"""
+
+# Cipher method name: (stage, how the method is wrapped).
+#   call: time the call, counting the bytes it returns.
+#   cipher: time the call and wrap the returned cipher object.
+#   iter: time each item pulled from the returned iterator.
+STAGES = {
+    '_get_cipher': ('key_setup', 'cipher'),
+    '_get_segment_cipher': ('key_setup', 'call'),
+    '_crypt_many': ('cipher', 'call'),
+    '_iter_crypt': ('cipher', 'iter'),
+    'pad': ('pad', 'call'),
+    '_iter_padded': ('pad', 'iter'),
+    'unpad': ('unpad', 'call'),
+    '_unpad_stream': ('unpad', 'iter'),
+    '_encode': ('encode', 'call'),
+    '_encode_stream': ('encode', 'iter'),
+    '_decode': ('decode', 'call'),
+    '_decode_stream': ('decode', 'iter'),
+    '_read_stream': ('read', 'iter'),
+    '_write_stream': ('write', 'call'),
+    'encrypt': ('encrypt', 'call'),
+    'decrypt': ('decrypt', 'call'),
+    'encrypt_many': ('encrypt_many', 'call'),
+    'decrypt_many': ('decrypt_many', 'call'),
+    'encrypt_stream': ('encrypt_stream', 'call'),
+    'decrypt_stream': ('decrypt_stream', 'call'),
+    'decrypt_range': ('decrypt_range', 'call'),
+    'iter_decrypt_range': ('decrypt_range', 'iter')
+}
+CIPHER_METHODS = ('encrypt', 'decrypt', 'update')
+REPORT_FORMAT = "%-16s %8s %12s %14s %7s"
+REPORT_HEADER = ("STAGE", "CALLS", "SECONDS", "BYTES", "TIME %")
+
+profilers = {}
+_profilers_lock = threading.Lock()
+
+
+class Profiler(object):
+    """Accumulates calls, seconds and bytes per stage. Safe to share between
+    threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stages = {}
+
+    def _enter(self, stage):
+        """Start timing `stage`, returning its start time. Returns None when
+        the innermost stage running is already `stage`, which then carries on
+        timing it.
+        """
+        stack = self._local.__dict__.setdefault('stack', [])
+        if stack and stack[-1][0] == stage:
+            return None
+        stack.append([stage, 0.0])
+        return default_timer()
+
+    def _exit(self, stage, start, size=0, calls=1):
+        """Stop timing the innermost stage and charge it with the time that
+        its nested stages did not take.
+        """
+        if start is None:
+            return
+        elapsed = default_timer() - start
+        stack = self._local.stack
+        nested = stack.pop()[1]
+        if stack:
+            stack[-1][1] += elapsed
+        self.record(stage, elapsed - nested, size, calls)
+
+    def call(self, stage, function, *args, **kwargs):
+        """Call function, recording its duration under `stage`. A string
+        result counts its length in bytes and an integer result is taken to
+        be a number of bytes.
+        """
+        size = 0
+        start = self._enter(stage)
+        try:
+            result = function(*args, **kwargs)
+            if isinstance(result, basestring):
+                size = len(result)
+            elif isinstance(result, (int, long)):
+                size = result
+            return result
+        finally:
+            self._exit(stage, start, size)
+
+    def iter_stage(self, stage, iterable):
+        """Yield from iterable, recording the time spent producing each item
+        and its length under `stage`. Time spent finding the iterable is
+        exhausted is recorded without counting a call.
+        """
+        iterator = iter(iterable)
+        while True:
+            item = None
+            start = self._enter(stage)
+            try:
+                item = next(iterator, None)
+            finally:
+                if item is None:
+                    self._exit(stage, start, calls=0)
+                else:
+                    self._exit(stage, start, len(item))
+            if item is None:
+                return
+            yield item
+
+    def record(self, stage, seconds, size=0, calls=1):
+        """Add `calls` taking `seconds` that produced `size` bytes to
+        `stage`.
+        """
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = [0, 0.0, 0]
+            stats[0] += calls
+            stats[1] += seconds
+            stats[2] += size
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def stats(self):
+        """Return a dictionary of {'bytes', 'calls', 'seconds'} by stage."""
+        with self._lock:
+            return dict(
+                (stage, {'bytes': size, 'calls': calls, 'seconds': seconds})
+                for stage, (calls, seconds, size) in self._stages.items()
+            )
+
+    def format_report(self):
+        """Return the stages as a table, slowest first."""
+        stats = self.stats()
+        total = sum(stage['seconds'] for stage in stats.values()) or 1e-9
+        lines = [REPORT_FORMAT % REPORT_HEADER]
+        for stage in sorted(stats, key=lambda name: -stats[name]['seconds']):
+            lines.append(REPORT_FORMAT % (
+                stage,
+                stats[stage]['calls'],
+                "%.6f" % stats[stage]['seconds'],
+                stats[stage]['bytes'],
+                "%.1f" % (stats[stage]['seconds'] * 100 / total)
+            ))
+        return "\n".join(lines)
+
+
+class ProfiledCipher(object):
+    """Wraps a cipher object (such as a Pycrypto cipher instance) so that its
+    encrypt, decrypt and update calls are recorded under the `cipher` stage.
+    """
+    def __init__(self, cipher, profiler):
+        self._cipher = cipher
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        value = getattr(self._cipher, name)
+        if name in CIPHER_METHODS:
+            profiler = self._profiler
+            return lambda *args: profiler.call('cipher', value, *args)
+        return value
+
+
+def get_profiler(name="default"):
+    """Return the profiler registered under `name`, creating it if needed."""
+    with _profilers_lock:
+        profiler = profilers.get(name)
+        if profiler is None:
+            profiler = profilers[name] = Profiler()
+        return profiler
+
+
+def collect():
+    """Return the stats of every registered profiler by name."""
+    with _profilers_lock:
+        return dict(
+            (name, profiler.stats()) for name, profiler in profilers.items()
+        )
+
+
+def _wrap(method, stage, kind, profiler):
+    if kind == 'iter':
+        return lambda *args, **kwargs: profiler.iter_stage(
+            stage,
+            method(*args, **kwargs)
+        )
+    elif kind == 'cipher':
+        return lambda *args, **kwargs: ProfiledCipher(
+            profiler.call(stage, method, *args, **kwargs),
+            profiler
+        )
+    return lambda *args, **kwargs: profiler.call(
+        stage,
+        method,
+        *args,
+        **kwargs
+    )
+
+
+def instrument(cipher, profiler):
+    """Shadow the stage methods that cipher has with wrappers that record to
+    profiler.
+    """
+    uninstrument(cipher)
+    for name, (stage, kind) in STAGES.items():
+        method = getattr(cipher, name, None)
+        if method is not None:
+            setattr(cipher, name, _wrap(method, stage, kind, profiler))
+
+
+def uninstrument(cipher):
+    """Remove wrappers added by `instrument`, restoring the class methods."""
+    for name in STAGES:
+        cipher.__dict__.pop(name, None)
@@ -0,0 +1,42 @@
+import collections
+import importlib
+
+
+"""Registries that map names to import paths and only import what is looked
+up, so choosing one cipher does not load the others.
+"""
+
+
+def import_object(path):
+    """Import and return the object at `path`, written as `package.module`
+    for a module or `package.module:attribute` for something in it.
+    """
+    module_path, _, attribute = path.partition(":")
+    module = importlib.import_module(module_path)
+    return getattr(module, attribute) if attribute else module
+
+
+class LazyRegistry(collections.Mapping):
+    """Read only mapping of names to objects given as import paths (see
+    `import_object`). Each object is imported the first time its name is
+    looked up. Listing names does not import anything.
+    """
+    def __init__(self, paths):
+        self.paths = dict(paths)
+        self._loaded = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._loaded[name]
+        except KeyError:
+            value = self._loaded[name] = import_object(self.paths[name])
+            return value
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.paths)
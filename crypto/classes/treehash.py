@@ -0,0 +1,210 @@
+import json
+import os
+import time
+
+from crypto.classes.ciphers.parallel import get_worker_count
+from crypto.classes.digest import HASHES, HASH_DEFAULT
+from crypto.classes.util import iter_chunks
+
+
+"""Tree digests of single large files. The data is split into fixed size
+chunks that are hashed independently, on a pool of processes that each read
+their own chunks from the file, and the chunk digests are hashed together
+into a root digest. Comparing the chunk digests of two trees shows which
+chunks of a file changed.
+
+Chunk digests are of 0x00 followed by the chunk and the root is of 0x01
+followed by the chunk digests, so a root is never mistaken for a chunk.
+Trees are stored as JSON holding the algorithm, chunk size, file size, hex
+chunk digests and hex root digest.
+"""
+
+TREE_CHUNK_SIZE = 4 * 1024 ** 2
+
+_worker = {}  # The file and options of the current worker process.
+
+
+def _hash_chunk(module, chunk):
+    """Return the binary digest of one chunk."""
+    h = module.new("\x00")
+    h.update(chunk)
+    return h.digest()
+
+
+def _make_tree(algorithm, chunk_size, digests, size):
+    root = HASHES[algorithm].new("\x01")
+    for digest in digests:
+        root.update(digest)
+    return {
+        'algorithm': algorithm,
+        'chunk_size': chunk_size,
+        'chunks': [digest.encode('hex') for digest in digests],
+        'root': root.hexdigest(),
+        'size': size
+    }
+
+
+def _check_options(algorithm, chunk_size):
+    if algorithm not in HASHES:
+        raise AttributeError("Hash algorithm not supported: %s" % algorithm)
+    if chunk_size < 1:
+        raise AttributeError("chunk_size must be at least 1 byte.")
+
+
+def _set_worker(path, algorithm, chunk_size):
+    _worker.update(
+        f=open(path, 'rb'),
+        module=HASHES[algorithm],
+        chunk_size=chunk_size
+    )
+
+
+def _hash_file_chunk(number):
+    """Read and hash chunk `number` of the current worker's file. Returns
+    (binary digest, chunk length).
+    """
+    f = _worker['f']
+    f.seek(number * _worker['chunk_size'])
+    chunk = f.read(_worker['chunk_size'])
+    return _hash_chunk(_worker['module'], chunk), len(chunk)
+
+
+def tree_hash(src, algorithm=HASH_DEFAULT, chunk_size=TREE_CHUNK_SIZE):
+    """Return the tree of file-like object `src`, read in one pass."""
+    _check_options(algorithm, chunk_size)
+    module = HASHES[algorithm]
+    digests = []
+    size = 0
+    for chunk in iter_chunks(src, chunk_size):
+        digests.append(_hash_chunk(module, chunk))
+        size += len(chunk)
+    return _make_tree(algorithm, chunk_size, digests, size)
+
+
+def tree_hash_file(
+    path,
+    algorithm=HASH_DEFAULT,
+    chunk_size=TREE_CHUNK_SIZE,
+    processes=None
+):
+    """Return the tree of the file at `path`, hashing its chunks on
+    `processes` processes (one per CPU when 0 or None). Workers read chunks
+    by offset, so no data is copied between processes. With 1 process, or a
+    single chunk, the file is hashed in this process.
+    """
+    _check_options(algorithm, chunk_size)
+    count = -(-os.path.getsize(path) // chunk_size)
+    processes = min(get_worker_count(processes), count)
+    if processes <= 1:
+        with open(path, 'rb') as f:
+            return tree_hash(f, algorithm, chunk_size)
+
+    from multiprocessing import Pool
+    pool = Pool(
+        processes,
+        initializer=_set_worker,
+        initargs=(path, algorithm, chunk_size)
+    )
+    try:
+        results = list(pool.imap(_hash_file_chunk, xrange(count)))
+    finally:
+        pool.terminate()
+        pool.join()
+
+    while results and not results[-1][1]:
+        results.pop()  # The file was truncated while it was hashed.
+    return _make_tree(
+        algorithm,
+        chunk_size,
+        [digest for digest, length in results],
+        sum(length for digest, length in results)
+    )
+
+
+def compare_trees(expected, actual):
+    """Return the (offset, length) byte ranges of the chunks that differ
+    between two trees of the same algorithm and chunk size. Chunks present
+    in only one of them count as differing.
+    """
+    for key in ('algorithm', 'chunk_size'):
+        if expected[key] != actual[key]:
+            raise AttributeError("Trees differ in %s." % key)
+
+    chunk_size = expected['chunk_size']
+    size = max(expected['size'], actual['size'])
+    count = max(len(expected['chunks']), len(actual['chunks']))
+    ranges = []
+    for number in xrange(count):
+        digests = [
+            tree['chunks'][number] if number < len(tree['chunks']) else None
+            for tree in (expected, actual)
+        ]
+        if digests[0] != digests[1]:
+            offset = number * chunk_size
+            ranges.append((offset, min(chunk_size, size - offset)))
+    return ranges
+
+
+def verify_tree(expected, path=None, src=None, processes=None):
+    """Rehash the file at `path`, or file-like object `src`, with the
+    algorithm and chunk size of tree `expected` and compare them. Returns a
+    report of totals, with failures as (offset, length) ranges of chunks
+    that differ.
+    """
+    algorithm = str(expected['algorithm'])
+    start = time.time()
+    if path is not None:
+        actual = tree_hash_file(
+            path,
+            algorithm,
+            expected['chunk_size'],
+            processes
+        )
+    else:
+        actual = tree_hash(src, algorithm, expected['chunk_size'])
+    failures = compare_trees(expected, actual)
+    if not failures and actual['root'] != expected['root']:
+        raise ValueError("The tree's root does not match its chunks.")
+    return {
+        'bytes_hashed': actual['size'],
+        'chunks': max(len(expected['chunks']), len(actual['chunks'])),
+        'failures': failures,
+        'seconds': time.time() - start
+    }
+
+
+def dump_tree(tree):
+    """Return tree as JSON."""
+    return json.dumps(tree, indent=1, sort_keys=True) + "\n"
+
+
+def load_tree(f):
+    """Read a tree written by `dump_tree` from file-like object `f`."""
+    try:
+        tree = json.load(f)
+        missing = [
+            key for key in ('algorithm', 'chunk_size', 'chunks', 'size')
+            if key not in tree
+        ]
+    except (TypeError, ValueError):
+        missing = True
+    if missing:
+        raise ValueError("Not a hash tree.")
+    return tree
+
+
+def format_report(report):
+    """Return a summary of a `verify_tree` report, listing failures."""
+    seconds = max(report['seconds'], 1e-6)
+    lines = [
+        "%d chunks, %.1f MB hashed in %.2fs: %.1f MB/s, %d differ." % (
+            report['chunks'],
+            report['bytes_hashed'] / 1e6,
+            report['seconds'],
+            report['bytes_hashed'] / 1e6 / seconds,
+            len(report['failures'])
+        )
+    ]
+    for offset, length in report['failures']:
+        lines.append("  bytes %d-%d: FAILED" % (offset, offset + length - 1))
+    return "\n".join(lines)
@@ -0,0 +1,157 @@
+import mmap
+import os
+import stat
+import struct
+
+from Crypto.Util.strxor import strxor
+
+
+"""Utility (helper) methods for working with streams of data.
+"""
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+FRAME_HEADER = struct.Struct(">I")  # Frames are prefixed with their length.
+MAX_FRAME_SIZE = 64 * 1024 ** 2
+
+
+def get_stream_size(f):
+    """Return the number of bytes left to read from file-like object `f`, or
+    None when it cannot be determined without consuming it (pipes, sockets).
+    """
+    try:
+        status = os.fstat(f.fileno())
+        if stat.S_ISREG(status.st_mode):
+            return status.st_size - f.tell()
+        return None
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+
+    try:
+        position = f.tell()
+        f.seek(0, os.SEEK_END)
+        size = f.tell() - position
+        f.seek(position)
+        return size
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+
+
+def iter_chunks(f, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield successive chunks of up to `chunk_size` bytes from file-like
+    object `f` until it is exhausted. Memory mapped files are not read;
+    zero-copy buffers over the mapping are yielded instead.
+    """
+    if isinstance(f, mmap.mmap):
+        for position in xrange(f.tell(), len(f), chunk_size):
+            yield buffer(f, position, chunk_size)
+        return
+
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_aligned(chunks, block_size):
+    """Regroup an iterable of chunks so every yielded piece is a multiple of
+    `block_size` bytes long. Only the final piece may be short. Pieces are
+    buffers over the original chunks; at most a block is copied per chunk to
+    join it with what was left over from the previous one.
+    """
+    pending = ""
+    for chunk in chunks:
+        if pending:
+            need = block_size - len(pending)
+            pending += chunk[:need]
+            if len(pending) < block_size:
+                continue
+            yield pending
+            chunk = buffer(chunk, need)
+
+        cut = len(chunk) - len(chunk) % block_size
+        pending = chunk[cut:]
+        if cut:
+            yield buffer(chunk, 0, cut)
+
+    if pending:
+        yield pending
+
+
+def read_frame(f):
+    """Read a length prefixed frame from file-like object `f` and return its
+    data, or None if `f` is at its end.
+    """
+    header = f.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise IOError("Truncated frame header.")
+
+    size, = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise IOError("Frame of %s bytes is too large." % size)
+    data = f.read(size)
+    if len(data) < size:
+        raise IOError("Truncated frame.")
+    return data
+
+
+def write_frame(f, data):
+    """Write data to file-like object `f` as a length prefixed frame."""
+    f.write(FRAME_HEADER.pack(len(data)))
+    f.write(data)
+
+
+def iter_frames(f):
+    """Yield the data of frames read from file-like object `f` up to the
+    first empty frame, which marks the end of a stream.
+    """
+    while True:
+        data = read_frame(f)
+        if data is None:
+            raise IOError("Stream ended without an end frame.")
+        if not data:
+            return
+        yield data
+
+
+def xor_bytes(text, keystream):
+    """Return the bytewise XOR of text with an equal length keystream, using
+    Pycrypto's C `strxor`. Buffers are accepted.
+    """
+    if not text:
+        return ""  # strxor aborts on empty strings.
+    return strxor(str(text), str(keystream))
+
+
+class MappedWriter(object):
+    """File-like object that writes into a memory mapping of file `f`. The
+    file is preallocated to `size_hint` bytes, grown as needed and truncated
+    to the number of bytes written on `close`.
+    """
+    def __init__(self, f, size_hint=0):
+        self._file = f
+        self._size = max(size_hint, mmap.ALLOCATIONGRANULARITY)
+        self._position = 0
+        f.truncate(self._size)
+        self._map = mmap.mmap(f.fileno(), self._size)
+
+    def close(self):
+        """Unmap the file and truncate it to the bytes written."""
+        self._map.close()
+        self._file.truncate(self._position)
+
+    def flush(self):
+        self._map.flush()
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        end = self._position + len(data)
+        if end > self._size:
+            self._size = max(end, self._size * 2)
+            self._map.resize(self._size)
+        self._map[self._position:end] = data
+        self._position = end
@@ -1,11 +1,25 @@
 from __future__ import print_function
 
+import contextlib
 import getpass
-import subprocess
+import mmap
+import os
+import shutil
+import StringIO
 import sys
 import termios
 import tty
 
+from crypto.classes.util import (
+    DEFAULT_CHUNK_SIZE,
+    get_stream_size,
+    MappedWriter
+)
+
+
+DEFAULT_BUFFER_SIZE = DEFAULT_CHUNK_SIZE
+STREAM_PATH = "-"  # Path that stands for stdin/stdout.
+
 
 class Interface(object):
     """Base class for all commandline interfaces."""
@@ -17,9 +31,14 @@ class Interface(object):
         pass
 
     def write_to_file(self, path, data):
-        """Write data to file path."""
+        """Write data to file path, or to stdout when path is `-`."""
         # TODO: It may be more suited for this to exist as base class centered
         # around data output that DataInterface & KeysInterface inherit from.
+        if path == STREAM_PATH:
+            sys.stdout.write(data)
+            sys.stdout.flush()
+            return
+
         with open(path, 'wb') as f:
             f.write(data)
 
@@ -33,14 +52,26 @@ class DataInterface(Interface):
         clipboard=None,
         data_input_path=None,
         data_output_path=None,
+        buffer_size=None,
+        memory_map=None,
         *args,
         **kwargs
     ):
         super(DataInterface, self).__init__()
 
+        self.buffer_size = buffer_size or DEFAULT_BUFFER_SIZE
+        self.memory_map = memory_map
         self.set_data_input(clipboard, data_input_path)
         self.set_data_output(clipboard, data_output_path)
 
+    def _get_data_input_size(self):
+        """Return the size of the data input in bytes, or 0 when unknown."""
+        if self.data is not None:
+            return len(self.data)
+        if self.data_input_path != STREAM_PATH:
+            return os.path.getsize(self.data_input_path)
+        return 0
+
     def _get_char(self):
         """Fetch and return a single character input from terminal."""
         fd = sys.stdin.fileno()
@@ -63,6 +94,7 @@ class DataInterface(Interface):
 
     def get_data_from_clipboard(self):
         """Sets data to contents of clipboard."""
+        import subprocess  # Slow to import, and rarely needed.
         process = subprocess.Popen(
             ['pbpaste'],
             stdout=subprocess.PIPE,
@@ -91,6 +123,63 @@ class DataInterface(Interface):
         """A very simple method for inputting data from getpass."""
         return getpass.getpass(prompt)
 
+    @contextlib.contextmanager
+    def open_data_input(self, sized=False):
+        """Yield a file-like object to read data from. Data already held in
+        memory is wrapped; otherwise `data_input_path` is opened, with `-`
+        reading stdin. When `sized` is True and the size of stdin cannot be
+        determined, it is first spooled to a temporary file. When
+        `memory_map` is set, a non-empty file is memory mapped rather than
+        read.
+        """
+        if self.data is not None:
+            yield StringIO.StringIO(self.data)
+        elif self.data_input_path != STREAM_PATH:
+            with open(self.data_input_path, 'rb') as f:
+                if not self.memory_map or not os.fstat(f.fileno()).st_size:
+                    yield f
+                    return
+
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    yield mapped
+                finally:
+                    mapped.close()
+        elif sized and get_stream_size(sys.stdin) is None:
+            import tempfile  # Slow to import, and rarely needed.
+            with tempfile.TemporaryFile() as f:
+                shutil.copyfileobj(sys.stdin, f, self.buffer_size)
+                f.seek(0)
+                yield f
+        else:
+            yield sys.stdin
+
+    @contextlib.contextmanager
+    def open_data_output(self):
+        """Yield a file-like object to write data to. `data_output_path` is
+        opened when set, with `-` writing to stdout. Otherwise data is
+        collected in memory and passed to `store_data` on exit. When
+        `memory_map` is set, the file is preallocated to the size of the input
+        and written through a memory mapping.
+        """
+        if self.data_output_path == STREAM_PATH:
+            yield sys.stdout
+            sys.stdout.flush()
+        elif self.data_output_path and self.memory_map:
+            with open(self.data_output_path, 'w+b') as f:
+                writer = MappedWriter(f, self._get_data_input_size())
+                try:
+                    yield writer
+                finally:
+                    writer.close()
+        elif self.data_output_path:
+            with open(self.data_output_path, 'wb') as f:
+                yield f
+        else:
+            buf = StringIO.StringIO()
+            yield buf
+            self.store_data(buf.getvalue())
+
     def read_from_file(self, path):
         """Return the first non-empty line of a file as a string."""
         with open(path, 'rb') as f:
@@ -100,13 +189,17 @@ class DataInterface(Interface):
         """Determine and set data. Reading from clipboard takes highest priority.
         Reading from file `data_input_path` takes next highest priority. Lowest priority
         is to fetch from commandline prompt.
+        Files are not read here; `data` is left unset and the file is streamed
+        through `open_data_input`.
         """
+        self.data_input_path = None
         if clipboard_input:
             self.data = self.get_data_from_clipboard()
             return
 
         if data_input_path:
-            self.data = self.read_from_file(data_input_path)
+            self.data = None
+            self.data_input_path = data_input_path
             return
 
         self.data = self.get_data_from_prompt()
@@ -116,11 +209,13 @@ class DataInterface(Interface):
         takes highest priority. Writing to file `data_output_path` takes next highest
         priority. Lowest priority is to print to screen.
         """
+        self.data_output_path = None
         if clipboard_output:
             self.store_data = self.store_data_in_clipboard
             return
 
         if data_output_path:
+            self.data_output_path = data_output_path
             self.store_data = lambda data: self.write_to_file(
                 data_output_path,
                 data
@@ -131,6 +226,7 @@ class DataInterface(Interface):
 
     def store_data_in_clipboard(self, data):
         """Store data in clipboard."""
+        import subprocess  # Slow to import, and rarely needed.
         process = subprocess.Popen(['pbcopy'], stdin=subprocess.PIPE)
         stdoutdata, stderrdata = process.communicate(
             input=data.encode('utf-8')
@@ -148,10 +244,19 @@ def execute(args):
 
 def add_parser_args(parser):
     """Adds DataInterface related arguments to ArgumentParser and sets execute
-    method. Uses switches (c, i, o).
+    method. Uses switches (b, c, i, M, o).
     """
     parser.set_defaults(execute=execute)
 
+    parser.add_argument(
+        "--buffer-size",
+        "-b",
+        default=DEFAULT_BUFFER_SIZE,
+        dest="buffer_size",
+        help="Number of bytes to read and process at a time.",
+        type=int
+    )
+
     parser.add_argument(
         "--clipboard",
         "-c",
@@ -163,12 +268,23 @@ def add_parser_args(parser):
         "--input",
         "-i",
         dest="data_input_path",
-        help="Path to data to manipulate."
+        help="Path to data to manipulate. Use - to read from stdin."
+    )
+
+    parser.add_argument(
+        "--mmap",
+        "-M",
+        action="store_true",
+        default=False,
+        dest="memory_map",
+        help=("Memory map input and output files rather than reading and " +
+            "writing them."
+        )
     )
 
     parser.add_argument(
         "--output",
         "-o",
         dest="data_output_path",
-        help="Path to file to write data out to."
+        help="Path to file to write data out to. Use - to write to stdout."
     )
@@ -0,0 +1,249 @@
+from __future__ import print_function
+
+import crypto.classes.benchmark as benchmark
+import crypto.interfaces.commandline.base as base_cli
+import crypto.interfaces.commandline.cipher as cipher_cli
+import json
+import sys
+
+
+OPERATIONS = ("encrypt", "decrypt")
+TABLE_FORMAT = "%-8s %-4s %-13s %6s %-7s %10s %11s %10s %10s %13s"
+TABLE_HEADER = (
+    "CIPHER", "MODE", "ENCODER", "SIZE", "OP",
+    "MB/S", "OPS/S", "P50 (MS)", "P99 (MS)", "PEAK RSS (MB)"
+)
+
+
+class BenchInterface(base_cli.Interface):
+    """Class for commandline interface that times every combination of the
+    selected ciphers, chaining modes, encoders and message sizes. Each
+    combination runs in its own child process, whose peak resident set size
+    is reported with both of its operations.
+    """
+    def __init__(
+        self,
+        buffer_size=None,
+        ciphers=None,
+        encoders=None,
+        json_path=None,
+        min_time=None,
+        modes=None,
+        padding=None,
+        seed=None,
+        sizes=None,
+        workers=None,
+        *args,
+        **kwargs
+    ):
+        super(BenchInterface, self).__init__()
+        self.buffer_size = buffer_size or base_cli.DEFAULT_BUFFER_SIZE
+        self.ciphers = sorted(ciphers or cipher_cli.CIPHER_CHOICES)
+        self.encoders = sorted(encoders or cipher_cli.ENCODER_CHOICES)
+        self.json_path = json_path
+        self.min_time = (
+            benchmark.DEFAULT_MIN_TIME if min_time is None else min_time
+        )
+        self.modes = sorted(modes or cipher_cli.CHAINING_MODE_CHOICES)
+        self.padding = padding
+        self.seed = benchmark.DEFAULT_SEED if seed is None else seed
+        self.sizes = sorted(sizes or benchmark.DEFAULT_SIZES)
+        self.workers = workers
+
+    def get_cipher(self, cipher_name, mode, encoder_name):
+        """Return a cipher set up for one cell of the matrix."""
+        cipher = cipher_cli.CIPHERS[cipher_name]()
+        if mode:
+            cipher.mode = mode
+        if self.padding and 'padding' in cipher.attributes:
+            cipher.padding = self.padding
+        cipher.set_encoding(cipher_cli.ENCODERS[encoder_name])
+        return benchmark.seed_cipher(cipher, self.seed)
+
+    def iter_matrix(self):
+        """Yield (cipher, mode, encoder) names to benchmark. Ciphers without
+        chaining modes are run once per encoder with a mode of None.
+        """
+        for cipher_name in self.ciphers:
+            cipher_class = cipher_cli.CIPHERS[cipher_name]
+            modes = [
+                mode for mode in self.modes
+                if mode in getattr(cipher_class, 'supported_modes', ())
+            ] or [None]
+            for mode in modes:
+                for encoder_name in self.encoders:
+                    yield cipher_name, mode, encoder_name
+
+    def execute(self):
+        """Run the matrix, printing a table row per result. When `json_path`
+        is set the results are also written there as JSON; `-` writes them
+        to stdout in place of the table.
+        """
+        table = sys.stdout
+        if self.json_path == base_cli.STREAM_PATH:
+            table = sys.stderr
+        print(TABLE_FORMAT % TABLE_HEADER, file=table)
+
+        results = []
+        for cipher_name, mode, encoder_name in self.iter_matrix():
+            cipher = self.get_cipher(cipher_name, mode, encoder_name)
+            for size in self.sizes:
+                summaries, peak_rss = benchmark.run_in_child(
+                    benchmark.bench_cipher,
+                    cipher,
+                    size,
+                    seed=self.seed,
+                    min_time=self.min_time,
+                    chunk_size=self.buffer_size,
+                    workers=self.workers
+                )
+                for operation, summary in zip(OPERATIONS, summaries):
+                    summary.update(
+                        cipher=cipher_name,
+                        encoder=encoder_name,
+                        mode=mode,
+                        operation=operation,
+                        peak_rss=peak_rss,
+                        size=size
+                    )
+                    results.append(summary)
+                    print(self.format_row(summary), file=table)
+                    table.flush()
+
+        if self.json_path:
+            self.write_to_file(self.json_path, json.dumps(
+                {
+                    'config': {
+                        'buffer_size': self.buffer_size,
+                        'min_time': self.min_time,
+                        'padding': self.padding,
+                        'seed': self.seed,
+                        'workers': self.workers
+                    },
+                    'metadata': benchmark.get_metadata(),
+                    'results': results
+                },
+                indent=2,
+                sort_keys=True
+            ) + "\n")
+
+    def format_row(self, summary):
+        """Return a result as a line of the table."""
+        return TABLE_FORMAT % (
+            summary['cipher'],
+            summary['mode'] or "-",
+            summary['encoder'],
+            benchmark.format_size(summary['size']),
+            summary['operation'],
+            "%.2f" % summary['mb_per_s'],
+            "%.1f" % summary['ops_per_s'],
+            "%.4f" % (summary['latency']['p50'] * 1000),
+            "%.4f" % (summary['latency']['p99'] * 1000),
+            "%.1f" % (summary['peak_rss'] / 1024.0 ** 2)
+        )
+
+
+def execute(args):
+    """Instantiates interface from argparse namespace and executes."""
+    interface = BenchInterface(**vars(args))
+    interface.execute()
+
+
+def add_parser_args(parser):
+    """Adds benchmark related arguments to ArgumentParser and sets execute
+    method.
+    Uses optional switches (b, j).
+    """
+    parser.set_defaults(execute=execute)
+
+    parser.add_argument(
+        "--buffer-size",
+        "-b",
+        default=None,
+        help=("Number of bytes to process at a time, with an optional K, M " +
+            "or G suffix. Larger messages are streamed in pieces of this " +
+            "size. Defaults to %s." % benchmark.format_size(
+                base_cli.DEFAULT_BUFFER_SIZE
+            )
+        ),
+        type=benchmark.parse_size
+    )
+
+    parser.add_argument(
+        "--ciphers",
+        choices=cipher_cli.CIPHER_CHOICES,
+        default=None,
+        help="Ciphers to benchmark. Defaults to all of them.",
+        nargs="+",
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--encoders",
+        choices=cipher_cli.ENCODER_CHOICES,
+        default=None,
+        help="Encoders to benchmark. Defaults to all of them.",
+        nargs="+",
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--json",
+        dest="json_path",
+        help="Write results as JSON to this path. Use - for stdout."
+    )
+
+    parser.add_argument(
+        "--min-time",
+        default=None,
+        help=("Seconds to repeat each measurement for. Defaults to %s." %
+            benchmark.DEFAULT_MIN_TIME
+        ),
+        type=float
+    )
+
+    parser.add_argument(
+        "--modes",
+        choices=cipher_cli.CHAINING_MODE_CHOICES,
+        default=None,
+        help=("Chaining modes to benchmark block ciphers under. Defaults " +
+            "to all of them."
+        ),
+        nargs="+",
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--padding",
+        choices=cipher_cli.PADDING_CHOICES,
+        default=None,
+        help="Padding scheme for block ciphers.",
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--seed",
+        default=None,
+        help="Seed for generated messages, keys and IVs. Defaults to 0.",
+        type=int
+    )
+
+    parser.add_argument(
+        "--sizes",
+        default=None,
+        help=("Message sizes in bytes, with an optional K, M or G suffix. " +
+            "Defaults to %s." % " ".join(
+                benchmark.format_size(size) for size in benchmark.DEFAULT_SIZES
+            )
+        ),
+        nargs="+",
+        type=benchmark.parse_size
+    )
+
+    parser.add_argument(
+        "--workers",
+        "-j",
+        default=None,
+        help="Number of threads to process streamed messages on.",
+        type=int
+    )
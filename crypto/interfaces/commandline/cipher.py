@@ -1,37 +1,42 @@
+from __future__ import print_function
+
+import argparse
+import contextlib
 import crypto.interfaces.commandline.base as base_cli
+import os
+import shutil
+import sys
 import time
 
-from crypto.classes.ciphers.aes import AESCipher
-from crypto.classes.ciphers.blowfish import BlowfishCipher
-from crypto.classes.ciphers.cast import CASTCipher
-from crypto.classes.ciphers.xor import XORCipher
-from crypto.classes.encoders.base import NullEncoder
-from crypto.classes.encoders.binary import Base64Encoder, URLSafeBase64Encoder
-
-
-CHAINING_MODE_CHOICES = set(
-    AESCipher.supported_modes.keys() +
-    BlowfishCipher.supported_modes.keys() +
-    CASTCipher.supported_modes.keys()
-)
-
-CIPHERS = {
-    'AES': AESCipher,
-    'BLOWFISH': BlowfishCipher,
-    'CAST': CASTCipher,
-    'XOR': XORCipher
-}
+from crypto.classes.ciphers.base import BlockCipher
+from crypto.classes.ciphers.padding import PADDINGS
+from crypto.classes.profiling import get_profiler
+from crypto.classes.registry import LazyRegistry
+
+
+# Block ciphers share BlockCipher's chaining modes.
+CHAINING_MODE_CHOICES = BlockCipher.supported_modes.keys()
+
+# Ciphers and encoders are imported only when chosen.
+CIPHERS = LazyRegistry({
+    'AES': 'crypto.classes.ciphers.aes:AESCipher',
+    'BLOWFISH': 'crypto.classes.ciphers.blowfish:BlowfishCipher',
+    'CAST': 'crypto.classes.ciphers.cast:CASTCipher',
+    'XOR': 'crypto.classes.ciphers.xor:XORCipher'
+})
 CIPHER_CHOICES = CIPHERS.keys()
 CIPHER_DEFAULT = "XOR"
 
-ENCODERS = {
-    'BASE64': Base64Encoder,
-    'NULL': NullEncoder,
-    'URLSAFEBASE64': URLSafeBase64Encoder,
-}
+ENCODERS = LazyRegistry({
+    'BASE64': 'crypto.classes.encoders.binary:Base64Encoder',
+    'NULL': 'crypto.classes.encoders.base:NullEncoder',
+    'URLSAFEBASE64': 'crypto.classes.encoders.binary:URLSafeBase64Encoder'
+})
 ENCODER_CHOICES = ENCODERS.keys()
 ENCODER_DEFAULT = "BASE64"
 
+PADDING_CHOICES = PADDINGS.keys()
+
 
 class CipherInterface(base_cli.DataInterface):
     def __init__(
@@ -40,37 +45,152 @@ class CipherInterface(base_cli.DataInterface):
         clipboard=None,
         data_input_path=None,
         data_output_path=None,
+        buffer_size=None,
+        memory_map=None,
+        container=None,
         decrypt=None,
         encoder=None,
         iv_gen=None,
         iv_path=None,
         key_gen=None,
         key_path=None,
+        mac_key_path=None,
         mode=None,
+        padding=None,
+        profile=None,
+        range=None,
+        workers=None,
+        wrap=None,
         *args,
         **kwargs
     ):
         """Sets up the cipher itself when initializing."""
+        if range and not decrypt:
+            raise AttributeError("--range only applies when decrypting.")
         super(CipherInterface, self).__init__(
             clipboard,
             data_input_path,
-            data_output_path
+            data_output_path,
+            buffer_size,
+            memory_map
         )
         self.cipher = CIPHERS[cipher]()
         self.cipher.data = self.data
+        self.container = container
         self.decrypt = decrypt
+        self.range = range
+        self.workers = workers
         self.generated_key = False
         self.generated_iv = False
 
         self.set_mode(mode)
+        self.set_padding(padding)
         self.set_key(key_gen, key_path)
         self.set_iv(iv_gen, iv_path)
-        self.set_encoder(encoder)
+        self.set_encoder(encoder, wrap)
+        if mac_key_path:
+            if container or range:
+                raise AttributeError(
+                    "--mac-key cannot be combined with --container or --range."
+                )
+            self.cipher.mac_key = self.read_from_file(mac_key_path)
+        if profile:
+            self.cipher.profiler = get_profiler("cipher")
 
     def execute(self):
         """Performs necessary encryption/decryption and associated writing
-        operations.
+        operations. Data is streamed from input to output `buffer_size` bytes
+        at a time. When profiling, a breakdown of where the time went is
+        printed to stderr afterwards. Output is removed from a file when the
+        MAC check fails, and held back from stdout until it passes.
+        """
+        self.write_generated()
+        if self.container or self.range:
+            # Containers and ranges are read by seeking, so stdin is spooled
+            # first.
+            sized = self.decrypt
+        else:
+            sized = not self.decrypt and self.cipher.stream_requires_size
+        offset, length = self.range or (0, None)
+        try:
+            self._crypt(sized, offset, length)
+        except Exception:
+            if self.decrypt and self.cipher.mac_key is not None and (
+                self.data_output_path not in (None, base_cli.STREAM_PATH)
+            ):
+                os.remove(self.data_output_path)
+            raise
+
+        if self.cipher.profiler is not None:
+            print(self.cipher.profiler.format_report(), file=sys.stderr)
+
+    def _crypt(self, sized, offset, length):
+        if self.container:
+            # Only loaded for containers, as it pulls in json.
+            from crypto.classes.container import (
+                decrypt_container,
+                encrypt_container
+            )
+        with self.open_data_input(sized=sized) as src:
+            with self.open_data_output() as dst:
+                if self.container and self.decrypt:
+                    decrypt_container(self.cipher, src, dst, offset, length)
+                elif self.range:
+                    self.cipher._write_stream(
+                        dst,
+                        self.cipher.iter_decrypt_range(
+                            src,
+                            offset,
+                            length,
+                            self.buffer_size
+                        )
+                    )
+                elif self.container:
+                    encrypt_container(
+                        self.cipher,
+                        src,
+                        dst,
+                        self.buffer_size
+                    )
+                elif self.decrypt:
+                    self.cipher.decrypt_stream(
+                        src,
+                        dst,
+                        self.buffer_size,
+                        workers=self.workers
+                    )
+                else:
+                    self.cipher.encrypt_stream(
+                        src,
+                        dst,
+                        self.buffer_size,
+                        workers=self.workers
+                    )
+
+    @contextlib.contextmanager
+    def open_data_output(self):
+        """Decrypted output for stdout is spooled to a temporary file when a
+        MAC is checked, and only written out once the check passes. Other
+        output is opened as usual.
         """
+        if not (
+            self.decrypt and
+            self.cipher.mac_key is not None and
+            self.data_output_path == base_cli.STREAM_PATH
+        ):
+            with super(CipherInterface, self).open_data_output() as dst:
+                yield dst
+            return
+
+        import tempfile  # Slow to import, and rarely needed.
+        with tempfile.TemporaryFile() as f:
+            yield f
+            f.seek(0)
+            shutil.copyfileobj(f, sys.stdout, self.buffer_size)
+            sys.stdout.flush()
+
+    def write_generated(self):
+        """Write a generated key and IV to files named after the time."""
         epoch = "%s" % int(time.time())
 
         if self.generated_key:
@@ -78,15 +198,10 @@ class CipherInterface(base_cli.DataInterface):
         if self.generated_iv:
             self.write_to_file("%s.iv" % epoch, self.cipher.iv)
 
-        if self.decrypt:
-            self.store_data(self.cipher.decrypt(self.data))
-        else:
-            self.store_data(self.cipher.encrypt(self.data))
-
-    def set_encoder(self, encoder):
-        """Set the cipher's encoder."""
+    def set_encoder(self, encoder, wrap=None):
+        """Set the cipher's encoder and the line width to wrap its output."""
         if encoder:
-            self.cipher.set_encoding(ENCODERS[encoder])
+            self.cipher.set_encoding(ENCODERS[encoder], wrap=wrap)
 
     def set_key(self, key_gen, key_path):
         """Determine and set cipher's key. Reading file `key_path` takes highest
@@ -111,8 +226,8 @@ class CipherInterface(base_cli.DataInterface):
         takes highest priority. When `iv_gen` is True, will generate an IV
         instead. Lowest priority is to fetch the IV from a commandline prompt.
         """
-        if 'iv' not in self.cipher.attributes:
-            return
+        if 'iv' not in self.cipher.attributes or self.container:
+            return  # Containers hold an IV for each chunk.
         elif not self.cipher.mode.requires_iv:
             return
         elif iv_path:
@@ -131,17 +246,93 @@ class CipherInterface(base_cli.DataInterface):
         if 'mode' in self.cipher.attributes and mode:
             self.cipher.mode = mode
 
+    def set_padding(self, padding):
+        """Set the cipher's padding scheme if appropriate."""
+        if 'padding' in self.cipher.attributes and padding:
+            self.cipher.padding = padding
+
+
+def parse_range(text):
+    """Parse OFFSET[:LENGTH] into an (offset, length) tuple, where length is
+    None when omitted. A negative offset counts back from the end.
+    """
+    offset, _, length = text.partition(":")
+    try:
+        offset = int(offset)
+        length = int(length) if length else None
+    except ValueError:
+        raise argparse.ArgumentTypeError("Expected OFFSET[:LENGTH].")
+    if length is not None and length < 0:
+        raise argparse.ArgumentTypeError("LENGTH must not be negative.")
+    return offset, length
+
+
+class BatchCipherInterface(CipherInterface):
+    """Class for commandline interface that encrypts or decrypts every file
+    under a directory, keeping relative paths, on a pool of `workers`
+    processes.
+    """
+    def __init__(self, cipher, input_dir, output_dir, *args, **kwargs):
+        if not output_dir:
+            raise AttributeError("--output-dir is required with --input-dir.")
+        if kwargs.get('clipboard') or kwargs.get('data_input_path'):
+            raise AttributeError(
+                "--input-dir cannot be combined with --input or --clipboard."
+            )
+        for option in ('container', 'profile', 'range'):
+            if kwargs.get(option):
+                raise AttributeError(
+                    "--%s cannot be used with --input-dir." % option
+                )
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        super(BatchCipherInterface, self).__init__(cipher, *args, **kwargs)
+
+    def execute(self):
+        """Process the directory, then print totals and failures to stderr.
+        Exits with an error when any file failed.
+        """
+        # Only loaded for --input-dir, like the process pool it runs on.
+        from crypto.classes.batch import crypt_directory, format_report
+        self.write_generated()
+        report = crypt_directory(
+            self.cipher,
+            self.input_dir,
+            self.output_dir,
+            decrypt=self.decrypt,
+            buffer_size=self.buffer_size,
+            processes=self.workers
+        )
+        print(format_report(report), file=sys.stderr)
+        if report['failures']:
+            sys.exit("pycrypto-cli: %d of %d files failed." % (
+                len(report['failures']),
+                report['files']
+            ))
+
+    def set_data_input(self, clipboard_input, data_input_path):
+        """Files are read from `input_dir` instead."""
+        self.data = None
+        self.data_input_path = None
+
+    def set_data_output(self, clipboard_output, data_output_path):
+        """Files are written to `output_dir` instead."""
+        self.data_output_path = None
+
 
 def execute(args):
     """Instantiates interface from argparse namespace and executes."""
-    interface = CipherInterface(**vars(args))
+    if args.input_dir:
+        interface = BatchCipherInterface(**vars(args))
+    else:
+        interface = CipherInterface(**vars(args))
     interface.execute()
 
 
 def add_parser_args(parser):
     """Adds Cipher related arguments to ArgumentParser and sets execute method.
     Add positional argument 'cipher'.
-    Uses optional switches (d, e, iv, IV, k, K, m).
+    Uses optional switches (container, d, e, iv, IV, j, k, K, m, p, w).
     """
     parser.set_defaults(execute=execute)
 
@@ -153,6 +344,17 @@ def add_parser_args(parser):
         type=str.upper
     )
 
+    parser.add_argument(
+        "--container",
+        action="store_true",
+        default=False,
+        help=("Write or read a container that records the cipher, mode and " +
+            "IVs with the ciphertext and can be read from any offset. Data " +
+            "is encrypted in chunks of --buffer-size bytes and is not " +
+            "encoded. Block ciphers only."
+        )
+    )
+
     parser.add_argument(
         "--decrypt",
         "-d",
@@ -170,6 +372,15 @@ def add_parser_args(parser):
         type=str.upper
     )
 
+    parser.add_argument(
+        "--input-dir",
+        default=None,
+        help=("Encrypt or decrypt every file under this directory into " +
+            "--output-dir, keeping relative paths. --workers sets the " +
+            "number of processes."
+        )
+    )
+
     parser.add_argument(
         "--iv",
         "-iv",
@@ -204,6 +415,17 @@ def add_parser_args(parser):
         help="Generate a random key automatically."
     )
 
+    parser.add_argument(
+        "--mac-key",
+        dest="mac_key_path",
+        help=("Path to a key to authenticate ciphertext with (Encrypt-then-" +
+            "MAC). An HMAC-SHA256 of the ciphertext, IV, mode, padding and " +
+            "counter start is appended when encrypting and checked while " +
+            "decrypting; decryption fails if it does not match. Use a " +
+            "different key than --key."
+        )
+    )
+
     parser.add_argument(
         "--mode",
         "-m",
@@ -212,3 +434,61 @@ def add_parser_args(parser):
         help="Chaining mode to use. This applies only to block ciphers.",
         type=str.upper
     )
+
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="Directory to write files processed from --input-dir to."
+    )
+
+    parser.add_argument(
+        "--padding",
+        "-p",
+        choices=PADDING_CHOICES,
+        default=None,
+        help=("Padding scheme to use. This applies only to block ciphers. " +
+            "RANDOM (the default) is the legacy scheme; the others are " +
+            "skipped in CFB and CTR modes."
+        ),
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help=("Print the time, calls and bytes of each stage (key setup, " +
+            "padding, cipher, encoding, I/O) to stderr when done."
+        )
+    )
+
+    parser.add_argument(
+        "--range",
+        default=None,
+        help=("Decrypt only LENGTH bytes (or up to the end) from OFFSET, " +
+            "given as OFFSET[:LENGTH]. A negative OFFSET counts from the " +
+            "end. Only the blocks covered are decrypted. Requires CTR, ECB " +
+            "or CBC mode and -e NULL, or --container."
+        ),
+        metavar="OFFSET[:LENGTH]",
+        type=parse_range
+    )
+
+    parser.add_argument(
+        "--workers",
+        "-j",
+        default=None,
+        help=("Number of threads to encrypt or decrypt on, for chaining " +
+            "modes that allow it (CTR, ECB, CBC when decrypting). 0 uses " +
+            "one per CPU."
+        ),
+        type=int
+    )
+
+    parser.add_argument(
+        "--wrap",
+        "-w",
+        default=None,
+        help="Wrap encoded output into lines of this many characters.",
+        type=int
+    )
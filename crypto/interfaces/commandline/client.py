@@ -0,0 +1,266 @@
+import crypto.interfaces.commandline.base as base_cli
+import errno
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import threading
+
+from crypto.classes.util import (
+    get_stream_size,
+    iter_chunks,
+    iter_frames,
+    read_frame,
+    write_frame
+)
+
+
+"""Thin client for a `pycrypto-cli serve` process. Only the options are sent;
+the server reads the key and IV files and keeps the cipher set up, so this
+module imports none of the cipher code.
+
+Protocol, over a Unix domain socket, with every frame prefixed by its length
+(see `crypto.classes.util.read_frame`):
+    client: a JSON request, input data frames, an empty frame.
+    server: output data frames, an empty frame, a JSON status whose `error`
+            is null on success.
+Requests may be repeated on one connection. The server closes the connection
+after a failed request.
+
+Requests name key files and carry plaintext, so the default socket lives in a
+directory only its user can enter, and the client checks that the server runs
+as the same user before sending anything.
+"""
+
+DEFAULT_SOCKET_DIR = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR", "/tmp"),
+    "pycrypto-cli-%s" % os.getuid()
+)
+DEFAULT_SOCKET_PATH = os.path.join(DEFAULT_SOCKET_DIR, "cipher.sock")
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)  # Missing on Python 2.
+
+
+class ClientInterface(base_cli.DataInterface):
+    """Class for commandline interface that encrypts or decrypts through a
+    server. Options match the `cipher` subcommand, except that keys and IVs
+    must be given as files.
+    """
+    def __init__(
+        self,
+        cipher,
+        clipboard=None,
+        data_input_path=None,
+        data_output_path=None,
+        buffer_size=None,
+        memory_map=None,
+        decrypt=None,
+        encoder=None,
+        iv_path=None,
+        key_path=None,
+        mode=None,
+        padding=None,
+        socket_path=None,
+        wrap=None,
+        *args,
+        **kwargs
+    ):
+        super(ClientInterface, self).__init__(
+            clipboard,
+            data_input_path,
+            data_output_path,
+            buffer_size,
+            memory_map
+        )
+        if not key_path:
+            raise AttributeError("A key file is required in client mode.")
+
+        self.decrypt = bool(decrypt)
+        self.socket_path = socket_path or DEFAULT_SOCKET_PATH
+        self.request = {
+            'cipher': cipher,
+            'decrypt': self.decrypt,
+            'encoder': encoder,
+            'iv_path': os.path.abspath(iv_path) if iv_path else None,
+            'key_path': os.path.abspath(key_path),
+            'mode': mode,
+            'padding': padding,
+            'wrap': wrap
+        }
+
+    def _send(self, wfile, request, src):
+        """Send the request followed by the data read from `src`. Runs on its
+        own thread so the server's output is read while input is sent.
+        """
+        try:
+            write_frame(wfile, json.dumps(request))
+            for chunk in iter_chunks(src, self.buffer_size):
+                write_frame(wfile, chunk)
+            write_frame(wfile, "")
+            wfile.flush()
+        except socket.error:
+            pass  # The server hung up early; its status explains why.
+
+    def execute(self):
+        """Stream the input through the server to the output. Exits with the
+        server's error message if the request fails.
+        """
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.socket_path)
+        try:
+            if get_peer_uid(connection, self.socket_path) != os.getuid():
+                raise IOError(
+                    "The server on %s belongs to another user." % (
+                        self.socket_path
+                    )
+                )
+            rfile = connection.makefile('rb')
+            wfile = connection.makefile('wb', self.buffer_size)
+            with self.open_data_input() as src:
+                request = dict(self.request)
+                if not self.decrypt:
+                    request['size'] = get_stream_size(src)
+                sender = threading.Thread(
+                    target=self._send,
+                    args=(wfile, request, src)
+                )
+                sender.daemon = True
+                sender.start()
+
+                with self.open_data_output() as dst:
+                    for chunk in iter_frames(rfile):
+                        dst.write(chunk)
+                status = read_frame(rfile)
+                sender.join()
+        finally:
+            connection.close()
+
+        if status is None:
+            sys.exit("pycrypto-cli: The server closed the connection.")
+        status = json.loads(status)
+
+        if status['error']:
+            sys.exit("pycrypto-cli: %s" % status['error'])
+
+
+def get_peer_uid(connection, socket_path):
+    """Return the user id of the process at the other end of `connection`, or
+    of the owner of the socket file where the system cannot tell.
+    """
+    if sys.platform.startswith("linux"):
+        credentials = connection.getsockopt(
+            socket.SOL_SOCKET,
+            SO_PEERCRED,
+            struct.calcsize("3i")
+        )
+        return struct.unpack("3i", credentials)[1]
+    return os.stat(socket_path).st_uid
+
+
+def make_private_dir(path):
+    """Create the directory at `path` with access for the current user only,
+    or check that an existing one is such. Raises IOError otherwise.
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    status = os.lstat(path)
+    if (
+        not stat.S_ISDIR(status.st_mode) or
+        status.st_uid != os.getuid() or
+        status.st_mode & 0o077
+    ):
+        raise IOError(
+            "%s must be a directory that only this user can access." % path
+        )
+
+
+def execute(args):
+    """Instantiates interface from argparse namespace and executes."""
+    interface = ClientInterface(**vars(args))
+    interface.execute()
+
+
+def add_parser_args(parser):
+    """Adds client related arguments to ArgumentParser and sets execute
+    method.
+    Add positional argument 'cipher'.
+    Uses optional switches (d, e, iv, k, m, p, s, w).
+    """
+    parser.set_defaults(execute=execute)
+
+    parser.add_argument(
+        "cipher",
+        help="Cipher algorithm to apply.",
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--decrypt",
+        "-d",
+        action="store_true",
+        default=False,
+        help="When True will decrypt data. When False will encrypt data."
+    )
+
+    parser.add_argument(
+        "--encoder",
+        "-e",
+        default=None,
+        help=("Encoder/Decoder to apply to text when encrypting/decrypting. " +
+            "Defaults to that of the cipher subcommand."
+        ),
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--iv",
+        "-iv",
+        dest="iv_path",
+        help="Path to initialization vector used to encrypt or decrypt."
+    )
+
+    parser.add_argument(
+        "--key",
+        "-k",
+        dest="key_path",
+        help="Path to key used to encrypt or decrypt. Required.",
+        required=True
+    )
+
+    parser.add_argument(
+        "--mode",
+        "-m",
+        default=None,
+        help="Chaining mode to use. This applies only to block ciphers.",
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--padding",
+        "-p",
+        default=None,
+        help="Padding scheme to use. This applies only to block ciphers.",
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--socket",
+        "-s",
+        dest="socket_path",
+        default=None,
+        help="Path of the server's socket. Defaults to %s." % (
+            DEFAULT_SOCKET_PATH
+        )
+    )
+
+    parser.add_argument(
+        "--wrap",
+        "-w",
+        default=None,
+        help="Wrap encoded output into lines of this many characters.",
+        type=int
+    )
@@ -0,0 +1,347 @@
+from __future__ import print_function
+
+import crypto.interfaces.commandline.base as base_cli
+import os
+import sys
+
+from crypto.classes.digest import HASH_DEFAULT, HASHES, hash_stream
+from crypto.classes.manifest import (
+    DigestCache,
+    format_manifest,
+    format_report,
+    hash_directory,
+    parse_manifest,
+    verify_manifest
+)
+from crypto.classes.treehash import (
+    TREE_CHUNK_SIZE,
+    dump_tree,
+    format_report as format_tree_report,
+    load_tree,
+    tree_hash,
+    tree_hash_file,
+    verify_tree
+)
+
+
+HASH_CHOICES = HASHES.keys()
+
+
+class HashInterface(base_cli.DataInterface):
+    """Class for commandline interface that computes digests of data, reading
+    it once for all of the chosen algorithms.
+    """
+    def __init__(
+        self,
+        algorithms,
+        clipboard=None,
+        data_input_path=None,
+        data_output_path=None,
+        buffer_size=None,
+        memory_map=None,
+        hmac_key_path=None,
+        *args,
+        **kwargs
+    ):
+        super(HashInterface, self).__init__(
+            clipboard,
+            data_input_path,
+            data_output_path,
+            buffer_size,
+            memory_map
+        )
+        if isinstance(algorithms, basestring):
+            algorithms = [algorithms]  # The default when none are given.
+        self.algorithms = algorithms
+        self.hmac_key = None
+        if hmac_key_path:
+            self.hmac_key = self.read_from_file(hmac_key_path)
+
+    def execute(self):
+        """Stream the input through every digest and write one line per
+        algorithm, in the tagged format of `sha256sum --tag`.
+        """
+        with self.open_data_input() as src:
+            digest = hash_stream(
+                src,
+                self.algorithms,
+                self.hmac_key,
+                self.buffer_size
+            )
+
+        name = self.data_input_path or "-"
+        prefix = "HMAC-" if self.hmac_key is not None else ""
+        hexdigests = digest.hexdigests()
+        with self.open_data_output() as dst:
+            for algorithm in self.algorithms:
+                dst.write("%s%s (%s) = %s\n" % (
+                    prefix,
+                    algorithm,
+                    name,
+                    hexdigests[algorithm]
+                ))
+
+    def set_data_output(self, clipboard_output, data_output_path):
+        """Digests are written to stdout as is when no output is given, as
+        with `-o -`, so that they can be given back to --verify.
+        """
+        if not clipboard_output and not data_output_path:
+            data_output_path = base_cli.STREAM_PATH
+        super(HashInterface, self).set_data_output(
+            clipboard_output,
+            data_output_path
+        )
+
+
+class BatchHashInterface(HashInterface):
+    """Class for commandline interface that hashes every file under a
+    directory on a pool of `workers` processes and writes a manifest, or
+    verifies the files listed in one.
+    """
+    def __init__(
+        self,
+        algorithms,
+        input_dir=None,
+        cache_path=None,
+        verify_path=None,
+        workers=None,
+        *args,
+        **kwargs
+    ):
+        if kwargs.get('clipboard') or kwargs.get('data_input_path'):
+            raise AttributeError(
+                "--input-dir and --verify cannot be combined with --input " +
+                "or --clipboard."
+            )
+        self.input_dir = input_dir
+        if not input_dir and verify_path:
+            self.input_dir = os.path.dirname(verify_path) or "."
+        self.cache_path = cache_path
+        self.verify_path = verify_path
+        self.workers = workers
+        super(BatchHashInterface, self).__init__(algorithms, *args, **kwargs)
+
+    def execute(self):
+        """Write the manifest, or verify one, then print totals and failures
+        to stderr. Exits with an error when any file failed.
+        """
+        if self.verify_path:
+            report = self.verify()
+        else:
+            report = self.hash()
+        print(format_report(report), file=sys.stderr)
+        if report['failures']:
+            sys.exit("pycrypto-cli: %d of %d files failed." % (
+                len(report['failures']),
+                report['files']
+            ))
+
+    def hash(self):
+        """Hash the directory and write its manifest. Returns the report."""
+        cache = DigestCache(self.cache_path) if self.cache_path else None
+        entries, report = hash_directory(
+            self.input_dir,
+            self.algorithms,
+            cache=cache,
+            hmac_key=self.hmac_key,
+            chunk_size=self.buffer_size,
+            processes=self.workers
+        )
+        if cache is not None:
+            cache.save()
+
+        with self.open_data_output() as dst:
+            dst.write(format_manifest(
+                entries,
+                self.algorithms,
+                hmac=self.hmac_key is not None
+            ))
+        return report
+
+    def verify(self):
+        """Rehash the files listed in the manifest. Returns the report."""
+        with open(self.verify_path, 'rb') as f:
+            entries, hmac = parse_manifest(f)
+        if hmac and self.hmac_key is None:
+            raise AttributeError("The manifest holds HMACs; give --hmac-key.")
+        if not hmac and self.hmac_key is not None:
+            raise AttributeError("The manifest does not hold HMACs.")
+
+        return verify_manifest(
+            entries,
+            self.input_dir,
+            hmac_key=self.hmac_key,
+            chunk_size=self.buffer_size,
+            processes=self.workers
+        )
+
+    def set_data_input(self, clipboard_input, data_input_path):
+        """Files are read from `input_dir` instead."""
+        self.data = None
+        self.data_input_path = None
+
+
+class TreeHashInterface(HashInterface):
+    """Class for commandline interface that writes the tree digest of one
+    file, hashing its chunks on a pool of `workers` processes, or verifies
+    the file against a tree and reports the byte ranges that changed.
+    """
+    def __init__(
+        self,
+        algorithms,
+        chunk_size=None,
+        verify_path=None,
+        workers=None,
+        *args,
+        **kwargs
+    ):
+        if kwargs.get('input_dir'):
+            raise AttributeError("--tree cannot be combined with --input-dir.")
+        if kwargs.get('hmac_key_path'):
+            raise AttributeError("--tree cannot be combined with --hmac-key.")
+        super(TreeHashInterface, self).__init__(algorithms, *args, **kwargs)
+        if len(self.algorithms) != 1:
+            raise AttributeError("--tree takes a single algorithm.")
+        self.chunk_size = chunk_size or TREE_CHUNK_SIZE
+        self.verify_path = verify_path
+        self.workers = workers
+
+    def _is_file_input(self):
+        return self.data_input_path not in (None, base_cli.STREAM_PATH)
+
+    def execute(self):
+        """Write the tree as JSON, or verify the input against one, printing
+        totals and the chunks that differ to stderr. Exits with an error
+        when any chunk differs.
+        """
+        if not self.verify_path:
+            with self.open_data_output() as dst:
+                dst.write(dump_tree(self.hash()))
+            return
+
+        with open(self.verify_path, 'rb') as f:
+            expected = load_tree(f)
+        if self._is_file_input():
+            report = verify_tree(
+                expected,
+                path=self.data_input_path,
+                processes=self.workers
+            )
+        else:
+            with self.open_data_input() as src:
+                report = verify_tree(expected, src=src)
+        print(format_tree_report(report), file=sys.stderr)
+        if report['failures']:
+            sys.exit("pycrypto-cli: %d of %d chunks differ." % (
+                len(report['failures']),
+                report['chunks']
+            ))
+
+    def hash(self):
+        """Return the tree of the input. Files are hashed in parallel; other
+        input is read in one pass.
+        """
+        if self._is_file_input():
+            return tree_hash_file(
+                self.data_input_path,
+                self.algorithms[0],
+                self.chunk_size,
+                self.workers
+            )
+        with self.open_data_input() as src:
+            return tree_hash(src, self.algorithms[0], self.chunk_size)
+
+
+def execute(args):
+    """Instantiates interface from argparse namespace and executes."""
+    if args.tree:
+        interface = TreeHashInterface(**vars(args))
+    elif args.input_dir or args.verify_path:
+        interface = BatchHashInterface(**vars(args))
+    else:
+        interface = HashInterface(**vars(args))
+    interface.execute()
+
+
+def add_parser_args(parser):
+    """Adds Hash related arguments to ArgumentParser and sets execute method.
+    Add positional argument 'algorithms'.
+    Uses optional switches (j, k).
+    """
+    parser.set_defaults(execute=execute)
+
+    parser.add_argument(
+        "algorithms",
+        choices=HASH_CHOICES,
+        default=HASH_DEFAULT,
+        help=("Hash algorithms to apply. The data is read once for all of " +
+            "them. Defaults to %s." % HASH_DEFAULT
+        ),
+        metavar="ALGORITHM",
+        nargs="*",
+        type=str.upper
+    )
+
+    parser.add_argument(
+        "--cache",
+        dest="cache_path",
+        help=("With --input-dir, path to a cache of digests that is reused " +
+            "for files whose path, size, modification time and inode have " +
+            "not changed."
+        )
+    )
+
+    parser.add_argument(
+        "--chunk-size",
+        default=None,
+        help=("With --tree, bytes per chunk. Smaller chunks localize " +
+            "changes more finely but make larger trees. Defaults to " +
+            "%s." % TREE_CHUNK_SIZE
+        ),
+        type=int
+    )
+
+    parser.add_argument(
+        "--input-dir",
+        default=None,
+        help=("Hash every file under this directory and write a manifest " +
+            "of their digests, with relative paths, to --output."
+        )
+    )
+
+    parser.add_argument(
+        "--hmac-key",
+        "-k",
+        dest="hmac_key_path",
+        help="Path to a key to compute HMACs of the data with instead."
+    )
+
+    parser.add_argument(
+        "--tree",
+        action="store_true",
+        help=("Write a tree digest of the input as JSON: digests of each " +
+            "chunk, hashed in parallel, and a root digest of those. With " +
+            "--verify, check the input against such a tree and report the " +
+            "byte ranges that changed."
+        )
+    )
+
+    parser.add_argument(
+        "--verify",
+        dest="verify_path",
+        help=("Rehash the files listed in this manifest and report those " +
+            "that changed. Paths are relative to --input-dir, or else the " +
+            "manifest's directory."
+        )
+    )
+
+    parser.add_argument(
+        "--workers",
+        "-j",
+        default=None,
+        help=("Number of processes to hash files on with --input-dir or " +
+            "--verify, or chunks of a file on with --tree. Defaults to one " +
+            "per CPU."
+        ),
+        type=int
+    )
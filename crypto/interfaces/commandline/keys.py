@@ -1,51 +1,168 @@
+from __future__ import print_function
+
 import crypto.interfaces.commandline.base as base_cli
+import errno
+import itertools
+import os
+import sys
 import time
 
-import crypto.classes.keys.rsa as rsa
+from crypto.classes.registry import LazyRegistry
 
 
-KEY_CHOICES = ("RSA",)
+# Key classes are imported only when chosen.
+KEYS = LazyRegistry({
+    'RSA': 'crypto.classes.keys.rsa:RSAKeys'
+})
+KEY_CHOICES = KEYS.keys()
 KEY_DEFAULT = "RSA"
-KEYS = {
-    'RSA': rsa
-}
+KEY_FORMAT_DEFAULT = "PEM"
+KEY_SIZE_DEFAULT = 2048
+PRIVATE_KEY_MODE = 0o600
+PUBLIC_KEY_MODE = 0o644
 
 
 class KeysInterface(base_cli.Interface):
     """Class for commandline interface that deals with generating keys,
-    specifically.
+    specifically. With `count` or `output_dir`, keys are generated in bulk on
+    a pool of `workers` processes and written to `output_dir`. Key files are
+    never overwritten, and private keys are readable by their owner only.
     """
     def __init__(
         self,
         algorithm,
         data_output_path=None,
         key_format=None,
+        key_size=None,
+        count=None,
+        output_dir=None,
+        workers=None,
         *args,
         **kwargs
     ):
         super(KeysInterface, self).__init__()
+        if count is not None and count < 1:
+            raise AttributeError("--count must be at least 1.")
+        if count and not output_dir:
+            raise AttributeError("--count requires --output-dir.")
+        if output_dir and data_output_path:
+            raise AttributeError(
+                "--output cannot be combined with --output-dir."
+            )
 
         self.algorithm = algorithm
-        self.key_format = key_format
+        self.key_format = key_format or KEY_FORMAT_DEFAULT
+        self.key_size = key_size or KEY_SIZE_DEFAULT
+        self.count = count or 1
+        self.output_dir = output_dir
+        self.workers = workers
+        self.data_output_path = data_output_path
+        self.keys = KEYS[algorithm](self.key_format, self.key_size)
         self.set_data_output(data_output_path)
 
     def execute(self):
-        """Performs necessary encryption/decryption and associated writing
-        operations.
+        """Generate a key and write its private key, or with `output_dir`
+        write `count` key pairs there, printing totals to stderr.
         """
-        pass
+        if self.output_dir:
+            self.generate_many()
+            return
+
+        path = self.data_output_path
+        if path not in (None, base_cli.STREAM_PATH):
+            self.check_free([path, "%s.pub" % path])
+        self.store_data(self.keys.get_private_key())
+        if path not in (None, base_cli.STREAM_PATH):
+            self.create_file(
+                "%s.pub" % path,
+                self.keys.get_public_key(),
+                PUBLIC_KEY_MODE
+            )
+
+    def generate_many(self):
+        """Write `count` private keys to `output_dir` as key1, key2, ...
+        with public keys beside them as key1.pub, key2.pub, ...
+        """
+        from crypto.classes.keys.pool import generate_keys
+        try:
+            os.makedirs(self.output_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        width = len(str(self.count))
+        paths = [
+            os.path.join(self.output_dir, "key%0*d" % (width, number))
+            for number in xrange(1, self.count + 1)
+        ]
+        self.check_free(paths + [path + ".pub" for path in paths])
+
+        start = time.time()
+        keys = generate_keys(self.key_size, self.count, self.workers)
+        for path, key in itertools.izip(paths, keys):
+            self.keys.key = key
+            self.create_file(
+                path,
+                self.keys.get_private_key(),
+                PRIVATE_KEY_MODE
+            )
+            self.create_file(
+                path + ".pub",
+                self.keys.get_public_key(),
+                PUBLIC_KEY_MODE
+            )
+
+        seconds = max(time.time() - start, 1e-6)
+        print(
+            "%d %s-%d keys in %.2fs: %.2f keys/s." % (
+                self.count,
+                self.algorithm,
+                self.key_size,
+                seconds,
+                self.count / seconds
+            ),
+            file=sys.stderr
+        )
+
+    def check_free(self, paths):
+        """Raise IOError, before any key is generated, if a file exists at
+        any of `paths`.
+        """
+        for path in paths:
+            if os.path.lexists(path):
+                raise IOError("%s already exists." % path)
+
+    def create_file(self, path, data, mode):
+        """Write data to a new file at `path` with permissions `mode`. Raises
+        IOError rather than replace an existing file.
+        """
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, mode)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                raise IOError("%s already exists." % path)
+            raise
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
 
     def set_data_output(self, data_output_path):
         """Stores the method to be called for generating store_data. Writing to
         file `data_output_path` takes highest priority. Lowest priority is to
         print to screen.
         """
-        if data_output_path:
+        if data_output_path == base_cli.STREAM_PATH:
             self.store_data = lambda data: self.write_to_file(
                 data_output_path,
                 data
             )
             return
+        if data_output_path:
+            self.store_data = lambda data: self.create_file(
+                data_output_path,
+                data,
+                PRIVATE_KEY_MODE
+            )
+            return
 
         self.store_data = lambda data: print("DATA: %s" % data)
 
@@ -57,9 +174,9 @@ def execute(args):
 
 
 def add_parser_args(parser):
-    """Adds Cipher related arguments to ArgumentParser and sets execute method.
+    """Adds Keys related arguments to ArgumentParser and sets execute method.
     Add positional argument 'algorithm'.
-    Uses optional switches (f, o).
+    Uses optional switches (b, f, j, n, o).
     """
     parser.set_defaults(execute=execute)
 
@@ -71,17 +188,61 @@ def add_parser_args(parser):
         type=str.upper
     )
 
+    parser.add_argument(
+        "--bits",
+        "-b",
+        default=KEY_SIZE_DEFAULT,
+        dest="key_size",
+        help=("Key size in bits, a multiple of 256 of at least 1024. " +
+            "Defaults to %s." % KEY_SIZE_DEFAULT
+        ),
+        type=int
+    )
+
+    parser.add_argument(
+        "--count",
+        "-n",
+        default=None,
+        help=("Number of key pairs to generate into --output-dir, on " +
+            "--workers processes."
+        ),
+        type=int
+    )
+
     parser.add_argument(
         "--format",
         "-f",
-        choices=KEY_FORMATS,
+        choices=KEYS[KEY_DEFAULT].supported_modes,
+        default=KEY_FORMAT_DEFAULT,
         dest="key_format",
-        help="The format of the key.",
+        help=("The format of the key. With OpenSSH, the private key is " +
+            "written as PEM."
+        )
     )
 
     parser.add_argument(
         "--output",
         "-o",
         dest="data_output_path",
-        help="Path to file to write data out to."
+        help=("Path to file to write the private key out to. The public key " +
+            "is written beside it with a .pub suffix."
+        )
+    )
+
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help=("Directory to write key pairs to, as key1, key1.pub, key2, " +
+            "and so on."
+        )
+    )
+
+    parser.add_argument(
+        "--workers",
+        "-j",
+        default=None,
+        help=("Number of processes to generate keys on with --output-dir. " +
+            "Defaults to one per CPU."
+        ),
+        type=int
     )
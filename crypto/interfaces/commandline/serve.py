@@ -0,0 +1,258 @@
+from __future__ import print_function
+
+import collections
+import crypto.interfaces.commandline.base as base_cli
+import crypto.interfaces.commandline.cipher as cipher_cli
+import crypto.interfaces.commandline.client as client_cli
+import errno
+import json
+import os
+import signal
+import socket
+import SocketServer
+import sys
+import tempfile
+import threading
+
+from crypto.classes.util import (
+    iter_chunks,
+    iter_frames,
+    read_frame,
+    write_frame
+)
+
+
+"""Long running server for `pycrypto-cli client`. Set up ciphers are kept by
+their options and the identity of their key and IV files, so repeated
+requests skip interpreter startup, imports, key file reads and cipher set up.
+See `crypto.interfaces.commandline.client` for the protocol.
+"""
+
+DEFAULT_MAX_CIPHERS = 64
+
+
+class CipherRequestHandler(SocketServer.StreamRequestHandler):
+    """Handles the requests sent over one connection, in turn."""
+    wbufsize = base_cli.DEFAULT_BUFFER_SIZE
+
+    def handle(self):
+        while True:
+            header = read_frame(self.rfile)
+            if header is None:
+                return
+
+            try:
+                self.process(json.loads(header))
+                error = None
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+            write_frame(self.wfile, "")
+            write_frame(self.wfile, json.dumps({'error': error}))
+            self.wfile.flush()
+            if error:
+                return
+
+    def process(self, request):
+        """Stream the request's input frames through its cipher, writing the
+        output as frames.
+        """
+        cipher = self.server.get_cipher(request)
+        chunks = iter_frames(self.rfile)
+        if request.get('decrypt'):
+            output = cipher.iter_decrypt(chunks)
+        elif request.get('size') is None and cipher.stream_requires_size:
+            output = self.server.encrypt_unsized(cipher, chunks)
+        else:
+            output = cipher.iter_encrypt(chunks, size=request.get('size'))
+
+        for chunk in output:
+            if chunk:
+                write_frame(self.wfile, chunk)
+
+
+class CipherServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Unix domain socket server handling each connection on its own thread.
+    Up to `max_ciphers` set up ciphers are kept, dropping the least recently
+    used. Ciphers are shared between threads, which is safe since encrypting
+    and decrypting do not change them.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, max_ciphers=DEFAULT_MAX_CIPHERS):
+        self.max_ciphers = max_ciphers
+        self._ciphers = collections.OrderedDict()
+        self._lock = threading.Lock()
+        _remove_stale_socket(socket_path)
+
+        # Only the owner may connect, since requests name files to read.
+        umask = os.umask(0o177)
+        try:
+            SocketServer.UnixStreamServer.__init__(
+                self,
+                socket_path,
+                CipherRequestHandler
+            )
+        finally:
+            os.umask(umask)
+
+    def _read_file(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def create_cipher(self, request):
+        """Return a cipher set up from the options of a request."""
+        encoder = request.get('encoder') or cipher_cli.ENCODER_DEFAULT
+        name = request['cipher']
+        if name not in cipher_cli.CIPHERS:
+            raise AttributeError("Cipher not supported: %s" % name)
+        if encoder not in cipher_cli.ENCODERS:
+            raise AttributeError("Encoder not supported: %s" % encoder)
+
+        cipher = cipher_cli.CIPHERS[name]()
+        if 'mode' in cipher.attributes and request.get('mode'):
+            cipher.mode = request['mode']
+        if 'padding' in cipher.attributes and request.get('padding'):
+            cipher.padding = request['padding']
+        cipher.key = self._read_file(request['key_path'])
+        if 'iv' in cipher.attributes and cipher.mode.requires_iv:
+            if not request.get('iv_path'):
+                raise AttributeError("An IV file is required for this mode.")
+            cipher.iv = self._read_file(request['iv_path'])
+        cipher.set_encoding(
+            cipher_cli.ENCODERS[encoder],
+            wrap=request.get('wrap')
+        )
+        return cipher
+
+    def encrypt_unsized(self, cipher, chunks):
+        """Encrypt chunks of unknown total size with a cipher whose padding
+        needs it, by spooling them to a temporary file first.
+        """
+        with tempfile.TemporaryFile() as f:
+            for chunk in chunks:
+                f.write(chunk)
+            size = f.tell()
+            f.seek(0)
+            for chunk in cipher.iter_encrypt(iter_chunks(f), size=size):
+                yield chunk
+
+    def get_cipher(self, request):
+        """Return the cipher for a request, setting one up on first use. A
+        changed key or IV file is noticed through its size, inode and
+        modification time.
+        """
+        cache_key = (
+            request['cipher'],
+            request.get('mode'),
+            request.get('padding'),
+            request.get('encoder'),
+            request.get('wrap'),
+            request['key_path'],
+            _get_file_id(request['key_path']),
+            request.get('iv_path'),
+            _get_file_id(request.get('iv_path'))
+        )
+        with self._lock:
+            cipher = self._ciphers.pop(cache_key, None)
+            if cipher is not None:
+                self._ciphers[cache_key] = cipher
+                return cipher
+
+        cipher = self.create_cipher(request)
+        with self._lock:
+            self._ciphers[cache_key] = cipher
+            while len(self._ciphers) > self.max_ciphers:
+                self._ciphers.popitem(last=False)
+        return cipher
+
+
+def _get_file_id(path):
+    """Return a tuple that changes when the file at `path` does."""
+    if not path:
+        return None
+    status = os.stat(path)
+    return status.st_ino, status.st_size, status.st_mtime
+
+
+def _remove_stale_socket(socket_path):
+    """Remove a socket file left behind by a server that is not running, and
+    refuse to replace one that is.
+    """
+    if not os.path.exists(socket_path):
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except socket.error as e:
+        if e.errno != errno.ECONNREFUSED:
+            raise
+        os.remove(socket_path)
+    else:
+        raise IOError("A server is already listening on %s." % socket_path)
+    finally:
+        probe.close()
+
+
+class ServeInterface(base_cli.Interface):
+    """Class for commandline interface that runs a cipher server until it is
+    interrupted.
+    """
+    def __init__(
+        self,
+        max_ciphers=None,
+        socket_path=None,
+        *args,
+        **kwargs
+    ):
+        super(ServeInterface, self).__init__()
+        self.max_ciphers = max_ciphers or DEFAULT_MAX_CIPHERS
+        self.socket_path = socket_path or client_cli.DEFAULT_SOCKET_PATH
+
+    def execute(self):
+        """Serve until interrupted or terminated, then remove the socket."""
+        if self.socket_path == client_cli.DEFAULT_SOCKET_PATH:
+            client_cli.make_private_dir(client_cli.DEFAULT_SOCKET_DIR)
+        server = CipherServer(self.socket_path, self.max_ciphers)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print("Listening on %s" % self.socket_path, file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(self.socket_path)
+
+
+def execute(args):
+    """Instantiates interface from argparse namespace and executes."""
+    interface = ServeInterface(**vars(args))
+    interface.execute()
+
+
+def add_parser_args(parser):
+    """Adds server related arguments to ArgumentParser and sets execute
+    method.
+    Uses optional switches (s).
+    """
+    parser.set_defaults(execute=execute)
+
+    parser.add_argument(
+        "--max-ciphers",
+        default=None,
+        help="Number of set up ciphers to keep. Defaults to %s." % (
+            DEFAULT_MAX_CIPHERS
+        ),
+        type=int
+    )
+
+    parser.add_argument(
+        "--socket",
+        "-s",
+        dest="socket_path",
+        default=None,
+        help="Path of the socket to listen on. Defaults to %s." % (
+            client_cli.DEFAULT_SOCKET_PATH
+        )
+    )
@@ -0,0 +1,164 @@
+import crypto.classes.benchmark as benchmark
+import crypto.classes.ciphers.aes as aes_cipher
+import crypto.classes.ciphers.xor as xor_cipher
+import crypto.classes.encoders.binary as binary_encoders
+import crypto.interfaces.commandline.bench as bench_cli
+import json
+import random
+import StringIO
+import unittest
+
+import mock
+
+
+class BenchmarkUtilTest(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(benchmark.parse_size("16"), 16)
+        self.assertEqual(benchmark.parse_size("64k"), 64 * 1024)
+        self.assertEqual(benchmark.parse_size("1G"), 1024 ** 3)
+        self.assertRaises(ValueError, benchmark.parse_size, "0")
+        self.assertRaises(ValueError, benchmark.parse_size, "meow")
+
+    def test_format_size(self):
+        for size in benchmark.DEFAULT_SIZES + (1000, 1024 ** 3):
+            self.assertEqual(
+                benchmark.parse_size(benchmark.format_size(size)),
+                size
+            )
+        self.assertEqual(benchmark.format_size(1536), "1536")
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 90), 7)
+
+    def test_get_random_bytes(self):
+        first = benchmark.get_random_bytes(random.Random(1), 100)
+        self.assertEqual(len(first), 100)
+        self.assertEqual(
+            first,
+            benchmark.get_random_bytes(random.Random(1), 100)
+        )
+        self.assertEqual(benchmark.get_random_bytes(random.Random(1), 0), "")
+
+    def test_repeating_reader(self):
+        reader = benchmark.RepeatingReader("meow", 10)
+        self.assertEqual(reader.read(3), "meo")
+        self.assertEqual(reader.read(5), "meowm")
+        self.assertEqual(reader.read(), "me")
+        self.assertEqual(reader.read(4), "")
+
+    def test_summarize(self):
+        summary = benchmark.summarize([0.5, 0.25, 0.25], 1000000)
+        self.assertEqual(summary['calls'], 3)
+        self.assertEqual(summary['mb_per_s'], 3)
+        self.assertEqual(summary['ops_per_s'], 3)
+        self.assertEqual(summary['latency']['p50'], 0.25)
+        self.assertEqual(summary['latency']['max'], 0.5)
+
+    def test_run_in_child(self):
+        def allocate(size):
+            data = "x" * size
+            return len(data)
+
+        size = 64 * 1024 ** 2
+        self.assertEqual(benchmark.run_in_child(allocate, size)[0], size)
+        large = benchmark.run_in_child(allocate, size)[1]
+        small = benchmark.run_in_child(allocate, 1)[1]
+        self.assertTrue(small > 0)
+        self.assertTrue(large - small > size / 2)
+
+        self.assertRaises(
+            ValueError,
+            benchmark.run_in_child,
+            benchmark.parse_size,
+            "meow"
+        )
+
+
+class BenchCipherTest(unittest.TestCase):
+    def test_seed_cipher(self):
+        first = benchmark.seed_cipher(aes_cipher.AESCipher(mode='CBC'), 3)
+        second = benchmark.seed_cipher(aes_cipher.AESCipher(mode='CBC'), 3)
+        self.assertEqual(first.key, second.key)
+        self.assertEqual(first.iv, second.iv)
+        self.assertEqual(len(first.iv), 16)
+
+    def test_bench_cipher(self):
+        cipher = benchmark.seed_cipher(aes_cipher.AESCipher(mode='CTR'))
+        cipher.set_encoding(binary_encoders.Base64Encoder)
+        for size in (16, 5000):  # In memory, then streamed.
+            for summary in benchmark.bench_cipher(
+                cipher,
+                size,
+                min_time=0,
+                chunk_size=1024
+            ):
+                self.assertEqual(summary['calls'], 1)
+                self.assertTrue(summary['mb_per_s'] > 0)
+
+    def test_bench_cipher_streamed_decrypt(self):
+        """Streamed decryption must read back what was encrypted."""
+        cipher = benchmark.seed_cipher(xor_cipher.XORCipher())
+        decrypt_stream = cipher.decrypt_stream
+        plaintexts = []
+
+        def capture(src, dst, *args, **kwargs):
+            dst = StringIO.StringIO()
+            decrypt_stream(src, dst, *args, **kwargs)
+            plaintexts.append(dst.getvalue())
+
+        with mock.patch.object(cipher, 'decrypt_stream', side_effect=capture):
+            benchmark.bench_cipher(cipher, 3000, min_time=0, chunk_size=1000)
+        self.assertEqual(
+            plaintexts,
+            [benchmark.get_random_bytes(random.Random(0), 1000) * 3]
+        )
+
+
+class BenchInterfaceTest(unittest.TestCase):
+    def test_iter_matrix(self):
+        interface = bench_cli.BenchInterface(
+            ciphers=["XOR", "AES"],
+            encoders=["NULL"],
+            modes=["CTR", "ECB"]
+        )
+        self.assertEqual(
+            list(interface.iter_matrix()),
+            [
+                ("AES", "CTR", "NULL"),
+                ("AES", "ECB", "NULL"),
+                ("XOR", None, "NULL")
+            ]
+        )
+
+    @mock.patch('sys.stderr', new_callable=StringIO.StringIO)
+    @mock.patch('sys.stdout', new_callable=StringIO.StringIO)
+    def test_execute(self, stdout_mock, stderr_mock):
+        interface = bench_cli.BenchInterface(
+            ciphers=["AES", "XOR"],
+            encoders=["BASE64"],
+            json_path="-",
+            min_time=0,
+            modes=["CBC"],
+            padding="PKCS7",
+            sizes=[16, 100]
+        )
+        interface.execute()
+        report = json.loads(stdout_mock.getvalue())
+        self.assertEqual(len(report['results']), 8)
+        self.assertEqual(report['config']['padding'], "PKCS7")
+        self.assertIn('pycrypto', report['metadata'])
+        self.assertEqual(
+            set(result['operation'] for result in report['results']),
+            set(bench_cli.OPERATIONS)
+        )
+        self.assertEqual(len(stderr_mock.getvalue().splitlines()), 9)
+        self.assertTrue(
+            all(result['peak_rss'] > 0 for result in report['results'])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,18 +1,34 @@
 import crypto.classes.ciphers.aes as aes_cipher
+import crypto.classes.ciphers.asynchronous as async_cipher
 import crypto.classes.ciphers.base as base_cipher
 import crypto.classes.ciphers.blowfish as blowfish_cipher
+import crypto.classes.ciphers.cache as cipher_cache
 import crypto.classes.ciphers.cast as cast_cipher
+import crypto.classes.ciphers.padding as padding
+import crypto.classes.ciphers.parallel as parallel
 import crypto.classes.ciphers.xor as xor_cipher
+import crypto.classes.container as container
 import crypto.classes.encoders.base as base_encoders
 import crypto.classes.encoders.binary as binary_encoders
+import crypto.classes.entropy as entropy
+import crypto.classes.profiling as profiling
+import crypto.classes.util as classes_util
+import hashlib
+import hmac
+import mmap
+import os
 import mock
 import string
+import StringIO
+import tempfile
+import threading
 import unittest
 import util
 
 from Crypto.Cipher import AES
 from Crypto.Cipher import Blowfish
 from Crypto.Cipher import CAST
+from Crypto.Cipher import XOR
 from Crypto.Random import random
 
 
@@ -95,19 +111,16 @@ class BlockCipherMixin(CryptoCipherMixin):
         if invalid_iv is not None:
             self.assertRaises(AttributeError, setattr, cipher, 'iv', invalid_iv)
 
-    @mock.patch('Crypto.Random.new')
-    def _test_get_pad_char(self, cipher, random_new_mock):
-        random_device_mock = mock.Mock()
-        random_new_mock.return_value = random_device_mock
+    @mock.patch('crypto.classes.entropy.default_pool.read')
+    def _test_get_pad_char(self, cipher, pool_read_mock):
+        pool_read_mock.side_effect = ["m", "e", "o", "w"]
+        self.assertEqual(cipher.padding._get_pad_char(), "m")
+        pool_read_mock.assert_called_with(1)
 
-        random_device_mock.read.side_effect = ["m", "e", "o", "w"]
-        self.assertEqual(cipher._get_pad_char(), "m")
-        random_device_mock.read.assert_called_with(1)
+        self.assertEqual(cipher.padding._get_pad_char(ignore="e"), "o")
+        self.assertEqual(cipher.padding._get_pad_char(ignore="m"), "w")
 
-        self.assertEqual(cipher._get_pad_char(ignore="e"), "o")
-        self.assertEqual(cipher._get_pad_char(ignore="m"), "w")
-
-    @mock.patch('crypto.classes.ciphers.base.BlockCipher._get_pad_char')
+    @mock.patch('crypto.classes.ciphers.padding.RandomPadding._get_pad_char')
     def _test_pad(self, cipher, get_pad_char_mock):
         get_pad_char_mock.return_value = "_"
         self.assertEqual(cipher.pad("meow", 6), "__meow")
@@ -116,6 +129,83 @@ class BlockCipherMixin(CryptoCipherMixin):
         self.assertEqual(cipher.pad("meow", 4), "____meow")
         self.assertEqual(cipher.pad("meow", 2), "__meow")
 
+    def _test_batch_encryption(self, cipher, mode):
+        """Batches must be interchangeable with single encrypt/decrypt."""
+        cipher.mode = mode
+        cipher.key = cipher.generate_key()
+        cipher.iv = cipher.generate_iv()
+        cipher.set_encoding(binary_encoders.Base64Encoder)
+        random_device = random.Random.new()
+        plaintexts = [random_device.read(size) for size in xrange(1, 100)]
+
+        ciphertexts = cipher.encrypt_many(plaintexts)
+        self.assertEqual(len(ciphertexts), len(plaintexts))
+        for plaintext, ciphertext in zip(plaintexts, ciphertexts):
+            self.assertEqual(cipher.decrypt(ciphertext), plaintext)
+
+        ciphertexts = [cipher.encrypt(plaintext) for plaintext in plaintexts]
+        self.assertEqual(cipher.decrypt_many(ciphertexts), plaintexts)
+        self.assertEqual(
+            cipher.decrypt_many(cipher.encrypt_many(["", "meow"])),
+            ["", "meow"]
+        )
+        self.assertEqual(cipher.encrypt_many([]), [])
+
+    def _test_parallel_encryption(self, cipher, mode):
+        """Parallel output must match the serial path byte for byte."""
+        cipher.mode = mode
+        cipher.key = cipher.generate_key()
+        cipher.iv = cipher.generate_iv()
+        plaintext = random.Random.new().read(parallel.SEGMENT_SIZE * 3 + 5)
+
+        with mock.patch.object(
+            cipher.padding,
+            '_get_pad_char',
+            return_value="_"
+        ):
+            ciphertext = cipher.encrypt(plaintext)
+            for workers in (1, 4):
+                self.assertEqual(
+                    cipher.encrypt(plaintext, workers=workers),
+                    ciphertext
+                )
+                self.assertEqual(
+                    cipher.decrypt(ciphertext, workers=workers),
+                    plaintext
+                )
+
+    def _test_padding_schemes(self, cipher):
+        """Every scheme must round trip in every mode, whole and streamed."""
+        cipher.mode = 'CBC'
+        cipher.key = cipher.generate_key()
+        cipher.iv = cipher.generate_iv()
+        cipher.set_encoding(base_encoders.NullEncoder)
+        block_size = cipher.cipher.block_size
+        random_device = random.Random.new()
+        for name in ('ANSIX923', 'ISO7816', 'PKCS7'):
+            cipher.padding = name
+            self.assertFalse(cipher.stream_requires_size)
+            for mode in ('CBC', 'CFB', 'CTR', 'ECB', 'OFB'):
+                cipher.mode = mode
+                for size in (0, 1, block_size - 1, block_size, 100):
+                    plaintext = random_device.read(size)
+                    ciphertext = cipher.encrypt(plaintext)
+                    if cipher.mode.stream:
+                        self.assertEqual(len(ciphertext), size)
+                    else:
+                        self.assertEqual(
+                            len(ciphertext),
+                            size + block_size - size % block_size
+                        )
+                    self.assertEqual(cipher.decrypt(ciphertext), plaintext)
+                    if size > 1:  # A byte may encrypt to itself.
+                        util.test_cipher_stream_encryption(
+                            self,
+                            cipher,
+                            plaintext,
+                            7
+                        )
+
     def _test_unpad(self, cipher):
         self.assertEqual(cipher.unpad("____meow"), "meow")
         self.assertEqual(cipher.unpad("__meow"), "meow")
@@ -226,6 +316,7 @@ class AESCipherTest(unittest.TestCase, BlockCipherMixin):
             iv="meow wruff wruff"
         )
         cipher.mode = 'ECB'
+        cipher.cipher_cache = cipher_cache.CipherCache()
         self.assertEqual(cipher._get_cipher(), aes_new_mock.return_value)
         aes_new_mock.assert_called_with("wruff wruff meow", AES.MODE_ECB)
 
@@ -253,6 +344,108 @@ class AESCipherTest(unittest.TestCase, BlockCipherMixin):
         aes_cipher_mock.decrypt.assert_called_with(decode_mock.return_value)
         unpad_mock.assert_called_with(aes_cipher_mock.decrypt.return_value)
 
+    def test_iter_encrypt_requires_size(self):
+        cipher = aes_cipher.AESCipher(key="wruff wruff meow")
+        self.assertRaises(ValueError, cipher.iter_encrypt, iter(["meow"]))
+
+    def test_stream_encryption_ctr(self):
+        """This will actually execute streaming encrypting/decrypting data for
+        CTR mode, where the final block may be short.
+        """
+        cipher = aes_cipher.AESCipher(mode='CTR')
+        cipher.key = cipher.generate_key()
+        random_device = random.Random.new()
+        for chunk_size in (1, 7, 100, 4096):
+            util.test_cipher_stream_encryption(
+                self,
+                cipher,
+                random_device.read(2000),
+                chunk_size
+            )
+
+    def test_stream_encryption_mmap(self):
+        """Memory mapped input is encrypted from buffers over the mapping and
+        written out through a memory mapped file.
+        """
+        cipher = aes_cipher.AESCipher(mode='CBC')
+        cipher.key = cipher.generate_key()
+        cipher.iv = cipher.generate_iv()
+        plaintext = random.Random.new().read(5000)
+
+        with tempfile.TemporaryFile() as src, tempfile.TemporaryFile() as dst:
+            src.write(plaintext)
+            src.flush()
+            mapped = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+            writer = classes_util.MappedWriter(dst, 100)
+            cipher.encrypt_stream(mapped, writer, 1000)
+            writer.close()
+            mapped.close()
+
+            dst.seek(0)
+            self.assertEqual(cipher.decrypt(dst.read()), plaintext)
+
+    def test_stream_encryption_wrap(self):
+        """Streamed output wrapped into lines still decrypts."""
+        cipher = aes_cipher.AESCipher(mode='CBC')
+        cipher.key = cipher.generate_key()
+        cipher.iv = cipher.generate_iv()
+        cipher.set_encoding(binary_encoders.Base64Encoder, wrap=64)
+        random_device = random.Random.new()
+        for chunk_size in (1, 100, 4096):
+            util.test_cipher_stream_encryption(
+                self,
+                cipher,
+                random_device.read(2000),
+                chunk_size
+            )
+
+    def test_batch_encryption(self):
+        for mode in ('CBC', 'CFB', 'CTR', 'ECB', 'OFB'):
+            self._test_batch_encryption(aes_cipher.AESCipher(), mode)
+
+    def test_padding_schemes(self):
+        self._test_padding_schemes(aes_cipher.AESCipher())
+
+    def test_padding(self):
+        cipher = aes_cipher.AESCipher(key="wruff wruff meow", padding='PKCS7')
+        cipher.set_encoding(base_encoders.NullEncoder)
+        self.assertEqual(
+            cipher.encrypt("meow"),
+            AES.new("wruff wruff meow").encrypt("meow" + "\x0c" * 12)
+        )
+        self.assertRaises(
+            AttributeError,
+            aes_cipher.AESCipher,
+            padding='MEOW'
+        )
+
+        cipher.padding = 'NONE'
+        self.assertEqual(cipher.decrypt(cipher.encrypt("m" * 32)), "m" * 32)
+        self.assertRaises(ValueError, cipher.encrypt, "meow")
+
+        # The legacy scheme still pads stream modes.
+        cipher.mode = 'CTR'
+        cipher.padding = 'RANDOM'
+        self.assertTrue(cipher.stream_requires_size)
+        self.assertEqual(len(cipher.encrypt("meow")), 16)
+
+    def test_decrypt_many_invalid_length(self):
+        cipher = aes_cipher.AESCipher(key="wruff wruff meow")
+        self.assertRaises(
+            ValueError,
+            cipher.decrypt_many,
+            [cipher.encrypt("meow"), "wruff"]
+        )
+
+    def test_parallel_encryption_cbc(self):
+        self._test_parallel_encryption(aes_cipher.AESCipher(), 'CBC')
+
+    def test_parallel_encryption_ctr(self):
+        self._test_parallel_encryption(aes_cipher.AESCipher(), 'CTR')
+
+    def test_parallel_encryption_ecb(self):
+        self._test_parallel_encryption(aes_cipher.AESCipher(), 'ECB')
+
     def test_encryption_cbc(self):
         """This will actually execute encrypting/decrypting data for CBC
         mode.
@@ -300,6 +493,15 @@ class AESCipherTest(unittest.TestCase, BlockCipherMixin):
             cipher.set_encoding(encoder)
             util.test_cipher_encryption(self, cipher, random_device.read(2000))
 
+            # Test streaming across chunk sizes that split blocks.
+            for chunk_size in (1, 7, 100, 4096):
+                util.test_cipher_stream_encryption(
+                    self,
+                    cipher,
+                    random_device.read(2000),
+                    chunk_size
+                )
+
 
 class BlowfishCipherTest(unittest.TestCase, BlockCipherMixin):
     def test_init(self):
@@ -394,6 +596,22 @@ class BlowfishCipherTest(unittest.TestCase, BlockCipherMixin):
         )
         unpad_mock.assert_called_with(blowfish_cipher_mock.decrypt.return_value)
 
+    def test_batch_encryption(self):
+        for mode in ('CBC', 'CFB', 'CTR', 'ECB', 'OFB'):
+            self._test_batch_encryption(blowfish_cipher.BlowfishCipher(), mode)
+
+    def test_padding_schemes(self):
+        self._test_padding_schemes(blowfish_cipher.BlowfishCipher())
+
+    def test_parallel_encryption_cbc(self):
+        self._test_parallel_encryption(blowfish_cipher.BlowfishCipher(), 'CBC')
+
+    def test_parallel_encryption_ctr(self):
+        self._test_parallel_encryption(blowfish_cipher.BlowfishCipher(), 'CTR')
+
+    def test_parallel_encryption_ecb(self):
+        self._test_parallel_encryption(blowfish_cipher.BlowfishCipher(), 'ECB')
+
     def test_encryption_cbc(self):
         """This will actually execute encrypting/decrypting data for CBC
         mode."""
@@ -437,6 +655,15 @@ class BlowfishCipherTest(unittest.TestCase, BlockCipherMixin):
             cipher.set_encoding(encoder)
             util.test_cipher_encryption(self, cipher, random_device.read(2000))
 
+            # Test streaming across chunk sizes that split blocks.
+            for chunk_size in (1, 7, 100, 4096):
+                util.test_cipher_stream_encryption(
+                    self,
+                    cipher,
+                    random_device.read(2000),
+                    chunk_size
+                )
+
 
 class CASTCipherTest(unittest.TestCase, BlockCipherMixin):
     def test_init(self):
@@ -529,6 +756,22 @@ class CASTCipherTest(unittest.TestCase, BlockCipherMixin):
         cast_cipher_mock.decrypt.assert_called_with(decode_mock.return_value)
         unpad_mock.assert_called_with(cast_cipher_mock.decrypt.return_value)
 
+    def test_batch_encryption(self):
+        for mode in ('CBC', 'CFB', 'CTR', 'ECB', 'OFB'):
+            self._test_batch_encryption(cast_cipher.CASTCipher(), mode)
+
+    def test_padding_schemes(self):
+        self._test_padding_schemes(cast_cipher.CASTCipher())
+
+    def test_parallel_encryption_cbc(self):
+        self._test_parallel_encryption(cast_cipher.CASTCipher(), 'CBC')
+
+    def test_parallel_encryption_ctr(self):
+        self._test_parallel_encryption(cast_cipher.CASTCipher(), 'CTR')
+
+    def test_parallel_encryption_ecb(self):
+        self._test_parallel_encryption(cast_cipher.CASTCipher(), 'ECB')
+
     def test_encryption_cbc(self):
         """This will actually execute encrypting/decrypting data for CBC
         mode."""
@@ -572,6 +815,15 @@ class CASTCipherTest(unittest.TestCase, BlockCipherMixin):
             cipher.set_encoding(encoder)
             util.test_cipher_encryption(self, cipher, random_device.read(2000))
 
+            # Test streaming across chunk sizes that split blocks.
+            for chunk_size in (1, 7, 100, 4096):
+                util.test_cipher_stream_encryption(
+                    self,
+                    cipher,
+                    random_device.read(2000),
+                    chunk_size
+                )
+
 
 class XORCipherTest(unittest.TestCase, CryptoCipherMixin):
     def test_init(self):
@@ -581,34 +833,35 @@ class XORCipherTest(unittest.TestCase, CryptoCipherMixin):
     def test_key_property(self):
         cipher = xor_cipher.XORCipher(key="fishsticks")
         self._test_init_key(cipher, "fishsticks")
-        self._test_key_setter(cipher, "puppychow", invalid_key="puppy" * 12)
+        self._test_key_setter(cipher, "puppychow", invalid_key="")
+        self._test_key_setter(cipher, "puppy" * 12)
 
     def test_set_encoding(self):
         cipher = xor_cipher.XORCipher()
         self._test_set_encoding(cipher)
 
     @mock.patch('crypto.classes.ciphers.xor.XORCipher._encode')
-    @mock.patch('Crypto.Cipher.XOR.new')
-    def test_encrypt(self, xor_new_mock, encode_mock):
-        xor_cipher_mock = xor_new_mock.return_value
+    @mock.patch('crypto.classes.ciphers.xor.XORStream')
+    def test_encrypt(self, xor_stream_mock, encode_mock):
+        xor_instance_mock = xor_stream_mock.return_value
         cipher = xor_cipher.XORCipher("fishsticks")
         self.assertEqual(cipher.encrypt("meow"), encode_mock.return_value)
-        xor_new_mock.assert_called_with("fishsticks")
-        xor_cipher_mock.encrypt.assert_called_with("meow")
-        encode_mock.assert_called_with(xor_cipher_mock.encrypt.return_value)
+        xor_stream_mock.assert_called_with("fishsticks")
+        xor_instance_mock.update.assert_called_with("meow")
+        encode_mock.assert_called_with(xor_instance_mock.update.return_value)
 
     @mock.patch('crypto.classes.ciphers.xor.XORCipher._decode')
-    @mock.patch('Crypto.Cipher.XOR.new')
-    def test_decrypt(self, xor_new_mock, decode_mock):
-        xor_cipher_mock = xor_new_mock.return_value
+    @mock.patch('crypto.classes.ciphers.xor.XORStream')
+    def test_decrypt(self, xor_stream_mock, decode_mock):
+        xor_instance_mock = xor_stream_mock.return_value
         cipher = xor_cipher.XORCipher("puppychow")
         self.assertEqual(
             cipher.decrypt("wruff"),
-            xor_cipher_mock.decrypt.return_value
+            xor_instance_mock.update.return_value
         )
-        xor_new_mock.assert_called_with("puppychow")
+        xor_stream_mock.assert_called_with("puppychow")
         decode_mock.assert_called_with("wruff")
-        xor_cipher_mock.decrypt.assert_called_with(decode_mock.return_value)
+        xor_instance_mock.update.assert_called_with(decode_mock.return_value)
 
     def test_generate_key(self):
         # Test random byte array.
@@ -616,7 +869,8 @@ class XORCipherTest(unittest.TestCase, CryptoCipherMixin):
         self.assertEqual(len(cipher.generate_key()), 16)  # test default.
         self.assertEqual(len(cipher.generate_key(16)), 16)
         self.assertEqual(len(cipher.generate_key(32)), 32)
-        self.assertRaises(AttributeError, cipher.generate_key, 48)
+        self.assertEqual(len(cipher.generate_key(48)), 48)
+        self.assertRaises(AttributeError, cipher.generate_key, 0)
 
         # Test ASCII only.
         self.assertEqual(len(cipher.generate_key(ascii_only=True)), 16)
@@ -666,6 +920,24 @@ class XORCipherTest(unittest.TestCase, CryptoCipherMixin):
             random.Random.new().read(2000)
         )
 
+        # Test streaming across chunk sizes that split the key.
+        for chunk_size in (1, 7, 100, 4096):
+            util.test_cipher_stream_encryption(
+                self,
+                cipher,
+                random.Random.new().read(2000),
+                chunk_size
+            )
+
+        # Test batches.
+        plaintexts = ["meow" * size for size in xrange(50)]
+        ciphertexts = cipher.encrypt_many(plaintexts)
+        self.assertEqual(
+            ciphertexts,
+            [cipher.encrypt(plaintext) for plaintext in plaintexts]
+        )
+        self.assertEqual(cipher.decrypt_many(ciphertexts), plaintexts)
+
         # Test keys and instances.
         cipher1 = xor_cipher.XORCipher("fishsticks")
         cipher2 = xor_cipher.XORCipher("fishsticks")
@@ -675,5 +947,681 @@ class XORCipherTest(unittest.TestCase, CryptoCipherMixin):
         self.assertNotEqual(cipher2.encrypt("wruff"), cipher3.encrypt("wruff"))
 
 
+class XORStreamTest(unittest.TestCase):
+    def test_matches_pycrypto(self):
+        plaintext = random.Random.new().read(1000)
+        for key_size in XOR.key_size:
+            key = random.Random.new().read(key_size)
+            self.assertEqual(
+                xor_cipher.XORStream(key).update(plaintext),
+                XOR.new(key).encrypt(plaintext)
+            )
+
+    def test_update(self):
+        key = random.Random.new().read(1000)
+        plaintext = random.Random.new().read(5000)
+        ciphertext = xor_cipher.XORStream(key).update(plaintext)
+        self.assertEqual(
+            xor_cipher.XORStream(key).update(buffer(ciphertext)),
+            plaintext
+        )
+
+        # The key offset carries across chunks of any size.
+        for chunk_size in (1, 7, 999, 1001, 3000):
+            xor_stream = xor_cipher.XORStream(key)
+            self.assertEqual(
+                "".join(
+                    xor_stream.update(plaintext[i:i + chunk_size])
+                    for i in xrange(0, len(plaintext), chunk_size)
+                ),
+                ciphertext
+            )
+            self.assertEqual(xor_stream.offset, 0)
+
+        xor_stream = xor_cipher.XORStream(key, offset=1003)
+        self.assertEqual(xor_stream.offset, 3)
+        self.assertEqual(
+            xor_stream.update(plaintext[3:1000]),
+            ciphertext[3:1000]
+        )
+        self.assertEqual(xor_stream.update(""), "")
+        self.assertRaises(AttributeError, xor_cipher.XORStream, "")
+
+
+class PaddingTest(unittest.TestCase):
+    def test_pad(self):
+        self.assertEqual(
+            padding.PADDINGS['PKCS7'].pad("meow", 8),
+            "meow\x04\x04\x04\x04"
+        )
+        self.assertEqual(padding.PADDINGS['PKCS7'].pad("", 4), "\x04" * 4)
+        self.assertEqual(
+            padding.PADDINGS['ANSIX923'].pad("meow", 8),
+            "meow\x00\x00\x00\x04"
+        )
+        self.assertEqual(
+            padding.PADDINGS['ISO7816'].pad("meow", 8),
+            "meow\x80\x00\x00\x00"
+        )
+        self.assertEqual(padding.PADDINGS['ISO7816'].pad("mew", 4), "mew\x80")
+        self.assertEqual(padding.PADDINGS['NONE'].pad("meow", 8), "meow")
+
+    def test_unpad(self):
+        for name in ('ANSIX923', 'ISO7816', 'NONE', 'PKCS7'):
+            scheme = padding.PADDINGS[name]
+            for block_size in (8, 16):
+                for size in xrange(block_size * 2 + 1):
+                    if name == 'NONE' and size % block_size:
+                        continue
+                    text = "\x80" * size
+                    self.assertEqual(
+                        scheme.unpad(scheme.pad(text, block_size), block_size),
+                        text
+                    )
+
+    def test_unpad_invalid(self):
+        invalid = {
+            'ANSIX923': ("meow\x00\x01\x00\x04", "meowmeow", "meow\0\0\0\0"),
+            'ISO7816': ("meow\x80\x00\x01\x00", "meowmeow", "\0" * 8),
+            'PKCS7': ("meow\x04\x03\x04\x04", "meow\0\0\0\0", "meow\t" * 2)
+        }
+        for name, texts in invalid.items():
+            scheme = padding.PADDINGS[name]
+            for text in texts + ("", "meow"):
+                self.assertRaises(ValueError, scheme.unpad, text, 8)
+
+    def test_unpad_last_block(self):
+        scheme = padding.PADDINGS['PKCS7']
+        self.assertEqual(scheme.unpad("\x08" * 16, 8), "\x08" * 8)
+        self.assertEqual(scheme.unpad(buffer("x" * 15 + "\x01"), 8), "x" * 15)
+
+
+class CipherCacheTest(unittest.TestCase):
+    def test_get(self):
+        cache = cipher_cache.CipherCache(max_size=2)
+        factory = mock.Mock(side_effect=lambda: object())
+        first = cache.get(AES, "meow", 1, factory)
+        self.assertIs(cache.get(AES, "meow", 1, factory), first)
+        self.assertIsNot(cache.get(AES, "meow", 2, factory), first)
+        self.assertIsNot(cache.get(Blowfish, "meow", 1, factory), first)
+        self.assertEqual(factory.call_count, 3)
+        self.assertEqual(
+            cache.stats(),
+            {'evictions': 1, 'hits': 1, 'max_size': 2, 'misses': 3, 'size': 2}
+        )
+
+    def test_lru_eviction(self):
+        cache = cipher_cache.CipherCache(max_size=2)
+        factory = lambda: object()
+        first = cache.get(AES, "meow", 1, factory)
+        cache.get(AES, "wruff", 1, factory)
+        cache.get(AES, "meow", 1, factory)
+        cache.get(AES, "purr", 1, factory)  # Evicts "wruff".
+        self.assertIs(cache.get(AES, "meow", 1, factory), first)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.misses, 3)
+
+    def test_max_size(self):
+        cache = cipher_cache.CipherCache(max_size=0)
+        cache.get(AES, "meow", 1, object)
+        self.assertEqual(len(cache), 0)
+
+        cache.max_size = 3
+        for key in ("meow", "wruff", "purr"):
+            cache.get(AES, key, 1, object)
+        cache.max_size = 1
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 2)
+        with self.assertRaises(AttributeError):
+            cache.max_size = -1
+
+        cache.clear()
+        self.assertEqual(
+            cache.stats(),
+            {'evictions': 0, 'hits': 0, 'max_size': 1, 'misses': 0, 'size': 0}
+        )
+
+    def test_block_cipher(self):
+        cipher = blowfish_cipher.BlowfishCipher(key="wruff wruff meow")
+        cipher.cipher_cache = cipher_cache.CipherCache()
+        ciphertext = cipher.encrypt("meow")
+        self.assertEqual(cipher.decrypt(ciphertext), "meow")
+        self.assertIs(cipher._get_cipher(), cipher._get_cipher())
+        self.assertEqual(cipher.cipher_cache.misses, 1)
+
+        # Chaining modes are never cached.
+        cipher.mode = 'CBC'
+        cipher.iv = cipher.generate_iv()
+        cipher.decrypt(cipher.encrypt("meow"))
+        self.assertEqual(len(cipher.cipher_cache), 1)
+
+        uncached = blowfish_cipher.BlowfishCipher(key="wruff wruff meow")
+        uncached.cipher_cache = None
+        self.assertIsNot(uncached._get_cipher(), uncached._get_cipher())
+        self.assertEqual(uncached.decrypt(ciphertext), "meow")
+
+
+class RandomPoolTest(unittest.TestCase):
+    def _get_pool(self, *args, **kwargs):
+        """Return a pool reading from a device that counts upwards."""
+        pool = entropy.RandomPool(*args, **kwargs)
+        data = iter(string.ascii_letters * 100)
+        pool._device = mock.Mock()
+        pool._device.read.side_effect = (
+            lambda size: "".join(next(data) for i in xrange(size))
+        )
+        return pool
+
+    def test_read(self):
+        pool = self._get_pool(pool_size=8, refill_threshold=2)
+        self.assertEqual(pool.read(3), "abc")
+        pool._device.read.assert_called_once_with(8)
+        self.assertEqual(pool.read(3), "def")
+        self.assertEqual(pool._device.read.call_count, 1)
+
+        # Dropping below the threshold tops the buffer up.
+        self.assertEqual(pool.read(1), "g")
+        pool._device.read.assert_called_with(7)
+        self.assertEqual(pool.read(8), "hijklmno")
+
+        # Reads larger than the pool bypass it.
+        self.assertEqual(len(pool.read(9)), 9)
+        pool._device.read.assert_called_with(9)
+        self.assertEqual(pool.read(0), "")
+
+    def test_refill_threshold(self):
+        self.assertRaises(
+            AttributeError,
+            entropy.RandomPool,
+            pool_size=8,
+            refill_threshold=9
+        )
+
+    @mock.patch('Crypto.Random.atfork')
+    def test_atfork(self, atfork_mock):
+        pool = self._get_pool(pool_size=8, refill_threshold=0)
+        pool.read(1)
+        self.assertEqual(atfork_mock.call_count, 0)
+
+        # Pretend the pool was filled by a parent process.
+        pool._pid = -1
+        buffered = pool._buffer[pool._position:]
+        self.assertNotEqual(pool.read(7), buffered)
+        atfork_mock.assert_called_once_with()
+        self.assertEqual(pool._pid, os.getpid())
+
+    def test_choice(self):
+        pool = self._get_pool()
+        self.assertEqual(pool.choice("xyz"), "y")  # "a" is 97.
+        self.assertEqual(pool.choice("xyz"), "z")
+
+        pool = entropy.RandomPool()
+        self.assertEqual(
+            set(pool.choice("meow") for i in xrange(200)),
+            set("meow")
+        )
+
+
+class ProfilerTest(unittest.TestCase):
+    def _get_cipher(self):
+        cipher = aes_cipher.AESCipher(mode='CBC', padding='PKCS7')
+        cipher.key = cipher.generate_key()
+        cipher.iv = cipher.generate_iv()
+        cipher.set_encoding(binary_encoders.Base64Encoder)
+        return cipher
+
+    def test_nested_stages(self):
+        profiler = profiling.Profiler()
+        timer = iter(xrange(0, 100, 1))
+        with mock.patch.object(profiling, 'default_timer', timer.next):
+            profiler.call(
+                'outer',
+                lambda: [profiler.call('inner', len, "meow") for i in (1, 2)]
+            )
+            list(profiler.iter_stage('outer', ["ab", "c"]))
+
+        stats = profiler.stats()
+        self.assertEqual(
+            stats['inner'],
+            {'bytes': 8, 'calls': 2, 'seconds': 2}
+        )
+        # 5 ticks less the 2 spent inside, then 1 per item and 1 to finish.
+        self.assertEqual(
+            stats['outer'],
+            {'bytes': 3, 'calls': 3, 'seconds': 6}
+        )
+
+    def test_profiler(self):
+        cipher = self._get_cipher()
+        class_methods = dict(cipher.__dict__)
+        profiler = profiling.Profiler()
+        cipher.profiler = profiler
+        self.assertEqual(cipher.decrypt(cipher.encrypt("meow")), "meow")
+
+        stats = profiler.stats()
+        for stage in ('key_setup', 'pad', 'cipher', 'encode', 'decode'):
+            self.assertIn(stage, stats)
+        self.assertEqual(stats['key_setup']['calls'], 2)
+        self.assertEqual(stats['pad']['bytes'], 16)
+        self.assertEqual(stats['unpad']['bytes'], 4)
+
+        # Removing the profiler restores the class methods.
+        cipher.profiler = None
+        self.assertEqual(cipher.__dict__, dict(class_methods, _profiler=None))
+        cipher.encrypt("meow")
+        self.assertEqual(profiler.stats(), stats)
+
+    def test_profiler_stream(self):
+        for cipher in (self._get_cipher(), xor_cipher.XORCipher("key")):
+            profiler = profiling.Profiler()
+            cipher.profiler = profiler
+            ciphertext = StringIO.StringIO()
+            cipher.encrypt_stream(
+                StringIO.StringIO("meow" * 100),
+                ciphertext,
+                7
+            )
+            self.assertEqual(
+                cipher.decrypt(ciphertext.getvalue()),
+                "meow" * 100
+            )
+
+            stats = profiler.stats()
+            self.assertEqual(stats['read']['bytes'], 400)
+            self.assertEqual(stats['read']['calls'], 58)
+            self.assertEqual(
+                stats['encrypt_stream']['bytes'],
+                stats['write']['bytes']
+            )
+            self.assertIn('cipher', stats)
+            self.assertTrue(profiler.format_report().startswith("STAGE"))
+
+    def test_get_profiler(self):
+        profiler = profiling.get_profiler("test")
+        self.assertTrue(profiling.get_profiler("test") is profiler)
+        profiler.record('cipher', 0.5, 16)
+        self.assertEqual(
+            profiling.collect()["test"],
+            {'cipher': {'bytes': 16, 'calls': 1, 'seconds': 0.5}}
+        )
+
+
+class AsyncCipherTest(unittest.TestCase):
+    def setUp(self):
+        self.cipher = aes_cipher.AESCipher(mode='CBC', padding='PKCS7')
+        self.cipher.key = self.cipher.generate_key()
+        self.cipher.iv = self.cipher.generate_iv()
+        self.cipher.set_encoding(binary_encoders.Base64Encoder)
+        self.facade = async_cipher.AsyncCipher(self.cipher, threshold=16)
+
+    def tearDown(self):
+        self.facade.close()
+
+    def test_threshold(self):
+        """Small payloads run in the calling thread, large ones do not."""
+        threads = []
+
+        def record(result):
+            threads.append(threading.current_thread())
+
+        for plaintext in ("meow", "meow" * 5):
+            result = self.facade.encrypt(plaintext, callback=record)
+            ciphertext = result.get()
+            self.assertTrue(result.ready())
+            self.assertTrue(result.successful())
+            self.assertEqual(self.cipher.decrypt(ciphertext), plaintext)
+            self.assertEqual(self.facade.decrypt(ciphertext).get(), plaintext)
+
+        self.assertTrue(threads[0] is threading.current_thread())
+        self.assertFalse(threads[1] is threading.current_thread())
+
+    def test_errors(self):
+        for ciphertext in ("meow", "meow" * 5):
+            result = self.facade.decrypt(ciphertext)
+            result.wait()
+            self.assertFalse(result.successful())
+            self.assertRaises(Exception, result.get)
+        self.assertRaises(
+            AttributeError,
+            async_cipher.AsyncCipher,
+            self.cipher,
+            threshold=-1
+        )
+
+    def test_many(self):
+        plaintexts = ["meow", "purr" * 10]
+        ciphertexts = self.facade.encrypt_many(plaintexts).get()
+        self.assertEqual(self.cipher.decrypt_many(ciphertexts), plaintexts)
+        self.assertEqual(
+            self.facade.decrypt_many(iter(ciphertexts)).get(),
+            plaintexts
+        )
+
+    def test_stream(self):
+        plaintext = "meow" * 1000
+        ciphertext = StringIO.StringIO()
+        written = self.facade.encrypt_stream(
+            StringIO.StringIO(plaintext),
+            ciphertext,
+            chunk_size=100
+        ).get()
+        self.assertEqual(written, len(ciphertext.getvalue()))
+
+        output = StringIO.StringIO()
+        ciphertext.seek(0)
+        self.facade.decrypt_stream(ciphertext, output).get()
+        self.assertEqual(output.getvalue(), plaintext)
+
+    def test_executor(self):
+        """A given executor is used and left running by close."""
+        executor = mock.Mock()
+        with async_cipher.AsyncCipher(self.cipher, 0, executor) as cipher:
+            self.assertTrue(cipher.executor is executor)
+            cipher.encrypt("meow")
+        executor.apply_async.assert_called_once_with(
+            self.cipher.encrypt,
+            ("meow",),
+            callback=None
+        )
+        self.assertFalse(executor.close.called)
+
+
+class DecryptRangeTest(unittest.TestCase):
+    def _get_cipher(self, mode, padding):
+        cipher = aes_cipher.AESCipher(mode=mode, padding=padding)
+        cipher.key = cipher.generate_key()
+        cipher.iv = cipher.generate_iv()
+        cipher.set_encoding(base_encoders.NullEncoder)
+        return cipher
+
+    def test_decrypt_range(self):
+        for mode in ('CBC', 'CTR', 'ECB'):
+            for padding in ('ANSIX923', 'PKCS7', 'RANDOM'):
+                cipher = self._get_cipher(mode, padding)
+                for plaintext in ("", "meow", os.urandom(100)):
+                    ciphertext = cipher.encrypt(plaintext)
+                    for offset, length, expected in (
+                        (0, None, plaintext),
+                        (1, 3, plaintext[1:4]),
+                        (17, 50, plaintext[17:67]),
+                        (95, 10, plaintext[95:105]),
+                        (200, None, ""),
+                        (-10, None, plaintext[-10:]),
+                        (-10, 2, plaintext[-10:][:2])
+                    ):
+                        self.assertEqual(
+                            cipher.decrypt_range(ciphertext, offset, length),
+                            expected
+                        )
+
+    def test_stream(self):
+        """Only the blocks in range are read."""
+        cipher = self._get_cipher('CTR', 'NONE')
+        plaintext = os.urandom(10000)
+        src = StringIO.StringIO(cipher.encrypt(plaintext))
+        with mock.patch.object(src, 'read', wraps=src.read) as read:
+            chunks = list(cipher.iter_decrypt_range(src, 9000, 500, 160))
+        self.assertEqual("".join(chunks), plaintext[9000:9500])
+        self.assertEqual([len(chunk) for chunk in chunks], [152, 160, 160, 28])
+        self.assertEqual(sum(call[0][0] for call in read.call_args_list), 512)
+
+    def test_errors(self):
+        cipher = self._get_cipher('OFB', 'PKCS7')
+        self.assertRaises(AttributeError, cipher.decrypt_range, "meow", 0)
+        cipher = self._get_cipher('CTR', 'PKCS7')
+        cipher.set_encoding(binary_encoders.Base64Encoder)
+        self.assertRaises(AttributeError, cipher.decrypt_range, "meow", 0)
+        cipher = self._get_cipher('CBC', 'PKCS7')
+        self.assertRaises(ValueError, cipher.decrypt_range, "meow", 0)
+
+
+class ContainerTest(unittest.TestCase):
+    def _write(self, cipher, plaintext, chunk_size=64):
+        ciphertext = StringIO.StringIO()
+        container.encrypt_container(
+            cipher,
+            StringIO.StringIO(plaintext),
+            ciphertext,
+            chunk_size
+        )
+        return ciphertext.getvalue()
+
+    def test_round_trip(self):
+        plaintext = os.urandom(1000)
+        for cipher_class, mode, padding in (
+            (aes_cipher.AESCipher, 'CBC', 'PKCS7'),
+            (aes_cipher.AESCipher, 'CTR', 'NONE'),
+            (aes_cipher.AESCipher, 'ECB', 'RANDOM'),
+            (blowfish_cipher.BlowfishCipher, 'CFB', 'ISO7816'),
+            (cast_cipher.CASTCipher, 'OFB', 'ANSIX923')
+        ):
+            cipher = cipher_class(mode=mode, padding=padding)
+            cipher.key = cipher.generate_key()
+            for size in (0, 1, 64, 1000):
+                ciphertext = self._write(cipher, plaintext[:size])
+                reader = container.ContainerReader(
+                    StringIO.StringIO(ciphertext),
+                    cipher_class(key=cipher.key)
+                )
+                self.assertEqual(reader.header['mode'], mode)
+                self.assertEqual(reader.header['padding'], padding)
+                self.assertEqual(len(reader), size)
+                self.assertEqual(reader.read(), plaintext[:size])
+
+    def test_random_access(self):
+        cipher = aes_cipher.AESCipher(mode='CTR')
+        cipher.key = cipher.generate_key()
+        plaintext = os.urandom(1000)
+        reader = container.ContainerReader(
+            StringIO.StringIO(self._write(cipher, plaintext)),
+            aes_cipher.AESCipher(key=cipher.key)
+        )
+        with mock.patch.object(
+            reader,
+            'read_chunk',
+            wraps=reader.read_chunk
+        ) as read_chunk:
+            reader.seek(-10, os.SEEK_END)
+            self.assertEqual(reader.read(), plaintext[-10:])
+            read_chunk.assert_called_once_with(15)
+
+        for offset, size in ((0, 1), (63, 2), (100, 500), (990, 100)):
+            reader.seek(offset)
+            self.assertEqual(
+                reader.read(size),
+                plaintext[offset:offset + size]
+            )
+            self.assertEqual(reader.tell(), min(offset + size, 1000))
+        self.assertEqual(
+            "".join(reader.iter_range(10, 200)),
+            plaintext[10:210]
+        )
+
+    def test_negative_offset(self):
+        cipher = aes_cipher.AESCipher(mode='CBC', padding='PKCS7')
+        cipher.key = cipher.generate_key()
+        plaintext = os.urandom(1000)
+        ciphertext = self._write(cipher, plaintext)
+        for offset, length, expected in (
+            (-100, None, plaintext[-100:]),
+            (-100, 10, plaintext[-100:-90]),
+            (-5000, 3, plaintext[:3])
+        ):
+            dst = StringIO.StringIO()
+            container.decrypt_container(
+                aes_cipher.AESCipher(key=cipher.key),
+                StringIO.StringIO(ciphertext),
+                dst,
+                offset,
+                length
+            )
+            self.assertEqual(dst.getvalue(), expected)
+
+    def test_nonces(self):
+        """CTR containers under one key must not share a keystream."""
+        cipher = aes_cipher.AESCipher(mode='CTR')
+        cipher.key = cipher.generate_key()
+        self.assertNotEqual(
+            self._write(cipher, "meow" * 16)[-100:],
+            self._write(cipher, "meow" * 16)[-100:]
+        )
+
+    def test_errors(self):
+        cipher = aes_cipher.AESCipher(mode='CBC', padding='PKCS7')
+        cipher.key = cipher.generate_key()
+        ciphertext = self._write(cipher, "meow" * 100)
+        for data in ("meow", ciphertext[:-1]):
+            self.assertRaises(
+                ValueError,
+                container.ContainerReader,
+                StringIO.StringIO(data),
+                aes_cipher.AESCipher(key=cipher.key)
+            )
+        self.assertRaises(
+            AttributeError,
+            container.ContainerReader,
+            StringIO.StringIO(ciphertext),
+            blowfish_cipher.BlowfishCipher(key=cipher.key)
+        )
+        self.assertRaises(
+            AttributeError,
+            container.ContainerWriter,
+            StringIO.StringIO(),
+            cipher,
+            chunk_size=100
+        )
+        self.assertRaises(
+            AttributeError,
+            container.ContainerWriter,
+            StringIO.StringIO(),
+            xor_cipher.XORCipher(key="meow")
+        )
+
+
+
+class AuthenticatedCipherTest(unittest.TestCase):
+    def _get_cipher(self, mode):
+        cipher = aes_cipher.AESCipher(mode=mode, padding='PKCS7')
+        cipher.key = cipher.generate_key()
+        cipher.iv = cipher.generate_iv()
+        cipher.mac_key = "mac key"
+        cipher.set_encoding(base_encoders.NullEncoder)
+        return cipher
+
+    def _assert_rejected(self, cipher, ciphertext):
+        self.assertRaises(ValueError, cipher.decrypt, ciphertext)
+        self.assertRaises(
+            ValueError,
+            list,
+            cipher.iter_decrypt([ciphertext[:-5], ciphertext[-5:]])
+        )
+
+    def test_round_trip(self):
+        for mode in ('CBC', 'CFB', 'CTR', 'ECB', 'OFB'):
+            cipher = self._get_cipher(mode)
+            for plaintext in ("", "meow", os.urandom(1000)):
+                ciphertext = cipher.encrypt(plaintext)
+                self.assertEqual(cipher.decrypt(ciphertext), plaintext)
+                chunks = [
+                    ciphertext[i:i + 7] for i in xrange(0, len(ciphertext), 7)
+                ]
+                self.assertEqual(
+                    "".join(cipher.iter_decrypt(chunks, workers=2)),
+                    plaintext
+                )
+                cipher.mac_key = None
+                self.assertEqual(
+                    cipher.encrypt(plaintext),
+                    ciphertext[:-32]
+                )
+                cipher.mac_key = "mac key"
+
+    def test_tag(self):
+        cipher = self._get_cipher('CBC')
+        ciphertext = cipher.encrypt("meow")
+        tag = hmac.new(
+            "mac key",
+            "2:PKCS7Padding:0:" + cipher.iv + ciphertext[:-32],
+            hashlib.sha256
+        ).digest()
+        self.assertEqual(ciphertext[-32:], tag)
+
+    def test_rejects_settings(self):
+        """Decrypting with other settings fails the MAC check."""
+        cipher = self._get_cipher('CTR')
+        ciphertext = cipher.encrypt("meow")
+        cipher.initial_value = 2
+        self._assert_rejected(cipher, ciphertext)
+
+        cipher = self._get_cipher('CBC')
+        ciphertext = cipher.encrypt("meow")
+        cipher.padding = 'ANSIX923'
+        self._assert_rejected(cipher, ciphertext)
+        cipher.padding = 'PKCS7'
+        cipher.mode = 'ECB'
+        self._assert_rejected(cipher, ciphertext)
+
+    def test_rejects_changes(self):
+        cipher = self._get_cipher('CTR')
+        ciphertext = cipher.encrypt(os.urandom(100))
+        for position in (0, 50, len(ciphertext) - 1):
+            flipped = chr(ord(ciphertext[position]) ^ 1)
+            self._assert_rejected(
+                cipher,
+                ciphertext[:position] + flipped + ciphertext[position + 1:]
+            )
+        self._assert_rejected(cipher, ciphertext[:-1])
+        self._assert_rejected(cipher, ciphertext[:10])
+
+        cipher = self._get_cipher('CBC')
+        ciphertext = cipher.encrypt("meow")
+        cipher.iv = cipher.generate_iv()
+        self._assert_rejected(cipher, ciphertext)
+
+    def test_stream(self):
+        cipher = self._get_cipher('CTR')
+        plaintext = os.urandom(10000)
+        ciphertext = StringIO.StringIO()
+        cipher.encrypt_stream(StringIO.StringIO(plaintext), ciphertext, 1000)
+        decrypted = StringIO.StringIO()
+        cipher.decrypt_stream(
+            StringIO.StringIO(ciphertext.getvalue()),
+            decrypted,
+            1000
+        )
+        self.assertEqual(decrypted.getvalue(), plaintext)
+
+    def test_encoded(self):
+        cipher = self._get_cipher('CBC')
+        cipher.set_encoding(binary_encoders.Base64Encoder)
+        ciphertexts = cipher.encrypt_many(["meow", "hiss"])
+        self.assertEqual(cipher.decrypt_many(ciphertexts), ["meow", "hiss"])
+
+    def test_xor(self):
+        cipher = xor_cipher.XORCipher("key")
+        cipher.mac_key = "mac key"
+        ciphertext = cipher.encrypt("meow")
+        self.assertEqual(len(ciphertext), 4 + 32)
+        self.assertEqual(cipher.decrypt(ciphertext), "meow")
+        self._assert_rejected(cipher, "x" + ciphertext[1:])
+
+    def test_unsupported(self):
+        cipher = self._get_cipher('CTR')
+        ciphertext = cipher.encrypt("meow")
+        self.assertRaises(
+            AttributeError,
+            cipher.decrypt_range,
+            ciphertext,
+            0
+        )
+        self.assertRaises(
+            AttributeError,
+            container.ContainerWriter,
+            StringIO.StringIO(),
+            cipher
+        )
+        self.assertRaises(AttributeError, setattr, cipher, 'mac_key', "")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,562 @@
+import argparse
+import crypto
+import crypto.classes.batch as batch
+import crypto.classes.ciphers.aes as aes_cipher
+import crypto.classes.encoders.binary as binary_encoders
+import crypto.classes.registry as registry
+import crypto.classes.util as classes_util
+import crypto.interfaces.commandline.cipher as cipher_cli
+import crypto.interfaces.commandline.client as client_cli
+import crypto.interfaces.commandline.serve as serve_cli
+import json
+import os
+import shutil
+import socket
+import StringIO
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+import mock
+
+
+"""Tests for the commandline entry point, run as a separate process.
+"""
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(crypto.__file__)))
+SCRIPT_PATH = os.path.join(ROOT_PATH, 'pycrypto-cli')
+
+# Run the script at argv[2], then write the names of the modules it loaded
+# to argv[1].
+RUN_SCRIPT = """
+import json, runpy, sys
+modules_path = sys.argv[1]
+sys.argv = sys.argv[2:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    with open(modules_path, "w") as f:
+        json.dump([name for name in sys.modules if sys.modules[name]], f)
+"""
+
+
+def run_cli(args, data=""):
+    """Run pycrypto-cli with `args` and `data` on stdin. Returns its output
+    and the set of modules it imported.
+    """
+    with tempfile.NamedTemporaryFile() as modules_file:
+        process = subprocess.Popen(
+            [sys.executable, "-c", RUN_SCRIPT, modules_file.name, SCRIPT_PATH]
+            + args,
+            cwd=ROOT_PATH,
+            env=dict(os.environ, PYTHONPATH=ROOT_PATH),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+        output = process.communicate(data)[0]
+        return output, set(json.load(modules_file))
+
+
+class LazyRegistryTest(unittest.TestCase):
+    def test_import_object(self):
+        self.assertTrue(registry.import_object("os.path") is os.path)
+        self.assertTrue(registry.import_object("os.path:join") is os.path.join)
+        self.assertRaises(ImportError, registry.import_object, "meow")
+
+    def test_lazy_registry(self):
+        paths = {'JOIN': 'os.path:join', 'MEOW': 'meow:meow'}
+        lazy = registry.LazyRegistry(paths)
+        self.assertEqual(sorted(lazy.keys()), ['JOIN', 'MEOW'])
+        self.assertEqual(len(lazy), 2)
+        self.assertTrue(lazy['JOIN'] is os.path.join)
+        self.assertRaises(ImportError, lambda: lazy['MEOW'])
+        self.assertRaises(KeyError, lambda: lazy['PURR'])
+
+    def test_chaining_modes(self):
+        for name in cipher_cli.CIPHERS:
+            cipher_class = cipher_cli.CIPHERS[name]
+            if hasattr(cipher_class, 'supported_modes'):
+                self.assertEqual(
+                    sorted(cipher_class.supported_modes),
+                    sorted(cipher_cli.CHAINING_MODE_CHOICES)
+                )
+
+
+class ParseRangeTest(unittest.TestCase):
+    def test_parse_range(self):
+        self.assertEqual(cipher_cli.parse_range("10"), (10, None))
+        self.assertEqual(cipher_cli.parse_range("10:5"), (10, 5))
+        self.assertEqual(cipher_cli.parse_range("-10:5"), (-10, 5))
+        for text in ("", "meow", "1:meow", "1:-1"):
+            self.assertRaises(
+                argparse.ArgumentTypeError,
+                cipher_cli.parse_range,
+                text
+            )
+
+
+class StartupTest(unittest.TestCase):
+    def test_cipher_imports(self):
+        """Encrypting with XOR must not load other ciphers, subcommands or
+        modules only needed by other options.
+        """
+        with tempfile.NamedTemporaryFile() as key_file:
+            key_file.write("key")
+            key_file.flush()
+            output, modules = run_cli(
+                ["cipher", "XOR", "-k", key_file.name, "-i", "-", "-o", "-"],
+                "meow"
+            )
+
+        self.assertEqual(output, "BgAWHA==")
+        self.assertIn('crypto.classes.ciphers.xor', modules)
+        for name in (
+            'Crypto.PublicKey.RSA',
+            'Crypto.Random',
+            'crypto.classes.ciphers.aes',
+            'crypto.classes.ciphers.blowfish',
+            'crypto.classes.batch',
+            'crypto.classes.ciphers.cast',
+            'crypto.classes.container',
+            'crypto.interfaces.commandline.bench',
+            'multiprocessing',
+            'subprocess',
+            'tempfile'
+        ):
+            self.assertNotIn(name, modules)
+
+    def test_client_imports(self):
+        output, modules = run_cli(["client", "-h"])
+        self.assertIn("--socket", output)
+        self.assertNotIn('crypto.classes.ciphers.base', modules)
+
+    def test_hash_imports(self):
+        output, modules = run_cli(
+            ["hash", "md5", "-i", "-", "-o", "-"],
+            "meow"
+        )
+        self.assertEqual(
+            output,
+            "MD5 (-) = 4a4be40c96ac6314e91d93f38043a634\n"
+        )
+        self.assertNotIn('crypto.classes.ciphers.base', modules)
+        self.assertNotIn('Crypto.Hash.SHA256', modules)
+
+    def test_keys_imports(self):
+        output, modules = run_cli(["keys", "-h"])
+        self.assertIn("--output-dir", output)
+        self.assertNotIn('crypto.classes.keys.pool', modules)
+        self.assertNotIn('multiprocessing', modules)
+
+    def test_help(self):
+        output, modules = run_cli(["-h"])
+        for name in ("cipher", "bench", "hash"):
+            self.assertIn(name, output)
+        self.assertNotIn('crypto.interfaces.commandline.cipher', modules)
+
+
+class FrameTest(unittest.TestCase):
+    def test_frames(self):
+        f = StringIO.StringIO()
+        for data in ("meow", "purr", "", "hiss"):
+            classes_util.write_frame(f, data)
+        f.seek(0)
+        self.assertEqual(list(classes_util.iter_frames(f)), ["meow", "purr"])
+        self.assertEqual(classes_util.read_frame(f), "hiss")
+        self.assertEqual(classes_util.read_frame(f), None)
+
+    def test_bad_frames(self):
+        for data in ("\0\0", "\0\0\0\5meow", "\xff\xff\xff\xff"):
+            self.assertRaises(
+                IOError,
+                classes_util.read_frame,
+                StringIO.StringIO(data)
+            )
+        self.assertRaises(
+            IOError,
+            list,
+            classes_util.iter_frames(StringIO.StringIO("\0\0\0\1a"))
+        )
+
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, "test.sock")
+        self.key_path = self._write("key", "k" * 16)
+        self.iv_path = self._write("iv", "i" * 16)
+        self.server = serve_cli.CipherServer(self.socket_path)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _run_client(self, data, **kwargs):
+        """Run a client request with `data` on stdin, returning stdout."""
+        kwargs.setdefault('socket_path', self.socket_path)
+        kwargs.setdefault('key_path', self.key_path)
+        interface = client_cli.ClientInterface(
+            data_input_path="-",
+            data_output_path="-",
+            **kwargs
+        )
+        with mock.patch('sys.stdin', StringIO.StringIO(data)):
+            with mock.patch('sys.stdout', StringIO.StringIO()) as stdout:
+                interface.execute()
+                return stdout.getvalue()
+
+    def test_round_trip(self):
+        cipher = aes_cipher.AESCipher(
+            key="k" * 16,
+            iv="i" * 16,
+            mode='CBC',
+            padding='PKCS7'
+        )
+        cipher.set_encoding(binary_encoders.Base64Encoder)
+        plaintext = "meow" * 50000
+        for padding in ('PKCS7', None):
+            ciphertext = self._run_client(
+                plaintext,
+                cipher="AES",
+                iv_path=self.iv_path,
+                mode="CBC",
+                padding=padding
+            )
+            if padding:
+                self.assertEqual(ciphertext, cipher.encrypt(plaintext))
+            self.assertEqual(
+                self._run_client(
+                    ciphertext,
+                    cipher="AES",
+                    decrypt=True,
+                    iv_path=self.iv_path,
+                    mode="CBC",
+                    padding=padding
+                ),
+                plaintext
+            )
+
+    def test_unsized_input(self):
+        """Legacy padding needs the size, which a pipe does not give."""
+        with mock.patch.object(client_cli, 'get_stream_size', lambda f: None):
+            ciphertext = self._run_client("meow", cipher="AES", mode="CTR")
+        self.assertEqual(
+            self._run_client(
+                ciphertext,
+                cipher="AES",
+                decrypt=True,
+                mode="CTR"
+            ),
+            "meow"
+        )
+
+    def test_errors(self):
+        for kwargs in (
+            {'cipher': "MEOW"},
+            {'cipher': "AES", 'mode': "CBC"},  # No IV.
+            {'cipher': "AES", 'decrypt': True, 'encoder': "NULL"}
+        ):
+            self.assertRaises(SystemExit, self._run_client, "meow", **kwargs)
+        self.assertEqual(self._run_client("", cipher="XOR"), "")
+
+    def test_missing_size(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.socket_path)
+        try:
+            rfile = connection.makefile('rb')
+            wfile = connection.makefile('wb')
+            request = {'cipher': "XOR", 'key_path': self.key_path}
+            classes_util.write_frame(wfile, json.dumps(request))
+            classes_util.write_frame(wfile, "meow")
+            classes_util.write_frame(wfile, "")
+            wfile.flush()
+            self.assertTrue("".join(classes_util.iter_frames(rfile)))
+            status = json.loads(classes_util.read_frame(rfile))
+            self.assertEqual(status['error'], None)
+        finally:
+            connection.close()
+
+    def test_hang_up(self):
+        with mock.patch.object(client_cli, 'read_frame', lambda f: None):
+            self.assertRaises(
+                SystemExit,
+                self._run_client,
+                "meow",
+                cipher="XOR"
+            )
+
+    def test_get_cipher(self):
+        request = {'cipher': "XOR", 'key_path': self.key_path}
+        cipher = self.server.get_cipher(request)
+        self.assertTrue(self.server.get_cipher(request) is cipher)
+
+        # A changed key file sets up a new cipher.
+        self._write("key", "meow")
+        self.assertEqual(self.server.get_cipher(request).key, "meow")
+
+        self.server.max_ciphers = 1
+        self.server.get_cipher(dict(request, encoder="NULL"))
+        self.assertEqual(len(self.server._ciphers), 1)
+
+    def test_stale_socket(self):
+        self.assertRaises(IOError, serve_cli.CipherServer, self.socket_path)
+
+    def test_peer_uid(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(self.socket_path)
+        try:
+            self.assertEqual(
+                client_cli.get_peer_uid(connection, self.socket_path),
+                os.getuid()
+            )
+        finally:
+            connection.close()
+
+        with mock.patch.object(
+            client_cli,
+            'get_peer_uid',
+            lambda connection, path: os.getuid() + 1
+        ):
+            self.assertRaises(
+                IOError,
+                self._run_client,
+                "meow",
+                cipher="XOR"
+            )
+
+    def test_make_private_dir(self):
+        path = os.path.join(self.directory, "private")
+        client_cli.make_private_dir(path)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+        client_cli.make_private_dir(path)
+
+        os.chmod(path, 0o755)
+        self.assertRaises(IOError, client_cli.make_private_dir, path)
+        self.assertRaises(IOError, client_cli.make_private_dir, self.key_path)
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.directory, "input")
+        self.files = {
+            'meow': "meow" * 1000,
+            os.path.join('cats', 'purr'): "purr",
+            os.path.join('cats', 'empty'): ""
+        }
+        for path, data in self.files.items():
+            self._write(os.path.join(self.input_dir, path), data)
+        self.cipher = aes_cipher.AESCipher(mode='CBC', padding='PKCS7')
+        self.cipher.key = self.cipher.generate_key()
+        self.cipher.iv = self.cipher.generate_iv()
+        self.cipher.set_encoding(binary_encoders.Base64Encoder)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _write(self, path, data):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def test_iter_files(self):
+        self._write(os.path.join(self.input_dir, 'out', 'hiss'), "hiss")
+        paths = batch.iter_files(
+            self.input_dir,
+            exclude_dir=os.path.join(self.input_dir, 'out')
+        )
+        self.assertEqual(
+            list(paths),
+            [
+                'meow',
+                os.path.join('cats', 'empty'),
+                os.path.join('cats', 'purr')
+            ]
+        )
+
+    def test_crypt_directory(self):
+        for processes in (1, 2):
+            encrypted = os.path.join(self.directory, "encrypted%s" % processes)
+            decrypted = os.path.join(self.directory, "decrypted%s" % processes)
+            report = batch.crypt_directory(
+                self.cipher,
+                self.input_dir,
+                encrypted,
+                processes=processes
+            )
+            self.assertEqual(report['files'], 3)
+            self.assertEqual(report['bytes_read'], 4004)
+            self.assertEqual(report['failures'], [])
+
+            batch.crypt_directory(
+                self.cipher,
+                encrypted,
+                decrypted,
+                decrypt=True,
+                processes=processes
+            )
+            for path, data in self.files.items():
+                self.assertEqual(
+                    self.cipher.decrypt(
+                        self._read(os.path.join(encrypted, path))
+                    ),
+                    data
+                )
+                self.assertEqual(
+                    self._read(os.path.join(decrypted, path)),
+                    data
+                )
+
+    def test_failures(self):
+        report = batch.crypt_directory(
+            self.cipher,
+            self.input_dir,
+            os.path.join(self.directory, "output"),
+            decrypt=True,
+            processes=2
+        )
+        self.assertEqual(
+            [path for path, error in report['failures']],
+            sorted(self.files)
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(self.directory, "output", "meow"))
+        )
+        self.assertIn("meow: ", batch.format_report(report))
+
+    def test_interface(self):
+        key_path = os.path.join(self.directory, "key")
+        self._write(key_path, "k" * 16)
+        kwargs = {
+            'cipher': "AES",
+            'input_dir': self.input_dir,
+            'key_path': key_path,
+            'output_dir': os.path.join(self.directory, "output")
+        }
+        self.assertRaises(
+            AttributeError,
+            cipher_cli.BatchCipherInterface,
+            **dict(kwargs, output_dir=None)
+        )
+        self.assertRaises(
+            AttributeError,
+            cipher_cli.BatchCipherInterface,
+            **dict(kwargs, data_input_path="-")
+        )
+
+        interface = cipher_cli.BatchCipherInterface(workers=1, **kwargs)
+        with mock.patch('sys.stderr', StringIO.StringIO()) as stderr:
+            interface.execute()
+        self.assertTrue(stderr.getvalue().startswith("3 files"))
+
+        interface = cipher_cli.BatchCipherInterface(
+            decrypt=True,
+            workers=1,
+            **dict(kwargs, output_dir=self.directory + "/decrypted")
+        )
+        with mock.patch('sys.stderr', StringIO.StringIO()):
+            self.assertRaises(SystemExit, interface.execute)
+
+
+
+class MacKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = {}
+        for name, data in (
+            ('key', "k" * 16),
+            ('mac_key', "m" * 32),
+            ('plaintext', "meow" * 1000)
+        ):
+            self.paths[name] = os.path.join(self.directory, name)
+            with open(self.paths[name], 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _run(self, data_input_path, data_output_path, decrypt=False):
+        cipher_cli.CipherInterface(
+            "AES",
+            data_input_path=data_input_path,
+            data_output_path=data_output_path,
+            decrypt=decrypt,
+            key_path=self.paths['key'],
+            mac_key_path=self.paths['mac_key'],
+            mode="CTR"
+        ).execute()
+
+    def test_mac_key(self):
+        ciphertext_path = os.path.join(self.directory, "ciphertext")
+        output_path = os.path.join(self.directory, "output")
+        self._run(self.paths['plaintext'], ciphertext_path)
+        self._run(ciphertext_path, output_path, decrypt=True)
+        with open(output_path, 'rb') as f:
+            self.assertEqual(f.read(), "meow" * 1000)
+
+        with open(ciphertext_path, 'r+b') as f:
+            f.seek(100)
+            f.write("A")
+        os.remove(output_path)
+        self.assertRaises(
+            ValueError,
+            self._run,
+            ciphertext_path,
+            output_path,
+            decrypt=True
+        )
+        self.assertFalse(os.path.exists(output_path))
+
+    def test_stdout(self):
+        """Plaintext reaches stdout only once the MAC check passes."""
+        ciphertext_path = os.path.join(self.directory, "ciphertext")
+        self._run(self.paths['plaintext'], ciphertext_path)
+        with mock.patch('sys.stdout', StringIO.StringIO()) as stdout:
+            self._run(ciphertext_path, "-", decrypt=True)
+        self.assertEqual(stdout.getvalue(), "meow" * 1000)
+
+        with open(ciphertext_path, 'r+b') as f:
+            f.seek(100)
+            f.write("A")
+        for data_output_path in ("-", None):
+            with mock.patch('sys.stdout', StringIO.StringIO()) as stdout:
+                self.assertRaises(
+                    ValueError,
+                    self._run,
+                    ciphertext_path,
+                    data_output_path,
+                    decrypt=True
+                )
+            self.assertEqual(stdout.getvalue(), "")
+
+    def test_rejected_options(self):
+        self.assertRaises(
+            AttributeError,
+            cipher_cli.CipherInterface,
+            "AES",
+            data_input_path=self.paths['plaintext'],
+            key_path=self.paths['key'],
+            mac_key_path=self.paths['mac_key'],
+            container=True
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import base64
+import crypto.classes.encoders.base as base_encoders
+import crypto.classes.encoders.binary as binary_encoders
+import unittest
+
+from Crypto.Random import random
+
+
+def run_stream_coder(coder, data, chunk_size):
+    """Feed data through an incremental coder in `chunk_size` pieces and
+    return the joined output.
+    """
+    pieces = [
+        coder.update(data[i:i + chunk_size])
+        for i in xrange(0, len(data), chunk_size)
+    ]
+    pieces.append(coder.flush())
+    return "".join(pieces)
+
+
+class NullStreamCoderTest(unittest.TestCase):
+    def test_update(self):
+        coder = base_encoders.NullStreamCoder(wrap=76)
+        self.assertEqual(run_stream_coder(coder, "meow" * 10, 3), "meow" * 10)
+
+    def test_encoder_defaults(self):
+        encoder = base_encoders.Encoder(len, len)
+        self.assertEqual(encoder.stream_encoder, None)
+        self.assertEqual(encoder.stream_decoder, None)
+
+
+class Base64StreamCoderTest(unittest.TestCase):
+    def test_encode_matches_base64(self):
+        data = random.Random.new().read(1000)
+        for chunk_size in (1, 2, 3, 4, 7, 100, 1000):
+            self.assertEqual(
+                run_stream_coder(
+                    binary_encoders.Base64StreamEncoder(),
+                    data,
+                    chunk_size
+                ),
+                base64.b64encode(data)
+            )
+            self.assertEqual(
+                run_stream_coder(
+                    binary_encoders.Base64StreamEncoder(altchars="-_"),
+                    data,
+                    chunk_size
+                ),
+                base64.urlsafe_b64encode(data)
+            )
+
+    def test_encode_wrap(self):
+        data = random.Random.new().read(1000)
+        for chunk_size in (1, 5, 57, 1000):
+            encoder = binary_encoders.Base64StreamEncoder(wrap=76)
+            self.assertEqual(
+                run_stream_coder(encoder, data, chunk_size),
+                base64.encodestring(data)
+            )
+
+        encoder = binary_encoders.Base64StreamEncoder(wrap=4)
+        self.assertEqual(run_stream_coder(encoder, "meow", 1), "bWVv\ndw==\n")
+
+    def test_decode_matches_base64(self):
+        data = random.Random.new().read(1000)
+        for text in (base64.b64encode(data), base64.encodestring(data)):
+            for chunk_size in (1, 3, 4, 5, 77, 2000):
+                self.assertEqual(
+                    run_stream_coder(
+                        binary_encoders.Base64StreamDecoder(),
+                        text,
+                        chunk_size
+                    ),
+                    data
+                )
+
+        text = base64.urlsafe_b64encode(data)
+        self.assertEqual(
+            run_stream_coder(
+                binary_encoders.Base64StreamDecoder(altchars="-_"),
+                text,
+                7
+            ),
+            data
+        )
+
+    def test_decode_incomplete(self):
+        decoder = binary_encoders.Base64StreamDecoder()
+        self.assertEqual(decoder.update("bWVvd"), "meo")
+        self.assertRaises(TypeError, decoder.flush)
+
+
+if __name__ == "__main__":
+    unittest.main()
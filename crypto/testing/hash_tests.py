@@ -0,0 +1,463 @@
+import crypto.classes.digest as digest
+import crypto.classes.manifest as manifest
+import crypto.classes.treehash as treehash
+import crypto.interfaces.commandline.hash as hash_cli
+import hashlib
+import hmac
+import mock
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+
+class MultiDigestTest(unittest.TestCase):
+    def test_digests(self):
+        data = os.urandom(1000)
+        multi = digest.MultiDigest(['MD5', 'SHA1', 'SHA256', 'SHA512'])
+        multi.update(data[:10])
+        multi.update(buffer(data, 10))
+        self.assertEqual(multi.size, 1000)
+        self.assertEqual(
+            multi.hexdigests(),
+            {
+                'MD5': hashlib.md5(data).hexdigest(),
+                'SHA1': hashlib.sha1(data).hexdigest(),
+                'SHA256': hashlib.sha256(data).hexdigest(),
+                'SHA512': hashlib.sha512(data).hexdigest()
+            }
+        )
+        self.assertEqual(multi.digests()['MD5'], hashlib.md5(data).digest())
+
+    def test_hmac(self):
+        data = os.urandom(1000)
+        multi = digest.MultiDigest(['SHA224', 'SHA384'], hmac_key="meow")
+        multi.update(data)
+        self.assertEqual(
+            multi.hexdigests(),
+            {
+                'SHA224': hmac.new("meow", data, hashlib.sha224).hexdigest(),
+                'SHA384': hmac.new("meow", data, hashlib.sha384).hexdigest()
+            }
+        )
+
+    def test_all_algorithms(self):
+        for name in digest.HASHES:
+            multi = digest.MultiDigest([name])
+            multi.update("meow")
+            self.assertEqual(
+                multi.digests()[name],
+                digest.HASHES[name].new("meow").digest()
+            )
+
+    def test_hash_stream(self):
+        data = os.urandom(1000)
+        src = StringIO.StringIO(data)
+        with mock.patch.object(src, 'read', wraps=src.read) as read:
+            multi = digest.hash_stream(src, ['SHA256', 'MD5'], chunk_size=300)
+        self.assertEqual(read.call_count, 5)  # Once for each chunk, and EOF.
+        self.assertEqual(
+            multi.hexdigests()['SHA256'],
+            hashlib.sha256(data).hexdigest()
+        )
+        self.assertEqual(
+            digest.hash_stream(StringIO.StringIO(data)).algorithms,
+            [digest.HASH_DEFAULT]
+        )
+
+    def test_errors(self):
+        self.assertRaises(AttributeError, digest.MultiDigest, [])
+        self.assertRaises(AttributeError, digest.MultiDigest, ['MEOW'])
+
+
+class HashInterfaceTest(unittest.TestCase):
+    def test_execute(self):
+        with tempfile.NamedTemporaryFile() as data_file:
+            data_file.write("meow")
+            data_file.flush()
+            interface = hash_cli.HashInterface(
+                ['SHA1', 'MD5'],
+                data_input_path=data_file.name,
+                data_output_path="-"
+            )
+            with mock.patch('sys.stdout', StringIO.StringIO()) as stdout:
+                interface.execute()
+
+        self.assertEqual(
+            stdout.getvalue(),
+            "SHA1 (%s) = %s\nMD5 (%s) = %s\n" % (
+                data_file.name,
+                hashlib.sha1("meow").hexdigest(),
+                data_file.name,
+                hashlib.md5("meow").hexdigest()
+            )
+        )
+
+    def test_hmac(self):
+        with tempfile.NamedTemporaryFile() as key_file:
+            key_file.write("purr")
+            key_file.flush()
+            interface = hash_cli.HashInterface(
+                hash_cli.HASH_DEFAULT,
+                data_input_path="-",
+                data_output_path="-",
+                hmac_key_path=key_file.name
+            )
+        with mock.patch('sys.stdin', StringIO.StringIO("meow")):
+            with mock.patch('sys.stdout', StringIO.StringIO()) as stdout:
+                interface.execute()
+
+        self.assertEqual(
+            stdout.getvalue(),
+            "HMAC-SHA256 (-) = %s\n" % (
+                hmac.new("purr", "meow", hashlib.sha256).hexdigest()
+            )
+        )
+
+
+    def test_stdout(self):
+        directory = tempfile.mkdtemp()
+        try:
+            data_path = os.path.join(directory, "data")
+            with open(data_path, 'wb') as f:
+                f.write("meow")
+            interface = hash_cli.HashInterface(
+                ['SHA1', 'MD5'],
+                data_input_path=data_path
+            )
+            with mock.patch('sys.stdout', StringIO.StringIO()) as stdout:
+                interface.execute()
+            self.assertTrue(stdout.getvalue().startswith("SHA1 ("))
+
+            manifest_path = os.path.join(directory, "data.sum")
+            with open(manifest_path, 'wb') as f:
+                f.write(stdout.getvalue())
+            interface = hash_cli.BatchHashInterface(
+                ['SHA1'],
+                verify_path=manifest_path,
+                workers=1
+            )
+            with mock.patch('sys.stderr', StringIO.StringIO()):
+                interface.execute()
+                with open(data_path, 'wb') as f:
+                    f.write("hiss")
+                self.assertRaises(SystemExit, interface.execute)
+        finally:
+            shutil.rmtree(directory)
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.directory, "input")
+        self.files = {
+            'meow': "meow" * 1000,
+            os.path.join('cats', 'purr'): "purr",
+            os.path.join('cats', 'empty'): ""
+        }
+        for path, data in self.files.items():
+            self._write(path, data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, path, data):
+        path = os.path.join(self.input_dir, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def test_hash_directory(self):
+        for processes in (1, 2):
+            entries, report = manifest.hash_directory(
+                self.input_dir,
+                ['SHA256', 'MD5'],
+                processes=processes
+            )
+            self.assertEqual(
+                entries,
+                sorted(
+                    (path, {
+                        'MD5': hashlib.md5(data).hexdigest(),
+                        'SHA256': hashlib.sha256(data).hexdigest()
+                    })
+                    for path, data in self.files.items()
+                )
+            )
+            self.assertEqual(report['files'], 3)
+            self.assertEqual(report['bytes_hashed'], 4004)
+            self.assertEqual(report['failures'], [])
+
+    def test_cache(self):
+        cache_path = os.path.join(self.directory, "cache.json")
+        cache = manifest.DigestCache(cache_path)
+        manifest.hash_directory(self.input_dir, ['MD5'], cache, processes=1)
+        cache.save()
+
+        self._write('meow', "MEOW" * 1000)  # Same size, new contents.
+        stat = os.stat(os.path.join(self.input_dir, 'meow'))
+        os.utime(
+            os.path.join(self.input_dir, 'meow'),
+            (stat.st_atime, stat.st_mtime + 1)
+        )
+        cache = manifest.DigestCache(cache_path)
+        self.assertEqual(len(cache), 3)
+        entries, report = manifest.hash_directory(
+            self.input_dir,
+            ['MD5'],
+            cache,
+            processes=1
+        )
+        self.assertEqual(report['cached'], 2)
+        self.assertEqual(report['bytes_hashed'], 4000)
+        self.assertEqual(
+            dict(entries)['meow']['MD5'],
+            hashlib.md5("MEOW" * 1000).hexdigest()
+        )
+
+        # Other algorithms are hashed, and HMACs are never cached.
+        report = manifest.hash_directory(
+            self.input_dir,
+            ['MD5', 'SHA1'],
+            cache,
+            processes=1
+        )[1]
+        self.assertEqual(report['cached'], 0)
+        report = manifest.hash_directory(
+            self.input_dir,
+            ['MD5'],
+            cache,
+            hmac_key="key",
+            processes=1
+        )[1]
+        self.assertEqual(report['cached'], 0)
+
+        # Removed files are dropped, while files elsewhere are kept.
+        os.remove(os.path.join(self.input_dir, 'cats', 'purr'))
+        other_path = self.input_dir + "2"
+        with open(other_path, 'wb') as f:
+            f.write("hiss")
+        cache.set(other_path, os.stat(other_path), {'MD5': "00"})
+        manifest.hash_directory(self.input_dir, ['MD5'], cache, processes=1)
+        cache.save()
+        self.assertEqual(len(manifest.DigestCache(cache_path)), 3)
+
+    def test_manifest(self):
+        entries, report = manifest.hash_directory(
+            self.input_dir,
+            ['SHA1', 'MD5'],
+            processes=1
+        )
+        lines = manifest.format_manifest(entries, ['SHA1', 'MD5'])
+        self.assertIn(
+            "MD5 (meow) = %s\n" % hashlib.md5("meow" * 1000).hexdigest(),
+            lines
+        )
+        self.assertEqual(
+            manifest.parse_manifest(StringIO.StringIO(lines)),
+            (entries, False)
+        )
+        self.assertEqual(
+            manifest.parse_manifest(["HMAC-MD5 (a b) = 00", ""]),
+            ([('a b', {'MD5': '00'})], True)
+        )
+        for lines in (["meow"], ["MD5 (a) = 00", "HMAC-MD5 (b) = 00"]):
+            self.assertRaises(ValueError, manifest.parse_manifest, lines)
+
+    def test_verify(self):
+        entries = manifest.hash_directory(
+            self.input_dir,
+            ['SHA256'],
+            hmac_key="key",
+            processes=1
+        )[0]
+        for processes in (1, 2):
+            report = manifest.verify_manifest(
+                entries,
+                self.input_dir,
+                hmac_key="key",
+                processes=processes
+            )
+            self.assertEqual(report['failures'], [])
+
+        self._write('meow', "hiss")
+        os.remove(os.path.join(self.input_dir, 'cats', 'purr'))
+        report = manifest.verify_manifest(
+            entries,
+            self.input_dir,
+            hmac_key="key",
+            processes=2
+        )
+        self.assertEqual(report['files'], 3)
+        self.assertEqual(
+            [path for path, reason in report['failures']],
+            [os.path.join('cats', 'purr'), 'meow']
+        )
+        self.assertEqual(report['failures'][1][1], "FAILED")
+        self.assertIn("2 failed", manifest.format_report(report))
+
+    def test_interface(self):
+        manifest_path = os.path.join(self.directory, "manifest")
+        interface = hash_cli.BatchHashInterface(
+            ['MD5'],
+            input_dir=self.input_dir,
+            data_output_path=manifest_path,
+            workers=1
+        )
+        with mock.patch('sys.stderr', StringIO.StringIO()) as stderr:
+            interface.execute()
+            self.assertTrue(stderr.getvalue().startswith("3 files"))
+
+            interface = hash_cli.BatchHashInterface(
+                ['MD5'],
+                input_dir=self.input_dir,
+                verify_path=manifest_path,
+                workers=1
+            )
+            interface.execute()
+            self._write('meow', "hiss")
+            self.assertRaises(SystemExit, interface.execute)
+
+        interface.hmac_key = "key"
+        self.assertRaises(AttributeError, interface.execute)
+
+    def test_interface_stdout(self):
+        interface = hash_cli.BatchHashInterface(
+            ['SHA1'],
+            input_dir=self.input_dir,
+            workers=1
+        )
+        manifest_path = os.path.join(self.directory, "manifest")
+        with mock.patch('sys.stderr', StringIO.StringIO()):
+            with mock.patch('sys.stdout', StringIO.StringIO()) as stdout:
+                interface.execute()
+            with open(manifest_path, 'wb') as f:
+                f.write(stdout.getvalue())
+
+            interface = hash_cli.BatchHashInterface(
+                ['SHA1'],
+                input_dir=self.input_dir,
+                verify_path=manifest_path,
+                workers=1
+            )
+            interface.execute()
+            self._write('meow', "hiss")
+            self.assertRaises(SystemExit, interface.execute)
+
+
+class TreeHashTest(unittest.TestCase):
+    def setUp(self):
+        self.data = os.urandom(10000)
+        f = tempfile.NamedTemporaryFile(delete=False)
+        f.write(self.data)
+        f.close()
+        self.path = f.name
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_tree_hash(self):
+        tree = treehash.tree_hash(
+            StringIO.StringIO(self.data),
+            'SHA256',
+            chunk_size=4096
+        )
+        chunks = [self.data[:4096], self.data[4096:8192], self.data[8192:]]
+        leaves = [hashlib.sha256("\x00" + chunk).digest() for chunk in chunks]
+        self.assertEqual(tree['algorithm'], 'SHA256')
+        self.assertEqual(tree['chunk_size'], 4096)
+        self.assertEqual(tree['size'], 10000)
+        self.assertEqual(
+            tree['chunks'],
+            [leaf.encode('hex') for leaf in leaves]
+        )
+        self.assertEqual(
+            tree['root'],
+            hashlib.sha256("\x01" + "".join(leaves)).hexdigest()
+        )
+
+        empty = treehash.tree_hash(StringIO.StringIO(""), 'MD5')
+        self.assertEqual(empty['chunks'], [])
+        self.assertEqual(empty['root'], hashlib.md5("\x01").hexdigest())
+        self.assertRaises(
+            AttributeError,
+            treehash.tree_hash,
+            StringIO.StringIO(""),
+            'CRC32'
+        )
+
+    def test_tree_hash_file(self):
+        src = StringIO.StringIO(self.data)
+        expected = treehash.tree_hash(src, 'MD5', 1000)
+        for processes in (1, 3):
+            self.assertEqual(
+                treehash.tree_hash_file(self.path, 'MD5', 1000, processes),
+                expected
+            )
+
+    def test_verify(self):
+        tree = treehash.tree_hash_file(self.path, chunk_size=4096)
+        tree = treehash.load_tree(StringIO.StringIO(treehash.dump_tree(tree)))
+        report = treehash.verify_tree(tree, path=self.path, processes=2)
+        self.assertEqual(report['chunks'], 3)
+        self.assertEqual(report['failures'], [])
+
+        with open(self.path, 'r+b') as f:
+            f.seek(5000)
+            f.write("x")
+        report = treehash.verify_tree(tree, path=self.path, processes=2)
+        self.assertEqual(report['failures'], [(4096, 4096)])
+        self.assertIn(
+            "bytes 4096-8191: FAILED",
+            treehash.format_report(report)
+        )
+
+        report = treehash.verify_tree(
+            tree,
+            src=StringIO.StringIO(self.data[:5000])
+        )
+        self.assertEqual(report['failures'], [(4096, 4096), (8192, 1808)])
+        self.assertRaises(
+            ValueError,
+            treehash.load_tree,
+            StringIO.StringIO("{}")
+        )
+
+    def test_interface(self):
+        tree_path = self.path + ".tree"
+        interface = hash_cli.TreeHashInterface(
+            'SHA1',
+            data_input_path=self.path,
+            data_output_path=tree_path,
+            chunk_size=3000,
+            workers=2
+        )
+        try:
+            interface.execute()
+            with open(tree_path, 'rb') as f:
+                tree = treehash.load_tree(f)
+            self.assertEqual(tree['chunk_size'], 3000)
+            self.assertEqual(len(tree['chunks']), 4)
+
+            interface.verify_path = tree_path
+            with mock.patch('sys.stderr', StringIO.StringIO()) as stderr:
+                interface.execute()
+                self.assertTrue(stderr.getvalue().startswith("4 chunks"))
+                with open(self.path, 'ab') as f:
+                    f.write("x")
+                self.assertRaises(SystemExit, interface.execute)
+        finally:
+            os.remove(tree_path)
+
+        self.assertRaises(
+            AttributeError,
+            hash_cli.TreeHashInterface,
+            ['MD5', 'SHA1'],
+            data_input_path=self.path
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import crypto.classes.keys.pool as key_pool
+import crypto.classes.keys.rsa as rsa_keys
+import crypto.interfaces.commandline.keys as keys_cli
+import mock
+import os
+import shutil
+import StringIO
+import tempfile
+import time
+import unittest
+
+from Crypto.PublicKey import RSA
+
+
+KEY_SIZE = 1024  # The smallest size allowed, to keep the tests quick.
+
+
+class KeyPoolTest(unittest.TestCase):
+    def test_get(self):
+        with key_pool.KeyPool(depth=2, processes=2) as pool:
+            keys = [pool.get(KEY_SIZE, timeout=60) for _ in xrange(3)]
+            for key in keys:
+                self.assertEqual(key.size() + 1, KEY_SIZE)
+                self.assertTrue(key.has_private())
+                self.assertEqual(key.decrypt(key.encrypt("meow", 0)), "meow")
+            self.assertEqual(len(set(key.n for key in keys)), 3)
+
+            # Taken keys are replaced in the background.
+            deadline = time.time() + 60
+            while pool.ready(KEY_SIZE) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(pool.ready(KEY_SIZE), 2)
+
+    def test_errors(self):
+        self.assertRaises(AttributeError, key_pool.KeyPool, depth=0)
+        with key_pool.KeyPool(depth=1, processes=1) as pool:
+            self.assertRaises(ValueError, pool.get, 100, timeout=60)
+
+    def test_rsa_keys(self):
+        keys = rsa_keys.RSAKeys('PEM', KEY_SIZE)
+        pool = mock.Mock()
+        pool.get.return_value = RSA.generate(KEY_SIZE)
+        with mock.patch.object(rsa_keys.RSAKeys, 'key_pool', pool):
+            self.assertIs(keys.key, pool.get.return_value)
+        pool.get.assert_called_once_with(KEY_SIZE)
+
+    def test_generate_keys(self):
+        for processes in (1, 2):
+            keys = list(key_pool.generate_keys(KEY_SIZE, 2, processes))
+            self.assertEqual(len(keys), 2)
+            self.assertNotEqual(keys[0].n, keys[1].n)
+
+
+class KeysInterfaceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_execute(self):
+        path = os.path.join(self.directory, "id")
+        keys_cli.KeysInterface(
+            'RSA',
+            data_output_path=path,
+            key_size=KEY_SIZE
+        ).execute()
+        with open(path, 'rb') as f:
+            key = RSA.importKey(f.read())
+        with open(path + ".pub", 'rb') as f:
+            self.assertEqual(RSA.importKey(f.read()).n, key.n)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+        # Existing keys are never overwritten.
+        os.remove(path)
+        os.remove(path + ".pub")
+        for existing in (path, path + ".pub"):
+            with open(existing, 'wb') as f:
+                f.write("meow")
+            self.assertRaises(
+                IOError,
+                keys_cli.KeysInterface(
+                    'RSA',
+                    data_output_path=path,
+                    key_size=KEY_SIZE
+                ).execute
+            )
+            with open(existing, 'rb') as f:
+                self.assertEqual(f.read(), "meow")
+            os.remove(existing)
+
+    def test_openssh(self):
+        path = os.path.join(self.directory, "id")
+        output_dir = os.path.join(self.directory, "keys")
+        keys_cli.KeysInterface(
+            'RSA',
+            data_output_path=path,
+            key_format='OpenSSH',
+            key_size=KEY_SIZE
+        ).execute()
+        interface = keys_cli.KeysInterface(
+            'RSA',
+            key_format='OpenSSH',
+            key_size=KEY_SIZE,
+            count=1,
+            output_dir=output_dir,
+            workers=1
+        )
+        with mock.patch('sys.stderr', StringIO.StringIO()):
+            interface.execute()
+
+        for path in (path, os.path.join(output_dir, "key1")):
+            with open(path, 'rb') as f:
+                key = RSA.importKey(f.read())
+            self.assertTrue(key.has_private())
+            with open(path + ".pub", 'rb') as f:
+                public_key = f.read()
+            self.assertTrue(public_key.startswith("ssh-rsa "))
+            self.assertEqual(RSA.importKey(public_key).n, key.n)
+
+    def test_bulk(self):
+        output_dir = os.path.join(self.directory, "keys")
+        interface = keys_cli.KeysInterface(
+            'RSA',
+            key_format='DER',
+            key_size=KEY_SIZE,
+            count=10,
+            output_dir=output_dir,
+            workers=2
+        )
+        with mock.patch('sys.stderr', StringIO.StringIO()) as stderr:
+            interface.execute()
+        self.assertTrue(stderr.getvalue().startswith("10 RSA-1024 keys"))
+        self.assertEqual(len(os.listdir(output_dir)), 20)
+        with open(os.path.join(output_dir, "key01"), 'rb') as f:
+            self.assertTrue(RSA.importKey(f.read()).has_private())
+        self.assertEqual(
+            os.stat(os.path.join(output_dir, "key01")).st_mode & 0o777,
+            0o600
+        )
+        self.assertRaises(IOError, interface.execute)
+
+        self.assertRaises(
+            AttributeError,
+            keys_cli.KeysInterface,
+            'RSA',
+            count=2
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+from __future__ import print_function
+
+import argparse
+import crypto.classes.benchmark as benchmark
+import crypto.classes.ciphers.aes as aes_cipher
+import crypto.classes.ciphers.blowfish as blowfish_cipher
+import crypto.classes.ciphers.cast as cast_cipher
+import crypto.classes.ciphers.xor as xor_cipher
+import crypto.classes.encoders.binary as binary_encoders
+import crypto.classes.keys.rsa as rsa_keys
+import crypto.testing.cli_tests as cli_tests
+import functools
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+from crypto.classes.ciphers.padding import PADDINGS
+
+
+"""Performance regression suite. Times hot paths and compares the calls per
+second against a baseline file, failing when a path has slowed down by more
+than the threshold. Baselines depend on the machine, so record them with
+`--update-baseline` before comparing on new hardware:
+
+    python -m crypto.testing.performance_tests --update-baseline
+    python -m crypto.testing.performance_tests --threshold 0.2
+
+CI compares against the committed `performance_baseline_ci.json` with a loose
+threshold, which only catches large slowdowns on unknown hardware:
+
+    python -m crypto.testing.performance_tests \
+        --baseline crypto/testing/performance_baseline_ci.json --threshold 0.75
+"""
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'performance_baseline.json'
+)
+CI_BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'performance_baseline_ci.json'
+)
+DEFAULT_MIN_CALLS = 5
+DEFAULT_MIN_TIME = 0.2
+DEFAULT_THRESHOLD = 0.3  # Largest tolerated drop in calls per second.
+SAMPLE_TIME = 0.01
+
+config = {
+    'baseline_path': BASELINE_PATH,
+    'min_time': DEFAULT_MIN_TIME,
+    'threshold': DEFAULT_THRESHOLD
+}
+
+
+def _get_cipher(cipher_class, mode=None, padding=None):
+    cipher = cipher_class()
+    if mode:
+        cipher.mode = mode
+    if padding:
+        cipher.padding = padding
+    return benchmark.seed_cipher(cipher)
+
+
+def _get_text(size):
+    rng = random.Random(benchmark.DEFAULT_SEED)
+    return benchmark.get_random_bytes(rng, size)
+
+
+def crypt_case(cipher_class, size, mode=None, decrypt=False):
+    cipher = _get_cipher(cipher_class, mode)
+    text = _get_text(size)
+    if decrypt:
+        return functools.partial(cipher.decrypt, cipher.encrypt(text))
+    return functools.partial(cipher.encrypt, text)
+
+
+def pad_case(padding, size, unpad=False):
+    scheme = PADDINGS[padding]
+    text = _get_text(size)
+    if unpad:
+        return functools.partial(scheme.unpad, scheme.pad(text, 16), 16)
+    return functools.partial(scheme.pad, text, 16)
+
+
+def get_cipher_case(mode):
+    cipher = _get_cipher(aes_cipher.AESCipher, mode)
+    return cipher._get_cipher
+
+
+def encoder_case(function, size):
+    text = _get_text(size)
+    if function == binary_encoders.Base64Encoder.decode:
+        text = binary_encoders.Base64Encoder.encode(text)
+    return functools.partial(function, text)
+
+
+def rsa_case(key_size):
+    return lambda: rsa_keys.RSAKeys('PEM', key_size).key
+
+
+def cli_help_case():
+    return functools.partial(cli_tests.run_cli, ["-h"])
+
+
+def cli_cipher_case(cipher, data):
+    """Time a whole `pycrypto-cli cipher` process, which is dominated by
+    startup for small inputs.
+    """
+    key_file = tempfile.NamedTemporaryFile()
+    key_file.write("key")
+    key_file.flush()
+
+    def run():
+        return cli_tests.run_cli(
+            ["cipher", cipher, "-k", key_file.name, "-i", "-", "-o", "-"],
+            data
+        )
+    return run
+
+
+# Benchmark name to a function that sets up and returns the call to time.
+CASES = {
+    'aes_cbc_decrypt_64k': functools.partial(
+        crypt_case, aes_cipher.AESCipher, 64 * 1024, 'CBC', True
+    ),
+    'aes_cbc_encrypt_1k': functools.partial(
+        crypt_case, aes_cipher.AESCipher, 1024, 'CBC'
+    ),
+    'aes_ctr_encrypt_64k': functools.partial(
+        crypt_case, aes_cipher.AESCipher, 64 * 1024, 'CTR'
+    ),
+    'aes_ecb_encrypt_16': functools.partial(
+        crypt_case, aes_cipher.AESCipher, 16, 'ECB'
+    ),
+    'base64_decode_64k': functools.partial(
+        encoder_case, binary_encoders.Base64Encoder.decode, 64 * 1024
+    ),
+    'base64_encode_64k': functools.partial(
+        encoder_case, binary_encoders.Base64Encoder.encode, 64 * 1024
+    ),
+    'blowfish_cbc_encrypt_1k': functools.partial(
+        crypt_case, blowfish_cipher.BlowfishCipher, 1024, 'CBC'
+    ),
+    'cast_cbc_encrypt_1k': functools.partial(
+        crypt_case, cast_cipher.CASTCipher, 1024, 'CBC'
+    ),
+    'cli_startup_help': cli_help_case,
+    'cli_startup_xor': functools.partial(cli_cipher_case, "XOR", "meow"),
+    'get_cipher_cbc': functools.partial(get_cipher_case, 'CBC'),
+    'get_cipher_ecb': functools.partial(get_cipher_case, 'ECB'),
+    'pad_pkcs7_1k': functools.partial(pad_case, 'PKCS7', 1000),
+    'pad_random_1k': functools.partial(pad_case, 'RANDOM', 1000),
+    'rsa_generate_1024': functools.partial(rsa_case, 1024),
+    'unpad_pkcs7_1k': functools.partial(pad_case, 'PKCS7', 1000, True),
+    'unpad_random_1k': functools.partial(pad_case, 'RANDOM', 1000, True),
+    'xor_decrypt_64k': functools.partial(
+        crypt_case, xor_cipher.XORCipher, 64 * 1024, decrypt=True
+    ),
+    'xor_encrypt_64k': functools.partial(
+        crypt_case, xor_cipher.XORCipher, 64 * 1024
+    )
+}
+
+
+def get_calls_per_sample(function, sample_time=SAMPLE_TIME):
+    """Return how many calls of function take at least `sample_time`
+    seconds, so timer overhead does not swamp fast calls.
+    """
+    number = 1
+    while True:
+        timings = benchmark.time_calls(
+            lambda: [function() for _ in xrange(number)],
+            min_time=0
+        )
+        if timings[0] >= sample_time:
+            return number
+        number *= 2
+
+
+def measure(name, min_time=DEFAULT_MIN_TIME):
+    """Return the calls per second of benchmark `name` in its fastest
+    sample, which is the one least disturbed by other processes.
+    """
+    function = CASES[name]()
+    number = get_calls_per_sample(function)
+    timings = benchmark.time_calls(
+        lambda: [function() for _ in xrange(number)],
+        min_time,
+        DEFAULT_MIN_CALLS
+    )
+    return number / (min(timings) or 1e-9)
+
+
+def check_regression(result, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return a message when `result` calls per second is more than
+    `threshold` (a fraction) below `baseline`, otherwise None.
+    """
+    if result >= baseline * (1 - threshold):
+        return None
+    return "%.1f calls/s is %.0f%% below the baseline of %.1f calls/s." % (
+        result,
+        (1 - float(result) / baseline) * 100,
+        baseline
+    )
+
+
+def load_baseline(path):
+    """Return recorded calls per second by benchmark name, or an empty
+    dictionary if there is no baseline file.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def update_baseline(path, min_time=DEFAULT_MIN_TIME):
+    """Measure every benchmark and write the results to `path`."""
+    results = {}
+    for name in sorted(CASES):
+        results[name] = measure(name, min_time)
+        print(
+            "%-24s %14.1f calls/s" % (name, results[name]),
+            file=sys.stderr
+        )
+    with open(path, 'w') as f:
+        json.dump(
+            {'metadata': benchmark.get_metadata(), 'results': results},
+            f,
+            indent=2,
+            sort_keys=True
+        )
+        f.write("\n")
+
+
+class PerformanceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.baseline = load_baseline(config['baseline_path'])
+
+    def _test_case(self, name):
+        if name not in self.baseline:
+            self.skipTest("No baseline recorded for %s." % name)
+        message = check_regression(
+            measure(name, config['min_time']),
+            self.baseline[name],
+            config['threshold']
+        )
+        if message:
+            self.fail("%s: %s" % (name, message))
+
+
+def _add_test(name):
+    def test(self):
+        self._test_case(name)
+    test.__name__ = "test_%s" % name
+    setattr(PerformanceTest, test.__name__, test)
+
+
+for _name in CASES:
+    _add_test(_name)
+
+
+class CheckRegressionTest(unittest.TestCase):
+    def test_check_regression(self):
+        self.assertEqual(check_regression(80, 100, 0.25), None)
+        self.assertEqual(check_regression(150, 100, 0.25), None)
+        self.assertIn("25%", check_regression(75, 100, 0.2))
+
+    def test_ci_baseline(self):
+        """Every benchmark must be in the CI baseline, or CI skips it."""
+        self.assertEqual(set(load_baseline(CI_BASELINE_PATH)), set(CASES))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare hot path timings against a baseline."
+    )
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE_PATH,
+        help="Baseline file. Defaults to %s." % BASELINE_PATH
+    )
+    parser.add_argument(
+        "--min-time",
+        default=DEFAULT_MIN_TIME,
+        help="Seconds to repeat each benchmark for.",
+        type=float
+    )
+    parser.add_argument(
+        "--threshold",
+        default=DEFAULT_THRESHOLD,
+        help=("Fraction calls per second may drop below the baseline " +
+            "before a test fails. Defaults to %s." % DEFAULT_THRESHOLD
+        ),
+        type=float
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Record new baseline results instead of comparing."
+    )
+    args, remaining = parser.parse_known_args()
+
+    if args.update_baseline:
+        update_baseline(args.baseline, args.min_time)
+        return
+
+    config.update(
+        baseline_path=args.baseline,
+        min_time=args.min_time,
+        threshold=args.threshold
+    )
+    unittest.main(argv=sys.argv[:1] + remaining)
+
+
+if __name__ == "__main__":
+    main()
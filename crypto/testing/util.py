@@ -1,3 +1,4 @@
+import StringIO
 import unittest
 
 
@@ -19,3 +20,22 @@ def test_cipher_encryption(testcase, cipher, plaintext):
         assert ciphertext is not None
         assert plaintext != ciphertext
         assert plaintext == cipher.decrypt(ciphertext)
+
+
+def test_cipher_stream_encryption(testcase, cipher, plaintext, chunk_size):
+    """This will execute a cipher's streaming encrypt/decrypt methods in
+    `chunk_size` pieces and check they interoperate with encrypt/decrypt.
+    """
+    ciphertext = StringIO.StringIO()
+    cipher.encrypt_stream(StringIO.StringIO(plaintext), ciphertext, chunk_size)
+    ciphertext = ciphertext.getvalue()
+    decrypted = StringIO.StringIO()
+    cipher.decrypt_stream(
+        StringIO.StringIO(cipher.encrypt(plaintext)),
+        decrypted,
+        chunk_size
+    )
+
+    testcase.assertNotEqual(plaintext, ciphertext)
+    testcase.assertEqual(plaintext, cipher.decrypt(ciphertext))
+    testcase.assertEqual(plaintext, decrypted.getvalue())